@@ -0,0 +1,46 @@
+"""
+Bulk clustering benchmark.
+
+Clusters a synthetic keyword export (see keyword_corpus.py) with the bulk
+engine and reports wall time, per-stage timings and the peak resident memory
+of the process.
+
+Usage (from backend/):
+    python benchmarks/bulk_clustering_benchmark.py --keywords 100000
+"""
+import argparse
+import resource
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.keyword_corpus import synthetic_corpus  # noqa: E402
+from services.bulk_clustering import get_bulk_clustering_engine  # noqa: E402
+
+
+def main(count: int) -> None:
+    corpus = synthetic_corpus(count)
+
+    engine = get_bulk_clustering_engine()
+    engine.engine.warm_up()
+
+    started = time.perf_counter()
+    analysis = engine.cluster_keywords_sync(corpus.keywords, corpus.search_volumes, corpus.difficulties)
+    elapsed = time.perf_counter() - started
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{analysis.total_keywords} keywords -> {analysis.total_clusters} clusters in {elapsed:.1f}s "
+          f"(peak RSS {peak_rss_mb:.0f} MB, silhouette {analysis.selection_score:.3f})")
+    for metric in analysis.stage_metrics:
+        print(f"  {metric['stage']:>10}: {metric['seconds']:.2f}s, {metric['memory_bytes'] / 2 ** 20:.1f} MB")
+    for cluster in analysis.clusters[:5]:
+        print(f"  {cluster.name!r}: {len(cluster.keywords)} keywords, e.g. {cluster.primary_keyword!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keywords", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.keywords)
@@ -0,0 +1,159 @@
+"""
+Clustering benchmark suite.
+
+Clusters deterministic synthetic keyword corpora (see keyword_corpus.py) of
+several sizes and reports, per size:
+
+- wall time and the time and memory of each pipeline stage: preprocess
+  (preprocess_keywords), dedup (collapse_keywords), vectorize
+  (extract_features), select_k (determine_optimal_clusters), fit (final
+  k-means), summarize, gaps (_analyze_content_gaps) and pillars
+  (_identify_pillar_opportunities);
+- peak RSS of the run (each size runs in a fresh process);
+- clustering quality against the corpus' ground-truth topics (adjusted Rand
+  index, normalized mutual information) and the cosine silhouette, so a
+  speedup that degrades the clusters shows up next to the timings.
+
+``--near-duplicates`` makes that share of each corpus plural/article/word-order
+variants of other keywords, to measure near-duplicate collapsing (the dedup
+stage).
+
+Results can be written as JSON and compared against an earlier run.
+
+Usage (from backend/):
+    python benchmarks/clustering_benchmark.py --output before.json
+    python benchmarks/clustering_benchmark.py --sizes 100 500 2000 --baseline before.json
+    NEAR_DUPLICATE_COLLAPSE=false python benchmarks/clustering_benchmark.py --near-duplicates 0.3
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+DEFAULT_SIZES = [100, 500, 2000, 10000, 50000]
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_size(size: int, engine_name: str, seed: int, near_duplicate_rate: float = 0.0) -> dict:
+    """Cluster one corpus size (run in a fresh process so peak RSS is per size)"""
+    import numpy as np
+    import sklearn
+    from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+    from benchmarks.keyword_corpus import synthetic_corpus
+    from services.clustering_service import warm_clustering_engine
+
+    engine = warm_clustering_engine()
+    if engine_name == "bulk":
+        from services.bulk_clustering import get_bulk_clustering_engine
+        engine = get_bulk_clustering_engine()
+
+    corpus = synthetic_corpus(size, seed, near_duplicate_rate)
+    baseline_rss_mb = _peak_rss_mb()
+
+    started = time.perf_counter()
+    analysis = engine.cluster_keywords_sync(corpus.keywords, corpus.search_volumes, corpus.difficulties)
+    elapsed = time.perf_counter() - started
+
+    # Predicted cluster per keyword (unclustered keywords form one extra group)
+    predicted = {keyword: index for index, cluster in enumerate(analysis.clusters) for keyword in cluster.keywords}
+    truth = corpus.topics
+    labels = [predicted.get(keyword, -1) for keyword in corpus.keywords]
+
+    return {
+        "size": size,
+        "engine": engine_name,
+        "near_duplicate_rate": near_duplicate_rate,
+        "keywords": analysis.total_keywords,
+        "clusters": analysis.total_clusters,
+        "seconds": round(elapsed, 4),
+        "stages": {
+            metric["stage"]: {"seconds": metric["seconds"], "memory_mb": round(metric["memory_bytes"] / 2 ** 20, 2)}
+            for metric in analysis.stage_metrics
+        },
+        "baseline_rss_mb": round(baseline_rss_mb, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "quality": {
+            "adjusted_rand_index": round(float(adjusted_rand_score(truth, labels)), 4),
+            "normalized_mutual_info": round(float(normalized_mutual_info_score(truth, labels)), 4),
+            "silhouette": None if analysis.selection_score is None else round(analysis.selection_score, 4),
+            "unclustered": int(np.sum(np.asarray(labels) == -1))
+        },
+        "versions": {"numpy": np.__version__, "sklearn": sklearn.__version__}
+    }
+
+
+def _print_result(result: dict, baseline: dict = None) -> None:
+    quality = result["quality"]
+    line = (
+        f"{result['size']:>6} keywords -> {result['clusters']:>4} clusters in {result['seconds']:.2f}s | "
+        f"peak RSS {result['peak_rss_mb']:.0f} MB | ARI {quality['adjusted_rand_index']:.3f} "
+        f"NMI {quality['normalized_mutual_info']:.3f}"
+    )
+    if baseline:
+        line += (
+            f" | vs baseline: {baseline['seconds'] / max(result['seconds'], 1e-9):.2f}x speed, "
+            f"ARI {quality['adjusted_rand_index'] - baseline['quality']['adjusted_rand_index']:+.3f}, "
+            f"NMI {quality['normalized_mutual_info'] - baseline['quality']['normalized_mutual_info']:+.3f}"
+        )
+    print(line)
+    print("        " + ", ".join(f"{stage} {values['seconds']:.3f}s" for stage, values in result["stages"].items()))
+
+
+def main(
+    sizes: list,
+    engine: str,
+    seed: int,
+    near_duplicate_rate: float = 0.0,
+    output: str = None,
+    baseline_path: str = None
+) -> None:
+    baseline = {}
+    if baseline_path:
+        with open(baseline_path) as handle:
+            baseline = {(run["engine"], run["size"]): run for run in json.load(handle)["runs"]}
+
+    runs = []
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_size, size, engine, seed, near_duplicate_rate).result()
+        runs.append(result)
+        _print_result(result, baseline.get((engine, size)))
+
+    if output:
+        report = {
+            "benchmark": "clustering",
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "seed": seed,
+            "near_duplicate_rate": near_duplicate_rate,
+            "runs": runs
+        }
+        with open(output, "w") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--engine", choices=["standard", "bulk"], default="standard")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--near-duplicates", type=float, default=0.0, help="Share of near-duplicate keywords")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON file from an earlier run to compare against")
+    args = parser.parse_args()
+    main(args.sizes, args.engine, args.seed, args.near_duplicates, args.output, args.baseline)
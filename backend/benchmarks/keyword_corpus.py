@@ -0,0 +1,143 @@
+"""
+Deterministic synthetic keyword corpora for the clustering benchmarks.
+
+Every keyword is a topic head phrase combined with an intent modifier and,
+often, a long-tail qualifier, so a corpus looks like a keyword-tool export
+and comes with a ground-truth topic label per keyword for quality metrics.
+Optionally a share of the keywords are near-duplicates of earlier ones
+(plurals, articles, reordered words), as in real exports.
+"""
+import random
+from dataclasses import dataclass
+from typing import List
+
+# Topic -> head phrases; the topic is the ground-truth label
+TOPICS = {
+    "seo": ["seo", "seo audit", "keyword research"],
+    "crm": ["crm", "crm software", "customer relationship management"],
+    "email": ["email marketing", "newsletter", "email automation"],
+    "payroll": ["payroll", "payroll software", "payslip"],
+    "invoice": ["invoice", "invoicing software", "invoice template"],
+    "hosting": ["web hosting", "wordpress hosting", "vps"],
+    "vpn": ["vpn", "vpn service", "proxy server"],
+    "antivirus": ["antivirus", "malware removal", "virus scanner"],
+    "backup": ["cloud backup", "backup software", "data recovery"],
+    "analytics": ["web analytics", "google analytics", "analytics dashboard"],
+    "coffee": ["coffee", "coffee beans", "coffee grinder"],
+    "espresso": ["espresso machine", "espresso", "latte"],
+    "running": ["running shoes", "marathon training", "running"],
+    "yoga": ["yoga", "yoga mat", "yoga poses"],
+    "camping": ["camping", "tent", "sleeping bag"],
+    "guitar": ["guitar", "guitar chords", "electric guitar"],
+    "piano": ["piano", "piano lessons", "digital piano"],
+    "mortgage": ["mortgage", "mortgage rates", "home loan"],
+    "insurance": ["car insurance", "life insurance", "insurance quote"],
+    "budget": ["budget planner", "budgeting app", "personal finance"],
+    "recipe": ["recipe", "dinner recipes", "meal prep"],
+    "garden": ["garden", "vegetable garden", "lawn care"],
+    "solar": ["solar panels", "solar energy", "solar inverter"],
+    "laptop": ["laptop", "gaming laptop", "ultrabook"],
+    "camera": ["camera", "mirrorless camera", "dslr"],
+    "wedding": ["wedding", "wedding dress", "wedding venue"],
+    "travel": ["travel insurance", "cheap flights", "hotel booking"],
+    "resume": ["resume", "cv template", "cover letter"],
+    "tax": ["tax return", "tax calculator", "tax deductions"],
+    "retirement": ["retirement", "pension", "retirement calculator"]
+}
+
+# Intent -> modifiers, with each intent's share of a typical export
+INTENT_MODIFIERS = {
+    "informational": (0.4, [
+        "what is", "how to use", "how does", "guide", "tutorial", "tips", "for beginners",
+        "benefits of", "examples", "why use", "how to choose", "meaning"
+    ]),
+    "commercial": (0.3, [
+        "best", "top", "review", "vs", "alternative", "compare", "comparison", "recommended",
+        "pros and cons", "rating"
+    ]),
+    "transactional": (0.2, [
+        "buy", "price", "pricing", "cheap", "discount", "deal", "coupon", "free trial",
+        "order", "download"
+    ]),
+    "navigational": (0.1, [
+        "login", "sign in", "official website", "support", "contact", "account", "app"
+    ])
+}
+
+QUALIFIERS = [
+    "2024", "for small business", "for students", "at home", "in london", "near me", "uk",
+    "for mac", "for windows", "online", "for teams", "without subscription", "reddit",
+    "for families", "under 500", "australia", "for freelancers"
+]
+QUALIFIER_RATE = 0.6
+
+
+def _near_duplicate(keyword: str, rng: random.Random) -> str:
+    """A plural, article or word-order variant of a keyword"""
+    words = keyword.split()
+    variant = rng.randrange(3)
+    if variant == 0 and words[-1].isalpha() and not words[-1].endswith("s"):
+        words[-1] += "s"
+    elif variant == 1 and len(words) > 1:
+        words = words[1:] + words[:1]
+    else:
+        words.insert(0, "the")
+    return " ".join(words)
+
+
+@dataclass
+class KeywordCorpus:
+    keywords: List[str]
+    search_volumes: List[int]
+    difficulties: List[float]
+    topics: List[str]
+    intents: List[str]
+
+
+def synthetic_corpus(count: int, seed: int = 7, near_duplicate_rate: float = 0.0) -> KeywordCorpus:
+    """
+    ``count`` unique keywords, about ``near_duplicate_rate`` of them variants of
+    earlier keywords; the same arguments always give the same corpus
+    """
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    intents = list(INTENT_MODIFIERS)
+    intent_weights = [INTENT_MODIFIERS[intent][0] for intent in intents]
+
+    corpus = KeywordCorpus([], [], [], [], [])
+    seen = set()
+    while len(corpus.keywords) < count:
+        if corpus.keywords and rng.random() < near_duplicate_rate:
+            original = rng.randrange(len(corpus.keywords))
+            keyword = _near_duplicate(corpus.keywords[original], rng)
+            if keyword not in seen:
+                seen.add(keyword)
+                corpus.keywords.append(keyword)
+                corpus.search_volumes.append(int(rng.paretovariate(1.2) * 50))
+                corpus.difficulties.append(round(rng.uniform(5, 95), 1))
+                corpus.topics.append(corpus.topics[original])
+                corpus.intents.append(corpus.intents[original])
+            continue
+
+        topic = rng.choice(topics)
+        intent = rng.choices(intents, intent_weights)[0]
+        head = rng.choice(TOPICS[topic])
+        modifier = rng.choice(INTENT_MODIFIERS[intent][1])
+
+        parts = [modifier, head] if rng.random() < 0.7 else [head, modifier]
+        if rng.random() < QUALIFIER_RATE:
+            parts.append(rng.choice(QUALIFIERS))
+        if len(seen) > count // 2 and rng.random() < 0.5:
+            parts.append(f"model {rng.randint(1, 999)}")  # Long tail once the combinations thin out
+        keyword = " ".join(parts)
+        if keyword in seen:
+            continue
+
+        seen.add(keyword)
+        corpus.keywords.append(keyword)
+        # Head terms have high volume, long-tail variants low
+        corpus.search_volumes.append(int(rng.paretovariate(1.2) * 50))
+        corpus.difficulties.append(round(rng.uniform(5, 95), 1))
+        corpus.topics.append(topic)
+        corpus.intents.append(intent)
+    return corpus
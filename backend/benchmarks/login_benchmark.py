@@ -0,0 +1,95 @@
+"""
+Login storm benchmark.
+
+Measures the latency of a simulated search request while a burst of
+password verifications runs on the same event loop, once with bcrypt
+called inline (the old behaviour) and once through the bcrypt pool.
+
+Usage (from backend/):
+    python benchmarks/login_benchmark.py --logins 50 --rounds 12
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import bcrypt  # noqa: E402
+
+from services.password_service import PasswordHasher  # noqa: E402
+
+SEARCH_WORK_SECONDS = 0.005  # Simulated awaitable I/O per search
+SEARCH_INTERVAL_SECONDS = 0.01
+
+
+async def _search_probe(stop: asyncio.Event, latencies: list) -> None:
+    """Issue searches continuously and record their latency in ms"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(SEARCH_WORK_SECONDS)
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(SEARCH_INTERVAL_SECONDS)
+
+
+async def _inline_login(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+async def _run_storm(label: str, login, logins: int) -> dict:
+    latencies: list = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_search_probe(stop, latencies))
+
+    # Baseline window before the storm
+    await asyncio.sleep(0.2)
+    baseline = list(latencies)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    storm_seconds = time.perf_counter() - started
+
+    stop.set()
+    await probe
+
+    during = latencies[len(baseline):] or [0.0]
+    return {
+        "mode": label,
+        "logins": logins,
+        "storm_seconds": round(storm_seconds, 2),
+        "baseline_p50_ms": round(statistics.median(baseline), 1),
+        "search_p50_ms": round(statistics.median(during), 1),
+        "search_p95_ms": round(sorted(during)[int(len(during) * 0.95) - 1 if len(during) > 1 else 0], 1),
+        "search_max_ms": round(max(during), 1),
+        "searches": len(during)
+    }
+
+
+async def main(logins: int, rounds: int, workers: int) -> None:
+    password = "benchmark-password"
+    hasher = PasswordHasher(rounds=rounds, max_workers=workers, max_queue=logins)
+    hashed = await hasher.hash_password(password)
+
+    results = [
+        await _run_storm("inline", lambda: _inline_login(password, hashed), logins),
+        await _run_storm("pooled", lambda: hasher.verify_password(password, hashed), logins)
+    ]
+
+    for result in results:
+        print(
+            f"{result['mode']:>7}: {result['logins']} logins in {result['storm_seconds']}s | "
+            f"search p50 {result['search_p50_ms']}ms (baseline {result['baseline_p50_ms']}ms), "
+            f"p95 {result['search_p95_ms']}ms, max {result['search_max_ms']}ms over {result['searches']} searches"
+        )
+    print(f" hasher: {hasher.get_metrics()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.rounds, args.workers))
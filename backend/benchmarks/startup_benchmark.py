@@ -0,0 +1,72 @@
+"""
+API startup benchmark.
+
+Imports the API module in fresh interpreters and reports the median import
+time and whether the clustering ML stack (scikit-learn, NLTK, spaCy) was
+loaded by it; that stack should only load on the first clustering call or in
+the background warm-up. Also times the warm-up itself. Exits non-zero if the
+import pulled in any of the heavy modules.
+
+Usage (from backend/):
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+HEAVY_MODULES = ("sklearn", "nltk", "spacy")
+
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+WARMUP_PROBE = """
+import json, time
+started = time.perf_counter()
+from services.clustering_service import warm_clustering_engine
+warm_clustering_engine()
+print(json.dumps({"seconds": time.perf_counter() - started}))
+"""
+
+
+def _probe(code: str) -> dict:
+    # The database client connects lazily, so importing the app needs only these set
+    env = {"MONGO_URL": "mongodb://localhost:27017", "DB_NAME": "startup_benchmark", **os.environ}
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(module: str, runs: int, warmup: bool) -> int:
+    results = [_probe(IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)) for _ in range(runs)]
+    times = [result["seconds"] for result in results]
+    loaded = sorted({name for result in results for name in result["loaded"]})
+
+    print(f"import {module}: median {statistics.median(times):.2f}s, "
+          f"min {min(times):.2f}s, max {max(times):.2f}s over {runs} runs")
+    print(f"  heavy modules loaded at import: {', '.join(loaded) if loaded else 'none'}")
+
+    if warmup:
+        print(f"  clustering warm-up (first call / background task): {_probe(WARMUP_PROBE)['seconds']:.2f}s")
+
+    return 1 if loaded else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="server")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    args = parser.parse_args()
+    sys.exit(main(args.module, args.runs, args.warmup))
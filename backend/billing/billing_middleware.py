@@ -1,14 +1,35 @@
+import hashlib
 import logging
+import os
+import time
+import jwt
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Callable, Any
 from billing.usage_tracker import get_usage_tracker
 from database import db
 from datetime import datetime
+from ttl_cache import TTLCache
+from models.admin_models import Admin
+from routes.admin_routes import get_current_admin
 
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
+JWT_SECRET = "your-secret-key-here"  # Should match auth_routes.py
+JWT_ALGORITHM = "HS256"
+
+# Verified-token cache. Entries live until the token's exp, capped so other
+# workers pick up revocations (stored in db.revoked_tokens) within a few minutes.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_MAX_TTL = float(os.getenv("TOKEN_CACHE_MAX_TTL", "300"))
+_verified_tokens = TTLCache(ttl_seconds=TOKEN_CACHE_MAX_TTL, max_size=TOKEN_CACHE_SIZE)
+
+# Tokens revoked in or seen revoked by this worker, consulted on every cache hit. Entries
+# expire with the token; db.revoked_tokens stays authoritative if one is evicted early.
+REVOKED_TOKEN_CACHE_SIZE = int(os.getenv("REVOKED_TOKEN_CACHE_SIZE", "100000"))
+_revoked_tokens = TTLCache(ttl_seconds=TOKEN_CACHE_MAX_TTL, max_size=REVOKED_TOKEN_CACHE_SIZE)
+
 class BillingMiddleware:
     """
     Safe middleware that wraps around existing functionality
@@ -210,15 +231,52 @@ def get_company_limit_decorator():
     return _company_limit_decorator
 
 # Authentication functions for support system
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def _remember_revoked(token_hash: str, exp: float) -> None:
+    # Once the token has expired there is no need to remember it
+    _revoked_tokens.set(token_hash, True, ttl_seconds=exp - time.time())
+
+def _is_revoked_locally(token_hash: str) -> bool:
+    return _revoked_tokens.get(token_hash) is not None
+
+async def revoke_token(token: str) -> None:
+    """Revoke a user JWT (logout) in this worker and for all workers via the database"""
+    token_hash = _token_hash(token)
+    
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"verify_exp": False})
+        exp = float(payload.get("exp") or time.time() + TOKEN_CACHE_MAX_TTL)
+    except jwt.InvalidTokenError:
+        return  # Nothing to revoke
+    
+    _remember_revoked(token_hash, exp)
+    _verified_tokens.invalidate(token_hash)
+    
+    await db.revoked_tokens.update_one(
+        {"token_hash": token_hash},
+        {"$setOnInsert": {
+            "token_hash": token_hash,
+            "expires_at": datetime.utcfromtimestamp(exp),
+            "revoked_at": datetime.utcnow()
+        }},
+        upsert=True
+    )
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current user from JWT token"""
     try:
-        import jwt
-        from datetime import datetime
-        
         token = credentials.credentials
-        JWT_SECRET = "your-secret-key-here"  # Should match auth_routes.py
-        JWT_ALGORITHM = "HS256"
+        token_hash = _token_hash(token)
+        
+        if _is_revoked_locally(token_hash):
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+        
+        # Hot path: token already verified by this worker
+        cached_user = _verified_tokens.get(token_hash)
+        if cached_user is not None:
+            return cached_user
         
         # Decode JWT token
         try:
@@ -234,51 +292,37 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             if exp and datetime.utcfromtimestamp(exp) < datetime.utcnow():
                 raise HTTPException(status_code=401, detail="Token has expired")
             
-            # Return user info
-            return {
-                "email": user_email,
-                "user_id": user_id,
-                "name": user_email.split('@')[0]  # Default name
-            }
-            
         except jwt.ExpiredSignatureError:
             raise HTTPException(status_code=401, detail="Token has expired")
         except jwt.InvalidTokenError:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-    except Exception as e:
-        logger.error(f"Error getting current user: {e}")
-        raise HTTPException(status_code=401, detail="Authentication failed")
-
-async def get_admin_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get current admin from token"""
-    try:
-        token = credentials.credentials
+        # Revoked by another worker?
+        if await db.revoked_tokens.find_one({"token_hash": token_hash}, {"_id": 1}):
+            _remember_revoked(token_hash, float(exp or time.time() + TOKEN_CACHE_MAX_TTL))
+            raise HTTPException(status_code=401, detail="Token has been revoked")
         
-        # Find active admin session
-        session = await db.admin_sessions.find_one({
-            "token": token,
-            "is_active": True,
-            "expires_at": {"$gt": datetime.utcnow()}
-        })
-        
-        if not session:
-            raise HTTPException(status_code=401, detail="Invalid or expired admin token")
+        user = {
+            "email": user_email,
+            "user_id": user_id,
+            "name": user_email.split('@')[0]  # Default name
+        }
         
-        # Get admin user
-        admin = await db.admins.find_one({"id": session["admin_id"]})
-        if not admin or not admin.get("is_active", False):
-            raise HTTPException(status_code=401, detail="Admin not found or inactive")
+        ttl = min(TOKEN_CACHE_MAX_TTL, exp - time.time()) if exp else TOKEN_CACHE_MAX_TTL
+        _verified_tokens.set(token_hash, user, ttl_seconds=ttl)
         
-        return {
-            "id": admin["id"],
-            "email": admin["email"],
-            "name": admin.get("name", admin["email"]),
-            "role": admin.get("role", "admin")
-        }
+        # Return user info
+        return user
         
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Error getting current admin: {e}")
-        raise HTTPException(status_code=401, detail="Admin authentication failed")
\ No newline at end of file
+        logger.error(f"Error getting current user: {e}")
+        raise HTTPException(status_code=401, detail="Authentication failed")
+
+async def get_admin_user(admin: Admin = Depends(get_current_admin)):
+    """Get current admin as a dict (shares the cached admin-auth dependency)"""
+    return {
+        "id": admin.id,
+        "email": admin.email,
+        "name": admin.name or admin.email,
+        "role": admin.role or "admin"
+    }
@@ -1,8 +1,9 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Request, Depends
 from fastapi.responses import JSONResponse
 from typing import List, Optional
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from models.billing_models import (
     UserSubscription,
@@ -10,13 +11,16 @@ from models.billing_models import (
     SubscriptionUpdate,
     BillingDashboard,
     PaymentHistory,
+    PaymentHistoryPage,
     BillingAlert,
     PlanType,
     BillingPeriod,
     PRICING_CONFIG
 )
-from billing.stripe_service import get_stripe_service
+from billing.stripe_service import get_stripe_service, request_idempotency_key, IDEMPOTENCY_KEY_HEADER
 from billing.usage_tracker import get_usage_tracker
+from billing.usage_series import get_usage_series, ROLLUP_GRANULARITIES
+from billing.webhook_queue import enqueue_stripe_event, get_stripe_event_worker
 from database import db
 
 logger = logging.getLogger(__name__)
@@ -66,6 +70,9 @@ async def create_subscription(subscription_data: SubscriptionCreate, request: Re
     try:
         user_id = get_user_id_from_request(request)
         stripe_service = get_stripe_service()
+        idempotency_key = request_idempotency_key(
+            "subscription", user_id, request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        )
         
         # Check if user already has active subscription
         existing_subscription = await db.user_subscriptions.find_one({
@@ -83,14 +90,17 @@ async def create_subscription(subscription_data: SubscriptionCreate, request: Re
         if existing_customer and existing_customer.get("stripe_customer_id"):
             stripe_customer_id = existing_customer["stripe_customer_id"]
         else:
-            stripe_customer_id = await stripe_service.create_customer(user_id)
+            stripe_customer_id = await stripe_service.create_customer(
+                user_id, idempotency_key=f"{idempotency_key}:customer"
+            )
         
         # Create Stripe subscription
         stripe_subscription = await stripe_service.create_subscription(
             customer_id=stripe_customer_id,
             plan_type=subscription_data.plan_type,
             billing_period=subscription_data.billing_period,
-            trial_days=14
+            trial_days=14,
+            idempotency_key=idempotency_key
         )
         
         # Create subscription record in our database
@@ -106,6 +116,7 @@ async def create_subscription(subscription_data: SubscriptionCreate, request: Re
         )
         
         await db.user_subscriptions.insert_one(new_subscription.dict())
+        get_usage_tracker().invalidate_usage_cache(user_id)
         logger.info(f"Created subscription for {user_id}: {subscription_data.plan_type.value}")
         
         return new_subscription
@@ -145,7 +156,10 @@ async def update_subscription(subscription_data: SubscriptionUpdate, request: Re
         updated_stripe_subscription = await stripe_service.update_subscription(
             subscription.stripe_subscription_id,
             subscription.plan_type,
-            subscription.billing_period
+            subscription.billing_period,
+            idempotency_key=request_idempotency_key(
+                "subscription-update", user_id, request.headers.get(IDEMPOTENCY_KEY_HEADER)
+            )
         )
         
         # Update in our database
@@ -157,6 +171,7 @@ async def update_subscription(subscription_data: SubscriptionUpdate, request: Re
             {"id": subscription.id},
             {"$set": subscription.dict()}
         )
+        get_usage_tracker().invalidate_usage_cache(user_id)
         
         logger.info(f"Updated subscription for {user_id}")
         return subscription
@@ -203,6 +218,7 @@ async def cancel_subscription(request: Request):
                     }
                 }
             )
+            get_usage_tracker().invalidate_usage_cache(user_id)
             
             logger.info(f"Canceled subscription for {user_id}")
             return {"message": "Subscription canceled successfully"}
@@ -231,52 +247,128 @@ async def get_usage_limits(request: Request):
         logger.error(f"Error fetching usage limits: {e}")
         raise HTTPException(status_code=500, detail="Error fetching usage limits")
 
-@router.get("/dashboard", response_model=BillingDashboard) 
-async def get_billing_dashboard(request: Request):
-    """Get complete billing dashboard data"""
+@router.get("/usage/history")
+async def get_usage_history(
+    request: Request,
+    granularity: str = "day",
+    days: int = 30,
+    company_id: Optional[str] = None
+):
+    """Get search usage rolled up by day, week or month"""
     try:
         user_id = get_user_id_from_request(request)
-        usage_tracker = get_usage_tracker()
         
-        # Get subscription
-        subscription = await usage_tracker.get_user_subscription(user_id)
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(ROLLUP_GRANULARITIES)}")
         
-        # Get usage limits
-        usage = await usage_tracker.get_usage_limits(user_id)
+        days = max(1, min(days, 366))
+        end = datetime.utcnow()
+        start = end - timedelta(days=days - 1)
         
-        # Get payment history
-        payment_history_cursor = db.payment_history.find({
-            "user_id": user_id
-        }).sort("created_at", -1).limit(10)
+        series = await get_usage_series().get_rollup(
+            user_id,
+            granularity=granularity,
+            start=start,
+            end=end,
+            company_id=company_id
+        )
         
-        payment_history = []
-        async for payment in payment_history_cursor:
-            payment_history.append(PaymentHistory(**payment))
+        return {"granularity": granularity, "company_id": company_id, "series": series}
         
-        # Get active alerts
-        alerts_cursor = db.billing_alerts.find({
-            "user_id": user_id,
-            "acknowledged": False
-        }).sort("created_at", -1)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching usage history: {e}")
+        raise HTTPException(status_code=500, detail="Error fetching usage history")
+
+async def _get_payment_page(
+    user_id: str,
+    limit: int,
+    before: Optional[datetime] = None,
+    before_id: Optional[str] = None
+) -> PaymentHistoryPage:
+    """Keyset page of payment history, newest first, ordered by (created_at, id)"""
+    query = {"user_id": user_id}
+    if before:
+        # Payments sharing the cursor's timestamp continue after the cursor's id
+        query["$or"] = [{"created_at": {"$lt": before}}]
+        if before_id:
+            query["$or"].append({"created_at": before, "id": {"$lt": before_id}})
+    
+    # Fetch one extra row to know whether another page exists
+    payments = await db.payment_history.find(
+        query, {"_id": 0}
+    ).sort([("created_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    page = [PaymentHistory(**payment) for payment in payments[:limit]]
+    if len(payments) > limit:
+        return PaymentHistoryPage(payments=page, next_cursor=page[-1].created_at, next_cursor_id=page[-1].id)
+    return PaymentHistoryPage(payments=page)
+
+async def _get_active_alerts(user_id: str) -> List[BillingAlert]:
+    alerts = await db.billing_alerts.find({
+        "user_id": user_id,
+        "acknowledged": False
+    }, {"_id": 0}).sort("created_at", -1).to_list(length=None)
+    
+    return [BillingAlert(**alert) for alert in alerts]
+
+@router.get("/dashboard", response_model=BillingDashboard) 
+async def get_billing_dashboard(request: Request):
+    """Get complete billing dashboard data"""
+    try:
+        user_id = get_user_id_from_request(request)
+        usage_tracker = get_usage_tracker()
         
-        alerts = []
-        async for alert in alerts_cursor:
-            alerts.append(BillingAlert(**alert))
+        cached = usage_tracker.dashboard_cache.get(user_id)
+        if cached is not None:
+            return cached
         
-        return BillingDashboard(
+        # Subscription, usage, first payment page and alerts are independent
+        subscription, usage, payments, alerts = await asyncio.gather(
+            usage_tracker.get_user_subscription(user_id),
+            usage_tracker.get_usage_limits(user_id),
+            _get_payment_page(user_id, limit=10),
+            _get_active_alerts(user_id)
+        )
+        
+        dashboard = BillingDashboard(
             subscription=subscription,
             usage=usage,
-            payment_history=payment_history,
+            payment_history=payments.payments,
+            next_payment_cursor=payments.next_cursor,
+            next_payment_cursor_id=payments.next_cursor_id,
             alerts=alerts,
             pricing_config=PRICING_CONFIG
         )
         
+        usage_tracker.dashboard_cache.set(user_id, dashboard)
+        return dashboard
+        
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error fetching billing dashboard: {e}")
         raise HTTPException(status_code=500, detail="Error fetching billing dashboard")
 
+@router.get("/payments", response_model=PaymentHistoryPage)
+async def get_payment_history(
+    request: Request,
+    limit: int = 10,
+    before: Optional[datetime] = None,
+    before_id: Optional[str] = None
+):
+    """Get payment history page; pass next_cursor/next_cursor_id back as `before`/`before_id` for the next page"""
+    try:
+        user_id = get_user_id_from_request(request)
+        return await _get_payment_page(user_id, limit=max(1, min(limit, 100)), before=before, before_id=before_id)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching payment history: {e}")
+        raise HTTPException(status_code=500, detail="Error fetching payment history")
+
 @router.post("/alerts/{alert_id}/acknowledge")
 async def acknowledge_alert(alert_id: str, request: Request):
     """Acknowledge a billing alert"""
@@ -299,6 +391,7 @@ async def acknowledge_alert(alert_id: str, request: Request):
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Alert not found")
         
+        get_usage_tracker().dashboard_cache.invalidate(user_id)
         return {"message": "Alert acknowledged"}
         
     except HTTPException:
@@ -309,99 +402,27 @@ async def acknowledge_alert(alert_id: str, request: Request):
 
 @router.post("/webhook")
 async def stripe_webhook(request: Request):
-    """Handle Stripe webhooks"""
+    """
+    Receive Stripe webhooks.
+    Events are verified, queued and acknowledged immediately;
+    the Stripe event worker applies them in the background.
+    """
+    payload = await request.body()
+    sig_header = request.headers.get('stripe-signature')
+    
+    stripe_service = get_stripe_service()
+    event = stripe_service.handle_webhook(payload.decode(), sig_header)
+    
+    if not event:
+        raise HTTPException(status_code=400, detail="Invalid webhook")
+    
     try:
-        payload = await request.body()
-        sig_header = request.headers.get('stripe-signature')
-        
-        stripe_service = get_stripe_service()
-        event = stripe_service.handle_webhook(payload.decode(), sig_header)
-        
-        if not event:
-            raise HTTPException(status_code=400, detail="Invalid webhook")
-        
-        # Handle different webhook events
-        if event['type'] == 'invoice.payment_succeeded':
-            await _handle_payment_succeeded(event['data'])
-        elif event['type'] == 'invoice.payment_failed':
-            await _handle_payment_failed(event['data'])
-        elif event['type'] == 'customer.subscription.updated':
-            await _handle_subscription_updated(event['data'])
-        elif event['type'] == 'customer.subscription.deleted':
-            await _handle_subscription_canceled(event['data'])
+        if await enqueue_stripe_event(event):
+            get_stripe_event_worker().wake()
         
         return {"received": True}
         
     except Exception as e:
-        logger.error(f"Error handling webhook: {e}")
+        # Not acknowledged - Stripe will redeliver
+        logger.error(f"Error queueing webhook {event.get('id')}: {e}")
         raise HTTPException(status_code=500, detail="Webhook error")
-
-async def _handle_payment_succeeded(invoice_data):
-    """Handle successful payment webhook"""
-    try:
-        subscription_id = invoice_data.get('subscription')
-        if not subscription_id:
-            return
-        
-        # Find subscription in our database
-        subscription_record = await db.user_subscriptions.find_one({
-            "stripe_subscription_id": subscription_id
-        })
-        
-        if subscription_record:
-            # Create payment history record
-            payment = PaymentHistory(
-                user_id=subscription_record["user_id"],
-                subscription_id=subscription_record["id"],
-                amount=invoice_data.get('amount_paid', 0),
-                status="succeeded",
-                plan_type=subscription_record["plan_type"],
-                billing_period=subscription_record["billing_period"]
-            )
-            
-            await db.payment_history.insert_one(payment.dict())
-            
-            # Reset usage for the new billing period
-            usage_tracker = get_usage_tracker()
-            await usage_tracker.reset_monthly_usage(subscription_record["user_id"])
-            
-            logger.info(f"Payment succeeded for user: {subscription_record['user_id']}")
-            
-    except Exception as e:
-        logger.error(f"Error handling payment success: {e}")
-
-async def _handle_payment_failed(invoice_data):
-    """Handle failed payment webhook"""
-    try:
-        subscription_id = invoice_data.get('subscription')
-        if not subscription_id:
-            return
-        
-        # Find subscription in our database
-        subscription_record = await db.user_subscriptions.find_one({
-            "stripe_subscription_id": subscription_id
-        })
-        
-        if subscription_record:
-            # Create alert for payment failure
-            alert = BillingAlert(
-                user_id=subscription_record["user_id"],
-                alert_type="payment_failed",
-                message="Your payment failed. Please update your payment method to continue using the service."
-            )
-            
-            await db.billing_alerts.insert_one(alert.dict())
-            logger.info(f"Payment failed for user: {subscription_record['user_id']}")
-            
-    except Exception as e:
-        logger.error(f"Error handling payment failure: {e}")
-
-async def _handle_subscription_updated(subscription_data):
-    """Handle subscription update webhook"""
-    # Implementation for subscription updates
-    pass
-
-async def _handle_subscription_canceled(subscription_data):
-    """Handle subscription cancellation webhook"""
-    # Implementation for subscription cancellations
-    pass
\ No newline at end of file
@@ -1,7 +1,13 @@
 import stripe
 import os
+import time
+import hashlib
+import uuid
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable
 from datetime import datetime, timedelta
 from models.billing_models import (
     PlanType, 
@@ -13,15 +19,89 @@ from models.billing_models import (
 
 logger = logging.getLogger(__name__)
 
+# Stripe transport settings. STRIPE_API_BASE points the client at a local
+# stripe-mock (e.g. http://localhost:12111) for testing.
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE')
+STRIPE_MAX_WORKERS = int(os.getenv('STRIPE_MAX_WORKERS', '8'))
+STRIPE_TIMEOUT_SECONDS = int(os.getenv('STRIPE_TIMEOUT_SECONDS', '30'))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv('STRIPE_MAX_NETWORK_RETRIES', '2'))
+
+# Clients may send this header to make retries of one request replay its Stripe calls
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+def request_idempotency_key(operation: str, scope: str, client_key: Optional[str] = None) -> str:
+    """
+    Idempotency key for one logical client request, passed to every Stripe call the request makes.
+    Uses the client's Idempotency-Key (scoped to the operation and user) so its retries replay the
+    first request; without one, each request gets a fresh key.
+    """
+    if client_key:
+        key = hashlib.sha256(client_key.encode('utf-8')).hexdigest()[:32]
+    else:
+        key = uuid.uuid4().hex
+    return f"{operation}-{hashlib.sha256(scope.encode('utf-8')).hexdigest()[:16]}-{key}"
+
 class StripeService:
     def __init__(self):
         # Initialize Stripe with API key from environment
         stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
         self.webhook_secret = os.getenv('STRIPE_WEBHOOK_SECRET')
         
+        if STRIPE_API_BASE:
+            stripe.api_base = STRIPE_API_BASE
+        
+        # The stripe library is blocking. Calls run on a bounded pool so they never
+        # hold the event loop; RequestsClient keeps one keep-alive session per thread.
+        stripe.max_network_retries = STRIPE_MAX_NETWORK_RETRIES
+        stripe.default_http_client = stripe.http_client.RequestsClient(timeout=STRIPE_TIMEOUT_SECONDS)
+        self._executor = ThreadPoolExecutor(max_workers=STRIPE_MAX_WORKERS, thread_name_prefix="stripe")
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        
         # Create products and prices in Stripe if they don't exist
         self._ensure_products_exist()
     
+    async def _call(self, operation: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking Stripe API call on the Stripe pool and record its latency"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record_call(operation, (time.perf_counter() - started) * 1000, failed)
+    
+    def _record_call(self, operation: str, elapsed_ms: float, failed: bool) -> None:
+        stats = self._metrics.setdefault(operation, {
+            "calls": 0,
+            "errors": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "last_ms": 0.0
+        })
+        stats["calls"] += 1
+        stats["errors"] += 1 if failed else 0
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["last_ms"] = elapsed_ms
+        logger.debug(f"Stripe {operation} took {elapsed_ms:.1f}ms")
+    
+    def get_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Per-operation Stripe call counts and latencies"""
+        return {
+            operation: {
+                **stats,
+                "avg_ms": round(stats["total_ms"] / stats["calls"], 2) if stats["calls"] else 0.0
+            }
+            for operation, stats in self._metrics.items()
+        }
+    
+    def close(self) -> None:
+        """Shut down the Stripe worker pool"""
+        self._executor.shutdown(wait=False)
+    
     def _ensure_products_exist(self):
         """Ensure all our products and prices exist in Stripe"""
         try:
@@ -31,10 +111,13 @@ class StripeService:
         except Exception as e:
             logger.error(f"Error ensuring Stripe products exist: {e}")
     
-    async def create_customer(self, user_email: str, user_name: str = None) -> str:
+    async def create_customer(self, user_email: str, user_name: str = None, *, idempotency_key: str) -> str:
         """Create a Stripe customer"""
         try:
-            customer = stripe.Customer.create(
+            customer = await self._call(
+                "customer.create",
+                stripe.Customer.create,
+                idempotency_key=idempotency_key,
                 email=user_email,
                 name=user_name or user_email,
                 metadata={
@@ -54,12 +137,17 @@ class StripeService:
         plan_type: PlanType,
         billing_period: BillingPeriod,
         custom_price: int,
-        trial_days: int = 0
+        trial_days: int = 0,
+        *,
+        idempotency_key: str
     ) -> Dict[str, Any]:
         """Create a subscription with custom pricing"""
         try:
             # Create price object in Stripe with custom amount
-            price = stripe.Price.create(
+            price = await self._call(
+                "price.create",
+                stripe.Price.create,
+                idempotency_key=f"{idempotency_key}:price",
                 unit_amount=custom_price * 100,  # Convert to cents
                 currency='usd',
                 recurring={
@@ -93,7 +181,12 @@ class StripeService:
             if trial_days > 0:
                 subscription_params['trial_period_days'] = trial_days
             
-            subscription = stripe.Subscription.create(**subscription_params)
+            subscription = await self._call(
+                "subscription.create",
+                stripe.Subscription.create,
+                idempotency_key=f"{idempotency_key}:subscription",
+                **subscription_params
+            )
             
             logger.info(f"Created custom subscription {subscription.id} for customer {customer_id} with price ${custom_price}")
             
@@ -115,7 +208,9 @@ class StripeService:
         customer_id: str, 
         plan_type: PlanType,
         billing_period: BillingPeriod,
-        trial_days: int = 14
+        trial_days: int = 14,
+        *,
+        idempotency_key: str
     ) -> Dict[str, Any]:
         """Create a subscription with trial period"""
         try:
@@ -123,7 +218,10 @@ class StripeService:
             price_amount = get_plan_price(plan_type, billing_period)
             
             # Create price object in Stripe
-            price = stripe.Price.create(
+            price = await self._call(
+                "price.create",
+                stripe.Price.create,
+                idempotency_key=f"{idempotency_key}:price",
                 unit_amount=price_amount * 100,  # Convert to cents
                 currency='usd',
                 recurring={
@@ -139,7 +237,10 @@ class StripeService:
             )
             
             # Create subscription with trial
-            subscription = stripe.Subscription.create(
+            subscription = await self._call(
+                "subscription.create",
+                stripe.Subscription.create,
+                idempotency_key=f"{idempotency_key}:subscription",
                 customer=customer_id,
                 items=[{'price': price.id}],
                 trial_period_days=trial_days,
@@ -169,17 +270,23 @@ class StripeService:
         self, 
         subscription_id: str, 
         new_plan_type: PlanType,
-        new_billing_period: BillingPeriod
+        new_billing_period: BillingPeriod,
+        *,
+        idempotency_key: str
     ) -> Dict[str, Any]:
         """Update existing subscription to new plan"""
         try:
-            subscription = stripe.Subscription.retrieve(subscription_id)
+            subscription = await self._call("subscription.retrieve", stripe.Subscription.retrieve, subscription_id)
+            current_item = subscription['items']['data'][0]
             
             # Calculate new price
             new_price_amount = get_plan_price(new_plan_type, new_billing_period)
             
             # Create new price
-            new_price = stripe.Price.create(
+            new_price = await self._call(
+                "price.create",
+                stripe.Price.create,
+                idempotency_key=f"{idempotency_key}:price",
                 unit_amount=new_price_amount * 100,
                 currency='usd',
                 recurring={
@@ -195,10 +302,13 @@ class StripeService:
             )
             
             # Update subscription
-            updated_subscription = stripe.Subscription.modify(
+            updated_subscription = await self._call(
+                "subscription.modify",
+                stripe.Subscription.modify,
                 subscription_id,
+                idempotency_key=f"{idempotency_key}:subscription",
                 items=[{
-                    'id': subscription['items']['data'][0].id,
+                    'id': current_item.id,
                     'price': new_price.id,
                 }],
                 proration_behavior='immediate_with_remainder',
@@ -225,12 +335,14 @@ class StripeService:
         """Cancel a subscription"""
         try:
             if at_period_end:
-                subscription = stripe.Subscription.modify(
+                subscription = await self._call(
+                    "subscription.modify",
+                    stripe.Subscription.modify,
                     subscription_id,
                     cancel_at_period_end=True
                 )
             else:
-                subscription = stripe.Subscription.delete(subscription_id)
+                subscription = await self._call("subscription.delete", stripe.Subscription.delete, subscription_id)
             
             logger.info(f"Canceled subscription {subscription_id}")
             return True
@@ -242,7 +354,7 @@ class StripeService:
     async def get_subscription(self, subscription_id: str) -> Optional[Dict[str, Any]]:
         """Get subscription details from Stripe"""
         try:
-            subscription = stripe.Subscription.retrieve(subscription_id)
+            subscription = await self._call("subscription.retrieve", stripe.Subscription.retrieve, subscription_id)
             
             return {
                 'id': subscription.id,
@@ -262,11 +374,16 @@ class StripeService:
         self, 
         amount: int, 
         customer_id: str,
-        metadata: Dict[str, str] = None
+        metadata: Dict[str, str] = None,
+        *,
+        idempotency_key: str
     ) -> Dict[str, Any]:
         """Create a payment intent for one-time payments"""
         try:
-            intent = stripe.PaymentIntent.create(
+            intent = await self._call(
+                "payment_intent.create",
+                stripe.PaymentIntent.create,
+                idempotency_key=idempotency_key,
                 amount=amount * 100,  # Convert to cents
                 currency='usd',
                 customer=customer_id,
@@ -292,7 +409,9 @@ class StripeService:
             logger.info(f"Received Stripe webhook: {event['type']}")
             
             return {
+                'id': event['id'],
                 'type': event['type'],
+                'created': event.get('created'),
                 'data': event['data']['object']
             }
             
@@ -314,4 +433,11 @@ def get_stripe_service() -> StripeService:
     global _stripe_service
     if _stripe_service is None:
         _stripe_service = StripeService()
-    return _stripe_service
\ No newline at end of file
+    return _stripe_service
+
+def shutdown_stripe_service() -> None:
+    """Release the Stripe worker pool if the service was created"""
+    global _stripe_service
+    if _stripe_service is not None:
+        _stripe_service.close()
+        _stripe_service = None
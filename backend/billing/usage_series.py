@@ -0,0 +1,191 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# One bucket document per (user, company, month) with one slot per day
+USAGE_DAILY_COLLECTION = "usage_daily"
+DAYS_PER_BUCKET = 31
+
+ROLLUP_GRANULARITIES = ("day", "week", "month")
+
+# Searches without a signed-in user are not tracked (live or in the backfill)
+ANONYMOUS_USER_ID = "anonymous"
+
+
+def _empty_days() -> List[int]:
+    return [0] * DAYS_PER_BUCKET
+
+
+def _month_range(start: datetime, end: datetime) -> List[str]:
+    """List YYYY-MM keys covering start..end inclusive"""
+    months = []
+    cursor = start.replace(day=1)
+    while cursor <= end:
+        months.append(cursor.strftime("%Y-%m"))
+        cursor = (cursor + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def _period_key(day: datetime, granularity: str) -> str:
+    if granularity == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == "month":
+        return day.strftime("%Y-%m")
+    return day.strftime("%Y-%m-%d")
+
+
+class UsageSeries:
+    """
+    Compact per-day search usage per user and company.
+    Maintained on the search write path so dashboards never scan search_history.
+    """
+
+    def __init__(self):
+        self.db = db
+
+    async def record_search(self, user_id: str, company_id: Optional[str], when: Optional[datetime] = None) -> None:
+        """Increment today's slot in the user's bucket for this company"""
+        if user_id == ANONYMOUS_USER_ID:
+            return
+
+        when = when or datetime.utcnow()
+        bucket_filter = {
+            "user_id": user_id,
+            "company_id": company_id,
+            "month_year": when.strftime("%Y-%m")
+        }
+        increment = {
+            "$inc": {f"days.{when.day - 1}": 1, "total": 1},
+            "$set": {"updated_at": datetime.utcnow()}
+        }
+
+        try:
+            result = await self.db[USAGE_DAILY_COLLECTION].update_one(bucket_filter, increment)
+            if result.matched_count:
+                return
+
+            # First search of the month - create the bucket with a pre-sized array
+            days = _empty_days()
+            days[when.day - 1] = 1
+            try:
+                await self.db[USAGE_DAILY_COLLECTION].insert_one({
+                    **bucket_filter,
+                    "days": days,
+                    "total": 1,
+                    "created_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow()
+                })
+            except DuplicateKeyError:
+                # Another request created the bucket first
+                await self.db[USAGE_DAILY_COLLECTION].update_one(bucket_filter, increment)
+
+        except Exception as e:
+            logger.error(f"Error recording daily usage for {user_id}: {e}")
+
+    async def get_rollup(
+        self,
+        user_id: str,
+        granularity: str = "day",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        company_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Roll daily buckets up to day/week/month totals for start..end"""
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(f"Unsupported granularity: {granularity}")
+
+        end = (end or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+        start = (start or end - timedelta(days=29)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        query = {
+            "user_id": user_id,
+            "month_year": {"$in": _month_range(start, end)}
+        }
+        if company_id:
+            query["company_id"] = company_id
+
+        # Sum the buckets of all companies per month
+        month_days: Dict[str, List[int]] = defaultdict(_empty_days)
+        cursor = self.db[USAGE_DAILY_COLLECTION].find(query, {"_id": 0, "month_year": 1, "days": 1})
+        async for bucket in cursor:
+            totals = month_days[bucket["month_year"]]
+            for index, count in enumerate(bucket.get("days", [])):
+                totals[index] += count
+
+        series: Dict[str, int] = {}
+        day = start
+        while day <= end:
+            key = _period_key(day, granularity)
+            series[key] = series.get(key, 0) + month_days[day.strftime("%Y-%m")][day.day - 1]
+            day += timedelta(days=1)
+
+        return [{"period": period, "searches": count} for period, count in series.items()]
+
+    async def backfill_from_search_history(self, since: Optional[datetime] = None, batch_size: int = 500) -> int:
+        """
+        Rebuild daily buckets from search_history.
+        Buckets touched are overwritten, so the job can be re-run safely.
+        """
+        match: Dict[str, Any] = {"user_id": {"$ne": ANONYMOUS_USER_ID}}
+        if since:
+            match["created_at"] = {"$gte": since.replace(day=1, hour=0, minute=0, second=0, microsecond=0)}
+
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "company_id": "$company_id",
+                    "month_year": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+                    "day": {"$dayOfMonth": "$created_at"}
+                },
+                "count": {"$sum": 1}
+            }}
+        ]
+
+        buckets: Dict[tuple, List[int]] = defaultdict(_empty_days)
+        async for row in self.db.search_history.aggregate(pipeline, allowDiskUse=True):
+            key = row["_id"]
+            buckets[(key["user_id"], key.get("company_id"), key["month_year"])][key["day"] - 1] = row["count"]
+
+        operations = []
+        written = 0
+        for (user_id, company_id, month_year), days in buckets.items():
+            operations.append(UpdateOne(
+                {"user_id": user_id, "company_id": company_id, "month_year": month_year},
+                {
+                    "$set": {"days": days, "total": sum(days), "updated_at": datetime.utcnow()},
+                    "$setOnInsert": {"created_at": datetime.utcnow()}
+                },
+                upsert=True
+            ))
+            if len(operations) >= batch_size:
+                await self.db[USAGE_DAILY_COLLECTION].bulk_write(operations, ordered=False)
+                written += len(operations)
+                operations = []
+
+        if operations:
+            await self.db[USAGE_DAILY_COLLECTION].bulk_write(operations, ordered=False)
+            written += len(operations)
+
+        logger.info(f"Backfilled {written} daily usage buckets from search history")
+        return written
+
+# Singleton instance
+_usage_series = None
+
+def get_usage_series() -> UsageSeries:
+    """Get or create usage series instance"""
+    global _usage_series
+    if _usage_series is None:
+        _usage_series = UsageSeries()
+    return _usage_series
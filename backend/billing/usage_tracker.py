@@ -1,7 +1,12 @@
+import asyncio
 import logging
+import os
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from database import db
+from ttl_cache import TTLCache
 from models.billing_models import (
     UsageTracking, 
     UserSubscription, 
@@ -14,6 +19,11 @@ from models.billing_models import (
 
 logger = logging.getLogger(__name__)
 
+# Short memo for get_usage_limits - billing checks run on every search
+USAGE_LIMITS_CACHE_TTL = float(os.getenv("USAGE_LIMITS_CACHE_TTL", "5"))
+# Billing dashboard responses (polled by the frontend)
+BILLING_DASHBOARD_CACHE_TTL = float(os.getenv("BILLING_DASHBOARD_CACHE_TTL", "30"))
+
 class UsageTracker:
     """
     Safe usage tracking that wraps around existing functionality
@@ -22,32 +32,38 @@ class UsageTracker:
     
     def __init__(self):
         self.db = db
+        self._limits_cache = TTLCache(ttl_seconds=USAGE_LIMITS_CACHE_TTL)
+        self.dashboard_cache = TTLCache(ttl_seconds=BILLING_DASHBOARD_CACHE_TTL)
+    
+    def invalidate_usage_cache(self, user_id: str) -> None:
+        """Drop memoized usage limits and dashboard after a billing-relevant write"""
+        self._limits_cache.invalidate(user_id)
+        self.dashboard_cache.invalidate(user_id)
     
     async def get_current_usage(self, user_id: str) -> UsageTracking:
         """Get or create current month's usage tracking"""
         current_month = datetime.utcnow().strftime("%Y-%m")
         
-        # Try to get existing usage record
-        usage_record = await self.db.usage_tracking.find_one({
-            "user_id": user_id,
-            "month_year": current_month
-        })
-        
-        if usage_record:
-            return UsageTracking(**usage_record)
-        
-        # Create new usage record for this month
+        # Find-or-insert in a single round-trip
         new_usage = UsageTracking(
             user_id=user_id,
             month_year=current_month,
             search_count=0,
             company_count=0
-        )
+        ).dict()
+        del new_usage["user_id"], new_usage["month_year"]
         
-        await self.db.usage_tracking.insert_one(new_usage.dict())
-        logger.info(f"Created new usage tracking for {user_id} - {current_month}")
+        usage_record = await self.db.usage_tracking.find_one_and_update(
+            {
+                "user_id": user_id,
+                "month_year": current_month
+            },
+            {"$setOnInsert": new_usage},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
         
-        return new_usage
+        return UsageTracking(**usage_record)
     
     async def get_user_subscription(self, user_id: str) -> Optional[UserSubscription]:
         """Get user's current subscription"""
@@ -64,8 +80,26 @@ class UsageTracker:
     
     async def get_usage_limits(self, user_id: str) -> UsageLimits:
         """Get user's current usage limits and remaining quota"""
-        # Get subscription (or default to solo plan)
-        subscription = await self.get_user_subscription(user_id)
+        cached = self._limits_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
+        # Subscription, usage and counts are independent - fetch them concurrently
+        subscription, usage, current_companies, current_users = await asyncio.gather(
+            self.get_user_subscription(user_id),
+            self.get_current_usage(user_id),
+            # Count current companies (from existing companies table - safe read)
+            self.db.companies.count_documents({
+                "user_id": user_id
+            }),
+            # Count current users across all companies owned by this user
+            self.db.company_users.count_documents({
+                "user_id": user_id,
+                "invitation_status": "active"
+            })
+        )
+        
+        # Default to solo plan when there is no subscription
         plan_type = subscription.plan_type if subscription else PlanType.SOLO
         
         # Get plan limits
@@ -74,20 +108,7 @@ class UsageTracker:
         company_limit = plan_config["company_limit"]
         user_limit = plan_config["user_limit"]
         
-        # Get current usage
-        usage = await self.get_current_usage(user_id)
         current_searches = usage.search_count
-        
-        # Count current companies (from existing companies table - safe read)
-        current_companies = await self.db.companies.count_documents({
-            "user_id": user_id
-        })
-        
-        # Count current users across all companies owned by this user
-        current_users = await self.db.company_users.count_documents({
-            "user_id": user_id,
-            "invitation_status": "active"
-        })
         # Add 1 for the owner themselves
         current_users += 1
         
@@ -100,7 +121,7 @@ class UsageTracker:
         next_month = datetime.utcnow().replace(day=1) + timedelta(days=32)
         reset_date = next_month.replace(day=1)
         
-        return UsageLimits(
+        limits = UsageLimits(
             search_limit=search_limit,
             company_limit=company_limit,
             user_limit=user_limit,
@@ -112,6 +133,9 @@ class UsageTracker:
             users_remaining=users_remaining,
             reset_date=reset_date
         )
+        
+        self._limits_cache.set(user_id, limits)
+        return limits
     
     async def can_perform_search(self, user_id: str) -> Dict[str, Any]:
         """Check if user can perform a search"""
@@ -165,6 +189,7 @@ class UsageTracker:
                 upsert=True
             )
             
+            self.invalidate_usage_cache(user_id)
             logger.info(f"Tracked search usage for {user_id}")
             
             # Check if user is approaching limits and create alerts
@@ -200,6 +225,7 @@ class UsageTracker:
                 upsert=True
             )
             
+            self.invalidate_usage_cache(user_id)
             logger.info(f"Tracked company creation for {user_id}")
             return True
             
@@ -251,6 +277,7 @@ class UsageTracker:
                         message=alert_data["message"]
                     )
                     await self.db.billing_alerts.insert_one(alert.dict())
+                    self.dashboard_cache.invalidate(user_id)
                     logger.info(f"Created billing alert for {user_id}: {alert_data['alert_type']}")
                     
         except Exception as e:
@@ -298,6 +325,7 @@ class UsageTracker:
             )
             
             await self.db.company_users.insert_one(new_user.dict())
+            self.invalidate_usage_cache(user_id)
             logger.info(f"Added user {user_id} to company {company_id}")
             return True
             
@@ -322,6 +350,7 @@ class UsageTracker:
             )
             
             if result.modified_count > 0:
+                self.invalidate_usage_cache(user_id)
                 logger.info(f"Removed user {user_id} from company {company_id}")
                 return True
             return False
@@ -357,66 +386,83 @@ class UsageTracker:
     async def get_user_companies(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all companies a user has access to (owned or invited)"""
         try:
-            # Get companies where user is owner
-            owned_companies_cursor = self.db.companies.find({
-                "user_id": user_id
-            })
-            
-            companies = []
-            async for company in owned_companies_cursor:
-                companies.append({
-                    "id": company["id"],
-                    "name": company["name"],
-                    "role": "owner",
-                    "created_at": company["created_at"]
-                })
-            
-            # Get companies where user is invited
-            invited_companies_cursor = self.db.company_users.find({
-                "user_id": user_id,
-                "invitation_status": "active"
-            })
-            
-            async for company_user in invited_companies_cursor:
-                # Get company details
-                company = await self.db.companies.find_one({
-                    "id": company_user["company_id"]
-                })
-                
-                if company:
-                    companies.append({
-                        "id": company["id"],
-                        "name": company["name"],
-                        "role": company_user["role"],
-                        "created_at": company_user["created_at"]
-                    })
-            
-            return companies
+            # Owned companies unioned with active memberships in one round-trip.
+            # Owned companies sort first, then memberships, each by created_at.
+            pipeline = [
+                {"$match": {"user_id": user_id}},
+                {"$project": {
+                    "_id": 0,
+                    "id": 1,
+                    "name": 1,
+                    "role": {"$literal": "owner"},
+                    "created_at": 1,
+                    "_owner_rank": {"$literal": 0}
+                }},
+                {"$unionWith": {
+                    "coll": "company_users",
+                    "pipeline": [
+                        {"$match": {
+                            "user_id": user_id,
+                            "invitation_status": "active"
+                        }},
+                        {"$lookup": {
+                            "from": "companies",
+                            "localField": "company_id",
+                            "foreignField": "id",
+                            "as": "company"
+                        }},
+                        {"$unwind": "$company"},
+                        {"$project": {
+                            "_id": 0,
+                            "id": "$company.id",
+                            "name": "$company.name",
+                            "role": 1,
+                            "created_at": 1,
+                            "_owner_rank": {"$literal": 1}
+                        }}
+                    ]
+                }},
+                {"$sort": {"_owner_rank": 1, "created_at": 1}},
+                {"$project": {"_owner_rank": 0}}
+            ]
+            
+            return await self.db.companies.aggregate(pipeline).to_list(length=None)
             
         except Exception as e:
             logger.error(f"Error getting user companies: {e}")
             return []
     
-    async def reset_monthly_usage(self, user_id: str) -> bool:
-        """Reset usage counters (typically called on subscription renewal)"""
+    async def reset_monthly_usage(self, user_id: str, reset_key: Optional[str] = None) -> bool:
+        """
+        Reset usage counters (typically called on subscription renewal).
+        With a ``reset_key`` (e.g. the paid invoice) the reset is applied at
+        most once per key, so a retried webhook doesn't wipe usage counted since.
+        """
         try:
             current_month = datetime.utcnow().strftime("%Y-%m")
+            query = {
+                "user_id": user_id,
+                "month_year": current_month
+            }
+            update = {
+                "search_count": 0,
+                "last_reset": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }
+            if reset_key:
+                query["last_reset_key"] = {"$ne": reset_key}
+                update["last_reset_key"] = reset_key
+            
+            try:
+                await self.db.usage_tracking.update_one(query, {"$set": update}, upsert=True)
+            except DuplicateKeyError:
+                # The month's record exists with this reset_key: already reset for it
+                # (possibly by another process, so this one may still cache pre-reset usage)
+                self.invalidate_usage_cache(user_id)
+                logger.info(f"Usage reset {reset_key} already applied for {user_id}")
+                return True
             
-            await self.db.usage_tracking.update_one(
-                {
-                    "user_id": user_id,
-                    "month_year": current_month
-                },
-                {
-                    "$set": {
-                        "search_count": 0,
-                        "last_reset": datetime.utcnow(),
-                        "updated_at": datetime.utcnow()
-                    }
-                },
-                upsert=True
-            )
-            
+            self.invalidate_usage_cache(user_id)
             logger.info(f"Reset monthly usage for {user_id}")
             return True
             
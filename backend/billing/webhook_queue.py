@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+
+from pymongo.errors import DuplicateKeyError
+
+from models.billing_models import PaymentHistory, BillingAlert
+from billing.usage_tracker import get_usage_tracker
+from database import db
+
+logger = logging.getLogger(__name__)
+
+STRIPE_EVENTS_COLLECTION = "stripe_events"
+
+# Worker settings
+STRIPE_EVENT_WORKERS = int(os.getenv("STRIPE_EVENT_WORKERS", "4"))
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.getenv("STRIPE_EVENT_MAX_ATTEMPTS", "8"))
+STRIPE_EVENT_POLL_SECONDS = float(os.getenv("STRIPE_EVENT_POLL_SECONDS", "5"))
+STRIPE_EVENT_LEASE_SECONDS = 120
+STRIPE_EVENT_BATCH_SIZE = 500
+
+class EventStatus:
+    PENDING = "pending"
+    PROCESSING = "processing"
+    PROCESSED = "processed"
+    DEAD_LETTER = "dead_letter"
+
+async def enqueue_stripe_event(event: Dict[str, Any]) -> bool:
+    """
+    Append a verified Stripe event to the queue.
+    Returns False if the event was already received (Stripe redelivery).
+    """
+    data = event.get("data") or {}
+    now = datetime.utcnow()
+
+    try:
+        await db[STRIPE_EVENTS_COLLECTION].insert_one({
+            "id": event["id"],
+            "type": event["type"],
+            "customer_id": data.get("customer"),
+            "stripe_created": event.get("created") or 0,
+            "data": data,
+            "status": EventStatus.PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "lease_expires_at": None,
+            "last_error": None,
+            "received_at": now,
+            "processed_at": None
+        })
+        return True
+    except DuplicateKeyError:
+        logger.info(f"Duplicate Stripe event ignored: {event['id']}")
+        return False
+
+# Event handlers - must raise on failure so the worker can retry
+
+async def _handle_payment_succeeded(event_id: str, invoice_data: Dict[str, Any]) -> None:
+    """Handle successful payment webhook"""
+    subscription_id = invoice_data.get('subscription')
+    if not subscription_id:
+        return
+
+    # Find subscription in our database
+    subscription_record = await db.user_subscriptions.find_one({
+        "stripe_subscription_id": subscription_id
+    })
+
+    if not subscription_record:
+        return
+
+    # Create payment history record (keyed by invoice so retries don't duplicate it)
+    payment = PaymentHistory(
+        user_id=subscription_record["user_id"],
+        subscription_id=subscription_record["id"],
+        stripe_invoice_id=invoice_data.get('id') or event_id,
+        stripe_payment_intent_id=invoice_data.get('payment_intent'),
+        amount=invoice_data.get('amount_paid', 0),
+        status="succeeded",
+        plan_type=subscription_record["plan_type"],
+        billing_period=subscription_record["billing_period"]
+    )
+
+    await db.payment_history.update_one(
+        {"stripe_invoice_id": payment.stripe_invoice_id},
+        {"$setOnInsert": payment.dict()},
+        upsert=True
+    )
+
+    # Reset usage for the new billing period (once per invoice, however often the event is retried)
+    usage_tracker = get_usage_tracker()
+    reset_key = f"invoice:{payment.stripe_invoice_id}"
+    if not await usage_tracker.reset_monthly_usage(subscription_record["user_id"], reset_key=reset_key):
+        raise RuntimeError("Failed to reset monthly usage")
+
+    logger.info(f"Payment succeeded for user: {subscription_record['user_id']}")
+
+async def _handle_payment_failed(event_id: str, invoice_data: Dict[str, Any]) -> None:
+    """Handle failed payment webhook"""
+    subscription_id = invoice_data.get('subscription')
+    if not subscription_id:
+        return
+
+    # Find subscription in our database
+    subscription_record = await db.user_subscriptions.find_one({
+        "stripe_subscription_id": subscription_id
+    })
+
+    if not subscription_record:
+        return
+
+    # Create alert for payment failure (one per invoice)
+    alert = BillingAlert(
+        id=f"payment_failed:{invoice_data.get('id') or event_id}",
+        user_id=subscription_record["user_id"],
+        alert_type="payment_failed",
+        message="Your payment failed. Please update your payment method to continue using the service."
+    )
+
+    await db.billing_alerts.update_one(
+        {"id": alert.id},
+        {"$setOnInsert": alert.dict()},
+        upsert=True
+    )
+    get_usage_tracker().invalidate_usage_cache(subscription_record["user_id"])
+    logger.info(f"Payment failed for user: {subscription_record['user_id']}")
+
+async def _handle_subscription_updated(event_id: str, subscription_data: Dict[str, Any]) -> None:
+    """Handle subscription update webhook"""
+    # Implementation for subscription updates
+    pass
+
+async def _handle_subscription_canceled(event_id: str, subscription_data: Dict[str, Any]) -> None:
+    """Handle subscription cancellation webhook"""
+    # Implementation for subscription cancellations
+    pass
+
+EVENT_HANDLERS = {
+    'invoice.payment_succeeded': _handle_payment_succeeded,
+    'invoice.payment_failed': _handle_payment_failed,
+    'customer.subscription.updated': _handle_subscription_updated,
+    'customer.subscription.deleted': _handle_subscription_canceled,
+}
+
+class StripeEventWorker:
+    """
+    Background worker that applies queued Stripe events.
+    Events are applied in order per customer; different customers run concurrently.
+    """
+
+    def __init__(self):
+        self.is_running = False
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(STRIPE_EVENT_WORKERS)
+
+    def wake(self) -> None:
+        """Process new events now instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    async def start_worker(self):
+        """Start the background worker loop"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        logger.info("Stripe event worker started")
+
+        while self.is_running:
+            try:
+                await self.process_pending_events()
+            except Exception as e:
+                logger.error(f"Error in Stripe event worker: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=STRIPE_EVENT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def stop_worker(self):
+        """Stop the worker"""
+        self.is_running = False
+        self._wakeup.set()
+        logger.info("Stripe event worker stopped")
+
+    async def process_pending_events(self) -> None:
+        """Apply all currently due events, grouped per customer"""
+        now = datetime.utcnow()
+        # Only due work: pending events past their backoff, and events whose worker's lease expired.
+        # Events still backing off or leased elsewhere never fill a batch ahead of other customers' events.
+        due = {"$or": [
+            {"status": EventStatus.PENDING, "next_attempt_at": {"$lte": now}},
+            {"status": EventStatus.PROCESSING, "lease_expires_at": {"$lte": now}}
+        ]}
+        events = await db[STRIPE_EVENTS_COLLECTION].find(
+            due, {"_id": 0}
+        ).sort([("stripe_created", 1), ("received_at", 1)]).to_list(STRIPE_EVENT_BATCH_SIZE)
+
+        # A customer's events wait behind its earliest event that is not due yet
+        blocked_from = await self._blocked_streams(
+            {event["customer_id"] for event in events if event.get("customer_id")}, due
+        )
+
+        streams: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        for event in events:
+            # Events without a customer have no ordering constraint
+            stream_key = event.get("customer_id") or f"event:{event['id']}"
+            blocked = blocked_from.get(stream_key)
+            if blocked is not None and (event["stripe_created"], event["received_at"]) > blocked:
+                continue
+            streams.setdefault(stream_key, []).append(event)
+
+        await asyncio.gather(*(self._process_stream(stream) for stream in streams.values()))
+
+    async def _blocked_streams(self, customer_ids: set, due: Dict[str, Any]) -> Dict[str, tuple]:
+        """Ordering key of each customer's earliest queued event that is not due yet"""
+        if not customer_ids:
+            return {}
+        pending = await db[STRIPE_EVENTS_COLLECTION].aggregate([
+            {"$match": {
+                "customer_id": {"$in": list(customer_ids)},
+                "status": {"$in": [EventStatus.PENDING, EventStatus.PROCESSING]},
+                "$nor": due["$or"]
+            }},
+            {"$sort": {"stripe_created": 1, "received_at": 1}},
+            {"$group": {
+                "_id": "$customer_id",
+                "stripe_created": {"$first": "$stripe_created"},
+                "received_at": {"$first": "$received_at"}
+            }}
+        ]).to_list(None)
+        return {entry["_id"]: (entry["stripe_created"], entry["received_at"]) for entry in pending}
+
+    async def _process_stream(self, events: List[Dict[str, Any]]) -> None:
+        async with self._slots:
+            for event in events:
+                if not await self._process_event(event):
+                    # Later events for this customer wait for this one
+                    return
+
+    async def _process_event(self, event: Dict[str, Any]) -> bool:
+        """Apply one event. Returns False if the customer's stream must pause."""
+        now = datetime.utcnow()
+
+        if event["status"] == EventStatus.PROCESSING and event.get("lease_expires_at") and event["lease_expires_at"] > now:
+            return False  # Another worker holds it
+        if event.get("next_attempt_at") and event["next_attempt_at"] > now:
+            return False  # Backing off
+
+        # Claim the event
+        claimed = await db[STRIPE_EVENTS_COLLECTION].find_one_and_update(
+            {
+                "id": event["id"],
+                "status": event["status"],
+                "lease_expires_at": event.get("lease_expires_at")
+            },
+            {"$set": {
+                "status": EventStatus.PROCESSING,
+                "lease_expires_at": now + timedelta(seconds=STRIPE_EVENT_LEASE_SECONDS)
+            }}
+        )
+        if not claimed:
+            return False
+
+        handler = EVENT_HANDLERS.get(event["type"])
+        try:
+            if handler:
+                await handler(event["id"], event["data"])
+
+            await db[STRIPE_EVENTS_COLLECTION].update_one(
+                {"id": event["id"]},
+                {"$set": {
+                    "status": EventStatus.PROCESSED,
+                    "lease_expires_at": None,
+                    "processed_at": datetime.utcnow()
+                }}
+            )
+            return True
+
+        except Exception as e:
+            attempts = event.get("attempts", 0) + 1
+            update: Dict[str, Any] = {
+                "attempts": attempts,
+                "lease_expires_at": None,
+                "last_error": str(e)
+            }
+
+            if attempts >= STRIPE_EVENT_MAX_ATTEMPTS:
+                update["status"] = EventStatus.DEAD_LETTER
+                logger.error(f"Stripe event {event['id']} ({event['type']}) dead-lettered after {attempts} attempts: {e}")
+            else:
+                backoff = min(30 * (2 ** (attempts - 1)), 3600)
+                update["status"] = EventStatus.PENDING
+                update["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=backoff)
+                logger.warning(f"Stripe event {event['id']} ({event['type']}) failed, retrying in {backoff}s: {e}")
+
+            await db[STRIPE_EVENTS_COLLECTION].update_one({"id": event["id"]}, {"$set": update})
+
+            # A dead-lettered event no longer blocks the customer's later events
+            return update["status"] == EventStatus.DEAD_LETTER
+
+# Singleton instance
+_stripe_event_worker = None
+
+def get_stripe_event_worker() -> StripeEventWorker:
+    """Get or create Stripe event worker instance"""
+    global _stripe_event_worker
+    if _stripe_event_worker is None:
+        _stripe_event_worker = StripeEventWorker()
+    return _stripe_event_worker
@@ -1,9 +1,13 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from dotenv import load_dotenv
 from pathlib import Path
 
+from ttl_cache import TTLCache
+
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -15,9 +19,60 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# user_id -> Personal company id (the mapping never changes once created)
+PERSONAL_COMPANY_CACHE_TTL = float(os.getenv("PERSONAL_COMPANY_CACHE_TTL", "3600"))
+_personal_company_cache = TTLCache(ttl_seconds=PERSONAL_COMPANY_CACHE_TTL, max_size=50000)
+
+LEGACY_PERSONAL_COMPANY_INDEX = "user_id_1_is_personal_1"
+PERSONAL_COMPANY_INDEX = "user_id_1_is_personal_1_unique_personal"
+
+async def migrate_personal_companies():
+    """
+    Enforce at most one Personal company per user.
+    Replaces the legacy non-unique (user_id, is_personal) index with a partial unique index,
+    demoting duplicate Personal companies first. Raises if the unique index can't be created,
+    since ensure_personal_company relies on it.
+    """
+    existing_indexes = await db.companies.index_information()
+    if LEGACY_PERSONAL_COMPANY_INDEX in existing_indexes:
+        await db.companies.drop_index(LEGACY_PERSONAL_COMPANY_INDEX)
+        logger.info(f"Dropped legacy index companies.{LEGACY_PERSONAL_COMPANY_INDEX}")
+    
+    if PERSONAL_COMPANY_INDEX not in existing_indexes:
+        # Keep each user's oldest Personal company; later ones become regular companies so no data is lost
+        duplicates = await db.companies.aggregate([
+            {"$match": {"is_personal": True}},
+            {"$sort": {"created_at": 1}},
+            {"$group": {"_id": "$user_id", "company_ids": {"$push": "$id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ]).to_list(None)
+        
+        for duplicate in duplicates:
+            for company_id in duplicate["company_ids"][1:]:
+                await db.companies.update_one(
+                    {"id": company_id},
+                    {"$set": {"is_personal": False, "name": f"Personal ({company_id[:8]})"}}
+                )
+            logger.warning(
+                f"Demoted {len(duplicate['company_ids']) - 1} duplicate Personal companies for user: {duplicate['_id']}"
+            )
+    
+    # At most one Personal company per user (backs the ensure_personal_company upsert)
+    await db.companies.create_index(
+        [("user_id", 1), ("is_personal", 1)],
+        unique=True,
+        partialFilterExpression={"is_personal": True},
+        name=PERSONAL_COMPANY_INDEX
+    )
+
 async def init_database():
     """Initialize database with indexes and collections"""
     
+    # Not caught below: without these indexes concurrent requests can create duplicate Personal
+    # companies, and redelivered Stripe webhooks would be enqueued (and applied) twice
+    await migrate_personal_companies()
+    await db.stripe_events.create_index("id", unique=True)
+    
     try:
         # Create indexes for better performance
         
@@ -32,7 +87,11 @@ async def init_database():
         # Company indexes (EXISTING - unchanged)
         await db.companies.create_index("user_id")
         await db.companies.create_index([("user_id", 1), ("name", 1)], unique=True)
-        await db.companies.create_index([("user_id", 1), ("is_personal", 1)])
+        await db.companies.create_index("id")
+        
+        # Company membership indexes (used by get_user_companies / usage limits)
+        await db.company_users.create_index([("user_id", 1), ("invitation_status", 1)])
+        await db.company_users.create_index([("company_id", 1), ("invitation_status", 1)])
         
         # NEW: Billing-related indexes (additive)
         # User subscriptions indexes
@@ -46,17 +105,56 @@ async def init_database():
         await db.usage_tracking.create_index("user_id")
         await db.usage_tracking.create_index("month_year")
         
+        # Daily usage buckets (one document per user/company/month)
+        await db.usage_daily.create_index([("user_id", 1), ("company_id", 1), ("month_year", 1)], unique=True)
+        await db.usage_daily.create_index([("user_id", 1), ("month_year", 1)])
+        
         # Payment history indexes
         await db.payment_history.create_index("user_id")
         await db.payment_history.create_index("subscription_id")
         await db.payment_history.create_index("created_at")
-        await db.payment_history.create_index([("user_id", 1), ("created_at", -1)])
+        await db.payment_history.create_index([("user_id", 1), ("created_at", -1), ("id", -1)])
+        await db.payment_history.create_index(
+            "stripe_invoice_id",
+            unique=True,
+            partialFilterExpression={"stripe_invoice_id": {"$type": "string"}}
+        )
+        
+        # Stripe webhook event queue
+        await db.stripe_events.create_index([("status", 1), ("stripe_created", 1)])
+        await db.stripe_events.create_index([("status", 1), ("next_attempt_at", 1)])
+        await db.stripe_events.create_index([("status", 1), ("lease_expires_at", 1)])
+        await db.stripe_events.create_index([("customer_id", 1), ("status", 1), ("stripe_created", 1)])
+        await db.stripe_events.create_index("customer_id")
+        
+        # Clustering analyses: small summary records, listed newest first per workspace
+        await db.cluster_analyses.create_index("id")
+        await db.cluster_analyses.create_index([("user_id", 1), ("company_id", 1), ("created_at", -1), ("id", -1)])
+        await db.cluster_analyses.create_index("result_id", sparse=True)
+        
+        # Clustering analysis details (clusters and keyword dictionary), one document per analysis
+        await db.cluster_analysis_details.create_index("analysis_id", unique=True)
+        
+        # Clustering state (one document per analysis, used for incremental updates)
+        await db.cluster_states.create_index("analysis_id", unique=True)
+        
+        # Clustering results shared by analyses of identical inputs
+        await db.cluster_results.create_index("input_hash", unique=True)
+        
+        # Asynchronous clustering jobs
+        await db.cluster_jobs.create_index("id", unique=True)
+        await db.cluster_jobs.create_index([("status", 1), ("created_at", 1)])
+        await db.cluster_jobs.create_index([("user_id", 1), ("company_id", 1), ("status", 1)])
         
         # Billing alerts indexes
         await db.billing_alerts.create_index("user_id")
         await db.billing_alerts.create_index([("user_id", 1), ("acknowledged", 1)])
         await db.billing_alerts.create_index("created_at")
         
+        # Revoked user JWTs (logout); expired entries are removed by the TTL index
+        await db.revoked_tokens.create_index("token_hash", unique=True)
+        await db.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)
+        
         # NEW: Admin-related indexes (additive)
         # Admin users indexes
         await db.admins.create_index("email", unique=True)
@@ -75,32 +173,53 @@ async def init_database():
 
 async def ensure_personal_company(user_id: str) -> str:
     """Ensure user has a Personal company and return its ID"""
+    cached_id = _personal_company_cache.get(user_id)
+    if cached_id:
+        return cached_id
+    
     try:
-        # Check if user already has a Personal company
-        personal_company = await db.companies.find_one({
-            "user_id": user_id,
-            "is_personal": True
-        })
-        
-        if personal_company:
-            return personal_company["id"]
-        
-        # Create Personal company for user
         from models.search_models import Company
         personal_company = Company(
             name="Personal",
             user_id=user_id,
             is_personal=True
         )
+        new_company = personal_company.dict()
+        new_company.pop("user_id")
+        new_company.pop("is_personal")
         
-        await db.companies.insert_one(personal_company.dict())
-        logger.info(f"Created Personal company for user: {user_id}")
-        return personal_company.id
+        # Upsert so concurrent requests converge on a single Personal company
+        try:
+            company = await db.companies.find_one_and_update(
+                {"user_id": user_id, "is_personal": True},
+                {"$setOnInsert": new_company},
+                projection={"_id": 0, "id": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Lost the insert race - the other request's company is there now
+            company = await db.companies.find_one(
+                {"user_id": user_id, "is_personal": True},
+                {"_id": 0, "id": 1}
+            )
+            if not company:
+                raise
+        
+        if company["id"] == personal_company.id:
+            logger.info(f"Created Personal company for user: {user_id}")
+        
+        _personal_company_cache.set(user_id, company["id"])
+        return company["id"]
         
     except Exception as e:
         logger.error(f"Error ensuring personal company for user {user_id}: {e}")
         raise
 
+def forget_personal_company(user_id: str) -> None:
+    """Drop the cached Personal company id (call when a user's companies are deleted)"""
+    _personal_company_cache.invalidate(user_id)
+
 async def get_database():
     """Get database instance"""
     return db
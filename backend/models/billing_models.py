@@ -282,6 +282,7 @@ class PaymentHistory(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str = Field(..., description="User email")
     subscription_id: str = Field(..., description="Reference to UserSubscription")
+    stripe_invoice_id: Optional[str] = None
     stripe_payment_intent_id: Optional[str] = None
     amount: int = Field(..., description="Amount in cents")
     currency: str = Field(default="usd")
@@ -369,9 +370,16 @@ class BillingDashboard(BaseModel):
     subscription: Optional[UserSubscription] = None
     usage: UsageLimits
     payment_history: List[PaymentHistory] = Field(default_factory=list)
+    next_payment_cursor: Optional[datetime] = None  # Pass as ?before= to /billing/payments
+    next_payment_cursor_id: Optional[str] = None  # Pass as ?before_id= to /billing/payments
     alerts: List[BillingAlert] = Field(default_factory=list)
     pricing_config: dict
 
+class PaymentHistoryPage(BaseModel):
+    payments: List[PaymentHistory] = Field(default_factory=list)
+    next_cursor: Optional[datetime] = None  # created_at of the last payment
+    next_cursor_id: Optional[str] = None  # id of the last payment (breaks created_at ties)
+
 def get_plan_limits(plan_type: PlanType) -> dict:
     """Get limits for a specific plan type"""
     return PRICING_CONFIG.get(plan_type.value, PRICING_CONFIG["solo"])
@@ -28,14 +28,29 @@ class ClusterPriority(str, Enum):
     HIGH = "high"
     CRITICAL = "critical"
 
+class ClusteringEngineType(str, Enum):
+    """Clustering engines"""
+    STANDARD = "standard"  # TF-IDF + KMeans with silhouette model selection
+    BULK = "bulk"  # Chunked hashing + mini-batch k-means for whole keyword exports
+
+# Upper bound on a single request; plan limits below apply on top of this
+MAX_KEYWORDS_PER_REQUEST = 100000
+
 class KeywordClusterRequest(BaseModel):
     """Request model for clustering keywords"""
-    keywords: List[str] = Field(..., min_items=2, max_items=500, description="Keywords to cluster")
+    keywords: List[str] = Field(..., min_items=2, max_items=MAX_KEYWORDS_PER_REQUEST, description="Keywords to cluster")
     search_volumes: Optional[List[int]] = Field(None, description="Search volumes for keywords")
     difficulties: Optional[List[float]] = Field(None, description="Keyword difficulties (0-100)")
     max_clusters: Optional[int] = Field(15, ge=2, le=25, description="Maximum number of clusters")
     user_id: str = Field(..., description="User ID for tracking")
     company_id: str = Field(..., description="Company ID for data isolation")
+    engine: ClusteringEngineType = Field(ClusteringEngineType.STANDARD, description="Clustering engine (bulk for very large lists)")
+
+class ClusterAddKeywordsRequest(BaseModel):
+    """Request model for adding keywords to an existing analysis"""
+    keywords: List[str] = Field(..., min_items=1, max_items=500, description="Keywords to add")
+    search_volumes: Optional[List[int]] = Field(None, description="Search volumes for keywords")
+    difficulties: Optional[List[float]] = Field(None, description="Keyword difficulties (0-100)")
 
 class KeywordClusterModel(BaseModel):
     """Model for a keyword cluster"""
@@ -88,8 +103,50 @@ class ClusterAnalysisResult(BaseModel):
     content_gaps: List[ContentGap] = Field(default_factory=list, description="Identified content gaps")
     pillar_opportunities: List[PillarOpportunity] = Field(default_factory=list, description="Content pillar opportunities")
     processing_time: float = Field(..., ge=0.0, description="Processing time in seconds")
+    engine: ClusteringEngineType = Field(ClusteringEngineType.STANDARD, description="Engine that produced the analysis")
+    selected_k: Optional[int] = Field(None, description="Cluster count chosen by model selection")
+    drift_score: Optional[float] = Field(None, ge=0.0, le=1.0, description="Fit degradation from keywords added since clustering (0-1)")
+    selection_score: Optional[float] = Field(None, description="Cosine silhouette of the chosen clustering (-1 to 1)")
+    stage_metrics: List[Dict] = Field(default_factory=list, description="Per-stage timing and memory (bytes) of the analysis")
+    cache_hit: bool = Field(False, description="Reused the stored result of an identical earlier analysis")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
+class ClusterAddKeywordsResult(BaseModel):
+    """Result of adding keywords to an existing analysis"""
+    analysis: ClusterAnalysisResult = Field(..., description="Updated analysis")
+    added_keywords: List[str] = Field(default_factory=list, description="Keywords added")
+    skipped_keywords: List[str] = Field(default_factory=list, description="Keywords already in the analysis")
+    affected_clusters: List[str] = Field(default_factory=list, description="IDs of clusters that received keywords")
+    drift_score: float = Field(..., ge=0.0, le=1.0, description="Fit degradation since the last full clustering (0-1)")
+    recluster_recommended: bool = Field(..., description="Whether a fresh analysis is recommended")
+    processing_time: float = Field(..., ge=0.0, description="Processing time in seconds")
+
+class ClusteringJobStatus(str, Enum):
+    """Lifecycle of an asynchronous clustering job"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class ClusteringJob(BaseModel):
+    """Status and progress of an asynchronous clustering job"""
+    id: str = Field(..., description="Job ID (also the ID of the resulting analysis)")
+    user_id: str = Field(..., description="User who submitted the job")
+    company_id: str = Field(..., description="Company workspace")
+    engine: ClusteringEngineType = Field(ClusteringEngineType.STANDARD, description="Clustering engine")
+    status: ClusteringJobStatus = Field(..., description="Job status")
+    progress: float = Field(0.0, ge=0.0, le=1.0, description="Fraction of pipeline stages finished")
+    current_stage: Optional[str] = Field(None, description="Stage running now")
+    stages: List[Dict] = Field(default_factory=list, description="Timing and memory of each finished stage")
+    total_keywords: int = Field(..., ge=0, description="Keywords submitted")
+    analysis_id: Optional[str] = Field(None, description="Resulting analysis, once completed")
+    error: Optional[str] = Field(None, description="Failure reason")
+    attempts: int = Field(0, ge=0, description="Times the job has been started")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = Field(None)
+    finished_at: Optional[datetime] = Field(None)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 class ClusterExportRequest(BaseModel):
     """Request for exporting cluster data"""
     analysis_id: str = Field(..., description="Analysis ID to export")
@@ -130,33 +187,49 @@ class ClusteringUsageLimit(BaseModel):
 CLUSTER_ANALYSES_COLLECTION = "cluster_analyses"
 CLUSTER_USAGE_COLLECTION = "cluster_usage"
 CLUSTER_STATS_COLLECTION = "cluster_stats"
+CLUSTER_STATES_COLLECTION = "cluster_states"  # Fitted vocabulary/IDF/centroids per analysis
+CLUSTER_JOBS_COLLECTION = "cluster_jobs"
+CLUSTER_RESULTS_COLLECTION = "cluster_results"  # Analysis results shared by identical inputs
+CLUSTER_DETAILS_COLLECTION = "cluster_analysis_details"  # Clusters/gaps/pillars of an analysis, keywords as IDs
 
 # Access control constants
 CLUSTERING_REQUIRED_PLANS = ["annual", "professional_annual", "agency_annual", "enterprise_annual", "annual_gift"]
 CLUSTERING_FEATURE_NAME = "keyword_clustering"
 
 # Default limits by plan
+# max_concurrent_per_company / max_concurrent_per_plan cap in-flight analyses per API worker
 CLUSTERING_LIMITS = {
     "annual": {
         "monthly_analyses": 100,
-        "keywords_per_analysis": 1000
+        "keywords_per_analysis": 1000,
+        "max_concurrent_per_company": 2,
+        "max_concurrent_per_plan": 4
     },
     "professional_annual": {
         "monthly_analyses": 50,
-        "keywords_per_analysis": 500
+        "keywords_per_analysis": 500,
+        "max_concurrent_per_company": 1,
+        "max_concurrent_per_plan": 3
     },
     "agency_annual": {
         "monthly_analyses": 200,
-        "keywords_per_analysis": 1000
+        "keywords_per_analysis": 1000,
+        "max_concurrent_per_company": 3,
+        "max_concurrent_per_plan": 6
     },
     "enterprise_annual": {
         "monthly_analyses": 1000,
-        "keywords_per_analysis": 2000
+        "keywords_per_analysis": 2000,
+        "bulk_keywords_per_analysis": 100000,  # Bulk engine only
+        "max_concurrent_per_company": 4,
+        "max_concurrent_per_plan": 8
     },
     "annual_gift": {
         "monthly_analyses": 100,  # Enhanced limits for gift recipients
         "keywords_per_analysis": 1000,
         "bonus_credits": 500,
-        "priority_processing": True
+        "priority_processing": True,
+        "max_concurrent_per_company": 2,
+        "max_concurrent_per_plan": 4
     }
 }
\ No newline at end of file
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
@@ -10,6 +10,7 @@ from models.admin_models import (
 from models.search_models import Company, SearchHistory
 from models.billing_models import UserSubscription, UsageTracking, PaymentHistory, PRICING_CONFIG
 from routes.admin_routes import get_current_admin
+from billing.usage_series import get_usage_series
 from database import db
 
 router = APIRouter()
@@ -377,4 +378,18 @@ async def get_user_search_results(
         
     except Exception as e:
         logger.error(f"Error getting search results for user {user_email}: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to get search results: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get search results: {str(e)}")
+
+@router.post("/usage-series/backfill")
+async def backfill_usage_series(
+    background_tasks: BackgroundTasks,
+    since: Optional[datetime] = None,
+    current_admin = Depends(get_current_admin)
+):
+    """Rebuild daily usage buckets from search history (safe to re-run)"""
+    background_tasks.add_task(get_usage_series().backfill_from_search_history, since)
+    return {
+        "success": True,
+        "message": "Usage series backfill started",
+        "since": since.isoformat() if since else None
+    }
@@ -15,7 +15,7 @@ from models.billing_models import (
     PRICING_CONFIG
 )
 from models.admin_models import Admin
-from billing.stripe_service import get_stripe_service
+from billing.stripe_service import get_stripe_service, request_idempotency_key, IDEMPOTENCY_KEY_HEADER
 from billing.usage_tracker import get_usage_tracker
 from database import db
 import uuid
@@ -90,6 +90,9 @@ async def apply_custom_pricing(
         })
         
         stripe_service = get_stripe_service()
+        idempotency_key = request_idempotency_key(
+            "custom-subscription", pricing_data.user_email, request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        )
         stripe_customer_id = None
         stripe_subscription_id = None
         
@@ -106,7 +109,9 @@ async def apply_custom_pricing(
                 )
         else:
             # Create new Stripe customer
-            stripe_customer_id = await stripe_service.create_customer(pricing_data.user_email)
+            stripe_customer_id = await stripe_service.create_customer(
+                pricing_data.user_email, idempotency_key=f"{idempotency_key}:customer"
+            )
         
         # Create custom pricing record
         custom_pricing = CustomPricing(
@@ -130,7 +135,8 @@ async def apply_custom_pricing(
             plan_type=pricing_data.plan_type,
             billing_period=BillingPeriod.MONTHLY,
             custom_price=pricing_data.custom_price_monthly,
-            trial_days=0  # No trial for custom pricing
+            trial_days=0,  # No trial for custom pricing
+            idempotency_key=idempotency_key
         )
         
         # Update the custom pricing record with subscription ID
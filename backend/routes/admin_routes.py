@@ -6,12 +6,14 @@ import hashlib
 import secrets
 import uuid
 import os
+import asyncio
 from typing import Optional
 
 from models.admin_models import (
     Admin, AdminSession, AdminLogin, AdminLoginResponse
 )
 from database import db
+from ttl_cache import TTLCache
 import logging
 
 router = APIRouter()
@@ -23,6 +25,13 @@ INITIAL_ADMIN_EMAIL = "JimRulison@gmail.com"
 INITIAL_ADMIN_PASSWORD = "JR09mar05"
 INITIAL_ADMIN_NAME = "Jim Rulison"
 
+# Admin session cache: token -> Admin. Entries expire with the session, capped so
+# admin deactivation takes effect without a logout.
+ADMIN_SESSION_CACHE_TTL = float(os.getenv("ADMIN_SESSION_CACHE_TTL", "300"))
+# Seconds between sweeps of expired sessions; 0 disables the sweeper
+ADMIN_SESSION_SWEEP_INTERVAL = int(os.getenv("ADMIN_SESSION_SWEEP_INTERVAL", "3600"))
+_admin_session_cache = TTLCache(ttl_seconds=ADMIN_SESSION_CACHE_TTL, max_size=1000)
+
 def hash_password(password: str) -> str:
     """Hash password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -36,10 +45,14 @@ def generate_session_token() -> str:
     return secrets.token_urlsafe(32)
 
 async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Admin:
-    """Get current admin from token"""
+    """Get current admin from token (the single admin-auth dependency)"""
     try:
         token = credentials.credentials
         
+        cached_admin = _admin_session_cache.get(token)
+        if cached_admin is not None:
+            return cached_admin
+        
         # Find active session
         session = await db.admin_sessions.find_one({
             "token": token,
@@ -55,12 +68,38 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
         if not admin or not admin.get("is_active", False):
             raise HTTPException(status_code=401, detail="Admin not found or inactive")
         
-        return Admin(**admin)
+        admin = Admin(**admin)
+        session_remaining = (session["expires_at"] - datetime.utcnow()).total_seconds()
+        _admin_session_cache.set(token, admin, ttl_seconds=min(ADMIN_SESSION_CACHE_TTL, session_remaining))
+        
+        return admin
         
     except Exception as e:
         logger.error(f"Error getting current admin: {e}")
         raise HTTPException(status_code=401, detail="Authentication failed")
 
+async def sweep_expired_admin_sessions() -> int:
+    """Drop expired sessions from the cache and deactivate them in the database"""
+    _admin_session_cache.purge_expired()
+    
+    result = await db.admin_sessions.update_many(
+        {"is_active": True, "expires_at": {"$lte": datetime.utcnow()}},
+        {"$set": {"is_active": False}}
+    )
+    
+    if result.modified_count:
+        logger.info(f"Deactivated {result.modified_count} expired admin sessions")
+    return result.modified_count
+
+async def run_admin_session_sweeper():
+    """Periodically sweep expired admin sessions (ADMIN_SESSION_SWEEP_INTERVAL)"""
+    while True:
+        try:
+            await sweep_expired_admin_sessions()
+        except Exception as e:
+            logger.error(f"Error sweeping admin sessions: {e}")
+        await asyncio.sleep(ADMIN_SESSION_SWEEP_INTERVAL)
+
 async def ensure_initial_admin():
     """Ensure the initial admin user exists"""
     try:
@@ -153,6 +192,7 @@ async def admin_logout(current_admin: Admin = Depends(get_current_admin)):
             {"admin_id": current_admin.id, "is_active": True},
             {"$set": {"is_active": False}}
         )
+        _admin_session_cache.invalidate_where(lambda admin: admin.id == current_admin.id)
         
         return {"success": True, "message": "Logged out successfully"}
         
@@ -181,4 +221,22 @@ async def get_admin_sessions(current_admin: Admin = Depends(get_current_admin)):
         
     except Exception as e:
         logger.error(f"Error getting admin sessions: {e}")
-        raise HTTPException(status_code=500, detail="Failed to get sessions")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to get sessions")
+
+@router.get("/stripe-metrics")
+async def get_stripe_metrics(current_admin: Admin = Depends(get_current_admin)):
+    """Get per-operation Stripe call latency metrics for this worker"""
+    from billing.stripe_service import get_stripe_service
+    return {"success": True, "metrics": get_stripe_service().get_metrics()}
+
+@router.get("/password-hasher-metrics")
+async def get_password_hasher_metrics(current_admin: Admin = Depends(get_current_admin)):
+    """Get bcrypt pool queue depth and latency metrics for this worker"""
+    from services.password_service import get_password_hasher
+    return {"success": True, "metrics": get_password_hasher().get_metrics()}
+
+@router.get("/clustering-pool-metrics")
+async def get_clustering_pool_metrics(current_admin: Admin = Depends(get_current_admin)):
+    """Get clustering queue, concurrency, latency and lemma cache metrics for this worker"""
+    from services.clustering_pool import get_clustering_pool
+    return {"success": True, "metrics": get_clustering_pool().get_metrics()}
@@ -1,13 +1,15 @@
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Response, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-import bcrypt
 import jwt
 import uuid
 from datetime import datetime, timedelta
 
 from models.billing_models import UserTrialInfo, TrialStatus, PlanType
 from database import db
+from billing.billing_middleware import revoke_token
+from services.password_service import get_password_hasher, PasswordHasherBusy
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -15,6 +17,8 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 JWT_SECRET = "your-secret-key-here"  # In production, use environment variable
 JWT_ALGORITHM = "HS256"
 
+optional_security = HTTPBearer(auto_error=False)
+
 class UserRegister(BaseModel):
     email: EmailStr
     password: str
@@ -29,14 +33,36 @@ class AuthResponse(BaseModel):
     user: dict
     trial_info: Optional[dict] = None
 
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+async def hash_password(password: str) -> str:
+    """Hash password using bcrypt off the event loop"""
+    try:
+        return await get_password_hasher().hash_password(password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-in requests, please try again shortly")
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Verify password against hash off the event loop"""
+    try:
+        return await get_password_hasher().verify_password(password, hashed)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-in requests, please try again shortly")
+
+async def rehash_password_if_needed(user: dict, password: str) -> None:
+    """Upgrade a stored hash to the current cost factor after a successful login"""
+    hasher = get_password_hasher()
+    if not hasher.needs_rehash(user["password"]):
+        return
 
-def verify_password(password: str, hashed: str) -> bool:
-    """Verify password against hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    try:
+        new_hash = await hasher.hash_password(password)
+    except PasswordHasherBusy:
+        return  # Try again on a later login
+
+    await db.users.update_one(
+        {"id": user["id"], "password": user["password"]},
+        {"$set": {"password": new_hash}}
+    )
+    hasher.record_rehash()
 
 def create_access_token(user_email: str, user_id: str) -> str:
     """Create JWT access token"""
@@ -57,7 +83,7 @@ async def register_user(user_data: UserRegister):
         raise HTTPException(status_code=400, detail="User with this email already exists")
     
     # Hash password
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     
     # Create user with trial info
     user_id = str(uuid.uuid4())
@@ -117,12 +143,14 @@ async def login_user(login_data: UserLogin):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Verify password
-    if not verify_password(login_data.password, user["password"]):
+    if not await verify_password(login_data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Check if user account is active
     if not user.get("is_active", True):
         raise HTTPException(status_code=401, detail="Account is disabled")
+
+    await rehash_password_if_needed(user, login_data.password)
     
     # Handle trial users
     trial_info_response = None
@@ -181,10 +209,14 @@ async def login_user(login_data: UserLogin):
     )
 
 @router.post("/logout")
-async def logout_user(response: Response):
+async def logout_user(
+    response: Response,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
     """Logout user"""
-    # For JWT tokens, we just clear any client-side storage
-    # In a more complex system, you might maintain a token blacklist
+    # Revoke the bearer token so it stops working server-side as well
+    if credentials:
+        await revoke_token(credentials.credentials)
     
     response.delete_cookie("access_token")
     return {"message": "Successfully logged out"}
@@ -5,25 +5,45 @@ Premium feature for annual subscribers only
 
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from fastapi.responses import StreamingResponse
+from pymongo.errors import DuplicateKeyError
 from typing import List, Dict, Optional
 import asyncio
 from datetime import datetime, timedelta
 import json
 import csv
 import io
+import time
 import uuid
 
 from models.clustering_models import (
     KeywordClusterRequest, ClusterAnalysisResult, ClusterExportRequest,
     ClusterUpdateRequest, ClusterStats, ClusteringUsageLimit,
+    ClusterAddKeywordsRequest, ClusterAddKeywordsResult, ClusteringEngineType,
+    ClusteringJob, ClusteringJobStatus, CLUSTER_JOBS_COLLECTION, SearchIntent, BuyerJourneyStage,
     CLUSTERING_REQUIRED_PLANS, CLUSTERING_LIMITS, CLUSTERING_FEATURE_NAME,
-    CLUSTER_ANALYSES_COLLECTION, CLUSTER_USAGE_COLLECTION
+    CLUSTER_ANALYSES_COLLECTION, CLUSTER_USAGE_COLLECTION, CLUSTER_STATES_COLLECTION, CLUSTER_DETAILS_COLLECTION
 )
-from services.clustering_service import cluster_keywords_async
+from services.clustering_service import cluster_keywords_async, get_clustering_engine
+from services.clustering_pool import ClusteringCapacityError
+from services.incremental_clustering import add_keywords, state_to_document, state_from_document
+from services.analysis_detail import DETAIL_FIELDS, summary_counts
+from services.analysis_store import (
+    build_analysis_result, save_analysis, save_analysis_detail, update_usage_stats,
+    find_cached_analysis, find_analysis, find_state_document
+)
+from services.result_cache import CLUSTERING_CACHE_HITS_COUNT_USAGE, release_result
+from services.clustering_jobs import submit_clustering_job, count_pending_jobs
 from database import get_database
 
 router = APIRouter(tags=["clustering"])
 
+# Summary fields returned by the analyses history list
+ANALYSIS_LIST_PROJECTION = {"_id": 0, "id": 1, "total_keywords": 1, "total_clusters": 1, "processing_time": 1, "created_at": 1}
+
+# Job progress streams: how often to re-read the job, and idle keep-alive interval
+CLUSTERING_JOB_EVENT_POLL_SECONDS = 1.0
+SSE_KEEPALIVE_SECONDS = 15
+
 async def verify_clustering_access(user_id: str, company_id: str):
     """Verify user has access to clustering features"""
     
@@ -51,7 +71,12 @@ async def verify_clustering_access(user_id: str, company_id: str):
     
     return subscription
 
-async def check_usage_limits(user_id: str, company_id: str, keywords_count: int):
+async def check_usage_limits(
+    user_id: str,
+    company_id: str,
+    keywords_count: int,
+    engine: ClusteringEngineType = ClusteringEngineType.STANDARD
+):
     """Check if user is within usage limits"""
     
     db = await get_database()
@@ -91,7 +116,18 @@ async def check_usage_limits(user_id: str, company_id: str, keywords_count: int)
             detail=f"Monthly clustering limit reached ({limits['monthly_analyses']} analyses). Upgrade your plan for higher limits."
         )
     
-    if keywords_count > limits["keywords_per_analysis"]:
+    if engine == ClusteringEngineType.BULK:
+        if "bulk_keywords_per_analysis" not in limits:
+            raise HTTPException(
+                status_code=403,
+                detail="Bulk clustering requires an Enterprise Annual subscription."
+            )
+        if keywords_count > limits["bulk_keywords_per_analysis"]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many keywords for bulk analysis. Limit: {limits['bulk_keywords_per_analysis']} keywords per analysis."
+            )
+    elif keywords_count > limits["keywords_per_analysis"]:
         raise HTTPException(
             status_code=400,
             detail=f"Too many keywords for analysis. Limit: {limits['keywords_per_analysis']} keywords per analysis."
@@ -99,33 +135,6 @@ async def check_usage_limits(user_id: str, company_id: str, keywords_count: int)
     
     return usage_record
 
-async def update_usage_stats(user_id: str, company_id: str, keywords_count: int, clusters_count: int):
-    """Update usage statistics"""
-    
-    db = await get_database()
-    current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    # Update monthly usage
-    usage_collection = db[CLUSTER_USAGE_COLLECTION]
-    await usage_collection.update_one(
-        {
-            "user_id": user_id,
-            "company_id": company_id,
-            "month": current_month
-        },
-        {
-            "$inc": {
-                "analyses_count": 1,
-                "keywords_processed": keywords_count,
-                "clusters_created": clusters_count
-            },
-            "$set": {
-                "last_analysis_date": datetime.utcnow()
-            }
-        },
-        upsert=True
-    )
-
 @router.post("/analyze", response_model=ClusterAnalysisResult)
 async def cluster_keywords(
     request: KeywordClusterRequest,
@@ -138,84 +147,50 @@ async def cluster_keywords(
     
     try:
         # Verify access and usage limits
-        await verify_clustering_access(request.user_id, request.company_id)
-        usage_record = await check_usage_limits(request.user_id, request.company_id, len(request.keywords))
-        
-        # Perform clustering analysis
-        clustering_result = await cluster_keywords_async(
-            keywords=request.keywords,
-            search_volumes=request.search_volumes,
-            difficulties=request.difficulties
+        subscription = await verify_clustering_access(request.user_id, request.company_id)
+        usage_record = await check_usage_limits(
+            request.user_id, request.company_id, len(request.keywords), request.engine
         )
         
-        # Create analysis result
+        # Identical inputs analyzed before: reference the stored result
         analysis_id = str(uuid.uuid4())
-        
-        # Convert clustering result to database model
-        clusters_data = []
-        for cluster in clustering_result.clusters:
-            clusters_data.append({
-                "id": cluster.id,
-                "name": cluster.name,
-                "primary_keyword": cluster.primary_keyword,
-                "keywords": cluster.keywords,
-                "search_intent": cluster.search_intent,
-                "topic_theme": cluster.topic_theme,
-                "search_volume_total": cluster.search_volume_total,
-                "difficulty_average": cluster.difficulty_average,
-                "content_suggestions": cluster.content_suggestions,
-                "buyer_journey_stage": cluster.buyer_journey_stage,
-                "priority_score": cluster.priority_score,
-                "created_at": cluster.created_at
-            })
-        
-        content_gaps_data = []
-        for gap in clustering_result.content_gaps:
-            content_gaps_data.append({
-                "type": gap["type"],
-                "intent": gap.get("intent"),
-                "stage": gap.get("stage"),
-                "description": gap["description"],
-                "recommendation": gap["recommendation"],
-                "priority": gap["priority"]
-            })
-        
-        pillar_opportunities_data = []
-        for opportunity in clustering_result.pillar_opportunities:
-            pillar_opportunities_data.append({
-                "type": opportunity["type"],
-                "cluster_name": opportunity.get("cluster_name"),
-                "primary_keyword": opportunity.get("primary_keyword"),
-                "intent": opportunity.get("intent"),
-                "supporting_keywords": opportunity.get("supporting_keywords"),
-                "clusters_involved": opportunity.get("clusters_involved"),
-                "total_keywords": opportunity.get("total_keywords"),
-                "search_volume": opportunity.get("search_volume"),
-                "total_search_volume": opportunity.get("total_search_volume"),
-                "content_suggestions": opportunity.get("content_suggestions"),
-                "description": opportunity.get("description"),
-                "priority": opportunity["priority"]
-            })
-        
-        analysis_result = ClusterAnalysisResult(
-            id=analysis_id,
-            user_id=request.user_id,
-            company_id=request.company_id,
-            total_keywords=clustering_result.total_keywords,
-            total_clusters=clustering_result.total_clusters,
-            clusters=clusters_data,
-            unclustered_keywords=clustering_result.unclustered_keywords,
-            content_gaps=content_gaps_data,
-            pillar_opportunities=pillar_opportunities_data,
-            processing_time=clustering_result.processing_time,
-            created_at=datetime.utcnow()
+        input_hash, cached_result = await find_cached_analysis(
+            analysis_id, request.user_id, request.company_id, request.engine,
+            request.keywords, request.search_volumes, request.difficulties
         )
+        if cached_result:
+            await save_analysis(cached_result, input_hash=input_hash)
+            if CLUSTERING_CACHE_HITS_COUNT_USAGE:
+                background_tasks.add_task(
+                    update_usage_stats,
+                    request.user_id,
+                    request.company_id,
+                    len(request.keywords),
+                    len(cached_result.clusters)
+                )
+            return cached_result
         
-        # Save to database
-        db = await get_database()
-        analyses_collection = db[CLUSTER_ANALYSES_COLLECTION]
+        # Perform clustering analysis (on the clustering process pool)
+        try:
+            clustering_result = await cluster_keywords_async(
+                keywords=request.keywords,
+                search_volumes=request.search_volumes,
+                difficulties=request.difficulties,
+                company_id=request.company_id,
+                plan_type=subscription.get("plan_type", ""),
+                engine=request.engine.value
+            )
+        except ClusteringCapacityError:
+            raise HTTPException(
+                status_code=503,
+                detail="Clustering is busy right now. Please try again in a minute."
+            )
         
-        await analyses_collection.insert_one(analysis_result.dict())
+        # Store the analysis and its fitted state
+        analysis_result = build_analysis_result(
+            analysis_id, request.user_id, request.company_id, request.engine, clustering_result
+        )
+        await save_analysis(analysis_result, clustering_result, input_hash)
         
         # Update usage stats in background
         background_tasks.add_task(
@@ -223,7 +198,7 @@ async def cluster_keywords(
             request.user_id,
             request.company_id,
             len(request.keywords),
-            len(clusters_data)
+            len(analysis_result.clusters)
         )
         
         return analysis_result
@@ -236,40 +211,121 @@ async def cluster_keywords(
             detail=f"Clustering analysis failed: {str(e)}"
         )
 
+@router.post("/jobs", response_model=ClusteringJob, status_code=202)
+async def submit_clustering_job_route(request: KeywordClusterRequest):
+    """
+    Queue a clustering analysis and return immediately with the job.
+    Poll GET /jobs/{id} or stream GET /jobs/{id}/events; usage is charged on completion.
+    """
+    
+    subscription = await verify_clustering_access(request.user_id, request.company_id)
+    usage_record = await check_usage_limits(
+        request.user_id, request.company_id, len(request.keywords), request.engine
+    )
+    
+    # Jobs still queued or running count towards the monthly limit
+    limits = CLUSTERING_LIMITS.get(subscription.get("plan_type", ""), CLUSTERING_LIMITS["professional_annual"])
+    pending_jobs = await count_pending_jobs(request.user_id, request.company_id)
+    if usage_record["analyses_count"] + pending_jobs >= limits["monthly_analyses"]:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Monthly clustering limit reached ({limits['monthly_analyses']} analyses, including {pending_jobs} in progress)."
+        )
+    
+    job = await submit_clustering_job(request, subscription.get("plan_type", ""))
+    return ClusteringJob(**job)
+
+async def _get_job(job_id: str, user_id: str, company_id: str) -> Dict:
+    db = await get_database()
+    job = await db[CLUSTER_JOBS_COLLECTION].find_one(
+        {"id": job_id, "user_id": user_id, "company_id": company_id},
+        {"_id": 0, "keywords": 0, "search_volumes": 0, "difficulties": 0}
+    )
+    if not job:
+        raise HTTPException(status_code=404, detail="Clustering job not found")
+    return job
+
+@router.get("/jobs/{job_id}", response_model=ClusteringJob)
+async def get_clustering_job(job_id: str, user_id: str, company_id: str):
+    """Get status, progress and stage timings of a clustering job"""
+    
+    await verify_clustering_access(user_id, company_id)
+    return ClusteringJob(**await _get_job(job_id, user_id, company_id))
+
+@router.get("/jobs/{job_id}/events")
+async def stream_clustering_job(job_id: str, user_id: str, company_id: str):
+    """
+    Server-sent events with the job's status whenever it changes.
+    The stream ends with a ``completed`` or ``failed`` event.
+    """
+    
+    await verify_clustering_access(user_id, company_id)
+    await _get_job(job_id, user_id, company_id)
+    
+    async def events():
+        last_update = None
+        last_sent = time.monotonic()
+        while True:
+            job = ClusteringJob(**await _get_job(job_id, user_id, company_id))
+            finished = job.status in (ClusteringJobStatus.COMPLETED, ClusteringJobStatus.FAILED)
+            
+            if job.updated_at != last_update:
+                last_update = job.updated_at
+                event = job.status.value if finished else "progress"
+                yield f"event: {event}\ndata: {job.json()}\n\n"
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > SSE_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"  # Keeps proxies from closing an idle stream
+                last_sent = time.monotonic()
+            
+            if finished:
+                return
+            await asyncio.sleep(CLUSTERING_JOB_EVENT_POLL_SECONDS)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/analyses", response_model=List[Dict])
 async def get_user_analyses(
     user_id: str,
     company_id: str,
     limit: int = 10,
-    skip: int = 0
+    skip: int = 0,
+    before: Optional[datetime] = None,
+    before_id: Optional[str] = None
 ):
-    """Get user's clustering analyses history"""
+    """
+    Get user's clustering analyses history, newest first.
+    
+    For the next page pass ``before``/``before_id``: the created_at and id of
+    the last analysis of the current one. ``skip`` still works, but reads
+    every skipped record.
+    """
     
     await verify_clustering_access(user_id, company_id)
     
     db = await get_database()
     analyses_collection = db[CLUSTER_ANALYSES_COLLECTION]
     
-    # Get analyses for user/company
-    cursor = analyses_collection.find(
-        {
-            "user_id": user_id,
-            "company_id": company_id
-        }
-    ).sort("created_at", -1).skip(skip).limit(limit)
-    
-    analyses = []
-    async for analysis in cursor:
-        # Return summary without full cluster data
-        analyses.append({
-            "id": analysis["id"],
-            "total_keywords": analysis["total_keywords"],
-            "total_clusters": analysis["total_clusters"],
-            "processing_time": analysis["processing_time"],
-            "created_at": analysis["created_at"]
-        })
-    
-    return analyses
+    # Get analyses for user/company (served by the user/company/created_at index)
+    query = {
+        "user_id": user_id,
+        "company_id": company_id
+    }
+    if before is not None:
+        query["$or"] = [{"created_at": {"$lt": before}}]
+        if before_id:
+            query["$or"].append({"created_at": before, "id": {"$lt": before_id}})
+    
+    # Return summary without full cluster data
+    cursor = analyses_collection.find(query, ANALYSIS_LIST_PROJECTION).sort(
+        [("created_at", -1), ("id", -1)]
+    ).skip(skip).limit(limit)
+    
+    return await cursor.to_list(length=limit)
 
 @router.get("/analyses/{analysis_id}", response_model=ClusterAnalysisResult)
 async def get_analysis_details(
@@ -281,14 +337,7 @@ async def get_analysis_details(
     
     await verify_clustering_access(user_id, company_id)
     
-    db = await get_database()
-    analyses_collection = db[CLUSTER_ANALYSES_COLLECTION]
-    
-    analysis = await analyses_collection.find_one({
-        "id": analysis_id,
-        "user_id": user_id,
-        "company_id": company_id
-    })
+    analysis = await find_analysis(analysis_id, user_id, company_id)
     
     if not analysis:
         raise HTTPException(
@@ -298,21 +347,134 @@ async def get_analysis_details(
     
     return ClusterAnalysisResult(**analysis)
 
-@router.post("/export")
-async def export_analysis(request: ClusterExportRequest, user_id: str, company_id: str):
-    """Export clustering analysis in various formats"""
+@router.post("/analyses/{analysis_id}/add-keywords", response_model=ClusterAddKeywordsResult)
+async def add_keywords_to_analysis(
+    analysis_id: str,
+    request: ClusterAddKeywordsRequest,
+    user_id: str,
+    company_id: str
+):
+    """
+    Add keywords to an existing analysis without reclustering.
+    New keywords join their nearest cluster; only those clusters are re-summarized.
+    """
     
-    await verify_clustering_access(user_id, company_id)
+    subscription = await verify_clustering_access(user_id, company_id)
+    limits = CLUSTERING_LIMITS.get(subscription.get("plan_type", ""), CLUSTERING_LIMITS["professional_annual"])
     
     db = await get_database()
     analyses_collection = db[CLUSTER_ANALYSES_COLLECTION]
     
-    analysis = await analyses_collection.find_one({
-        "id": request.analysis_id,
-        "user_id": user_id,
-        "company_id": company_id
+    analysis = await find_analysis(analysis_id, user_id, company_id)
+    
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    
+    if analysis.get("engine") == ClusteringEngineType.BULK:
+        raise HTTPException(
+            status_code=409,
+            detail="Bulk analyses can't be extended. Please run a new bulk analysis."
+        )
+    
+    state_document = await find_state_document(analysis)
+    if not state_document:
+        raise HTTPException(
+            status_code=409,
+            detail="This analysis predates incremental updates. Please run a new analysis."
+        )
+    
+    if analysis["total_keywords"] + len(request.keywords) > limits["keywords_per_analysis"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many keywords for analysis. Limit: {limits['keywords_per_analysis']} keywords per analysis."
+        )
+    
+    start_time = datetime.now()
+    state = state_from_document(state_document)
+    update = await asyncio.to_thread(
+        add_keywords,
+        get_clustering_engine(),
+        analysis,
+        state,
+        request.keywords,
+        request.search_volumes,
+        request.difficulties
+    )
+    
+    if update["added_keywords"]:
+        # Optimistic concurrency: fail if another update landed since we read the state
+        if "analysis_id" in state_document:
+            state_result = await db[CLUSTER_STATES_COLLECTION].update_one(
+                {"analysis_id": analysis_id, "version": state_document.get("version", 0)},
+                {
+                    "$set": {**state_to_document(state), "updated_at": datetime.utcnow()},
+                    "$inc": {"version": 1}
+                }
+            )
+            state_updated = state_result.modified_count == 1
+        else:
+            # First change to a shared cached result: the analysis gets its own state
+            try:
+                await db[CLUSTER_STATES_COLLECTION].insert_one({
+                    "analysis_id": analysis_id,
+                    "user_id": user_id,
+                    "company_id": company_id,
+                    **state_to_document(state),
+                    "version": 1,
+                    "created_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow()
+                })
+                state_updated = True
+            except DuplicateKeyError:
+                state_updated = False
+        
+        if not state_updated:
+            raise HTTPException(
+                status_code=409,
+                detail="The analysis was updated concurrently. Please retry."
+            )
+        
+        # The analysis now has its own results and stops referencing the shared one
+        # (details stored before analyses were split into summary and detail are dropped too)
+        await save_analysis_detail(analysis_id, user_id, company_id, update)
+        await analyses_collection.update_one(
+            {"id": analysis_id},
+            {"$unset": {"result_id": "", **{field: "" for field in DETAIL_FIELDS}}, "$set": {
+                "total_keywords": update["total_keywords"],
+                "total_clusters": update["total_clusters"],
+                "drift_score": update["drift_score"],
+                **summary_counts(update["clusters"]),
+                "updated_at": datetime.utcnow()
+            }}
+        )
+        if analysis.get("result_id"):
+            await release_result(analysis["result_id"])
+    
+    analysis.update({
+        key: update[key] for key in (
+            "clusters", "unclustered_keywords", "total_keywords", "total_clusters",
+            "content_gaps", "pillar_opportunities", "drift_score"
+        )
     })
     
+    return ClusterAddKeywordsResult(
+        analysis=ClusterAnalysisResult(**analysis),
+        added_keywords=update["added_keywords"],
+        skipped_keywords=update["skipped_keywords"],
+        affected_clusters=update["affected_clusters"],
+        drift_score=update["drift_score"],
+        recluster_recommended=update["recluster_recommended"],
+        processing_time=(datetime.now() - start_time).total_seconds()
+    )
+
+@router.post("/export")
+async def export_analysis(request: ClusterExportRequest, user_id: str, company_id: str):
+    """Export clustering analysis in various formats"""
+    
+    await verify_clustering_access(user_id, company_id)
+    
+    analysis = await find_analysis(request.analysis_id, user_id, company_id)
+    
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
@@ -422,6 +584,20 @@ async def export_json(analysis: Dict, request: ClusterExportRequest):
         headers={"Content-Disposition": f"attachment; filename=keyword_clusters_{analysis['id']}.json"}
     )
 
+def _cluster_count(counts_field: str, cluster_field: str, label: str) -> Dict:
+    """
+    $group accumulator of an analysis' clusters with one intent/stage label: the
+    summary count, or for records stored before the counts existed, a count over
+    their embedded clusters
+    """
+    return {"$sum": {"$ifNull": [
+        f"${counts_field}.{label}",
+        {"$size": {"$filter": {
+            "input": {"$ifNull": ["$clusters", []]},
+            "cond": {"$eq": [f"$$this.{cluster_field}", label]}
+        }}}
+    ]}}
+
 @router.get("/stats", response_model=ClusterStats)
 async def get_clustering_stats(user_id: str, company_id: str):
     """Get user's clustering usage statistics"""
@@ -431,7 +607,7 @@ async def get_clustering_stats(user_id: str, company_id: str):
     db = await get_database()
     analyses_collection = db[CLUSTER_ANALYSES_COLLECTION]
     
-    # Aggregate statistics
+    # Aggregate statistics from the summary records (clusters per intent/stage are precomputed)
     pipeline = [
         {"$match": {"user_id": user_id, "company_id": company_id}},
         {"$group": {
@@ -439,7 +615,9 @@ async def get_clustering_stats(user_id: str, company_id: str):
             "total_analyses": {"$sum": 1},
             "total_keywords": {"$sum": "$total_keywords"},
             "total_clusters": {"$sum": "$total_clusters"},
-            "last_analysis": {"$max": "$created_at"}
+            "last_analysis": {"$max": "$created_at"},
+            **{f"intent_{intent.value}": _cluster_count("intent_counts", "search_intent", intent.value) for intent in SearchIntent},
+            **{f"stage_{stage.value}": _cluster_count("stage_counts", "buyer_journey_stage", stage.value) for stage in BuyerJourneyStage}
         }}
     ]
     
@@ -461,33 +639,10 @@ async def get_clustering_stats(user_id: str, company_id: str):
     stats = stats_result[0]
     
     # Get most common intent and stage
-    intent_pipeline = [
-        {"$match": {"user_id": user_id, "company_id": company_id}},
-        {"$unwind": "$clusters"},
-        {"$group": {
-            "_id": "$clusters.search_intent",
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
-    ]
-    
-    stage_pipeline = [
-        {"$match": {"user_id": user_id, "company_id": company_id}},
-        {"$unwind": "$clusters"},
-        {"$group": {
-            "_id": "$clusters.buyer_journey_stage",
-            "count": {"$sum": 1}
-        }},
-        {"$sort": {"count": -1}},
-        {"$limit": 1}
-    ]
-    
-    intent_result = await analyses_collection.aggregate(intent_pipeline).to_list(1)
-    stage_result = await analyses_collection.aggregate(stage_pipeline).to_list(1)
-    
-    most_common_intent = intent_result[0]["_id"] if intent_result else "informational"
-    most_common_stage = stage_result[0]["_id"] if stage_result else "awareness"
+    intent_counts = {intent.value: stats[f"intent_{intent.value}"] for intent in SearchIntent}
+    stage_counts = {stage.value: stats[f"stage_{stage.value}"] for stage in BuyerJourneyStage}
+    most_common_intent = max(intent_counts, key=intent_counts.get) if any(intent_counts.values()) else "informational"
+    most_common_stage = max(stage_counts, key=stage_counts.get) if any(stage_counts.values()) else "awareness"
     
     return ClusterStats(
         total_analyses=stats["total_analyses"],
@@ -544,13 +699,21 @@ async def delete_analysis(analysis_id: str, user_id: str, company_id: str):
     db = await get_database()
     analyses_collection = db[CLUSTER_ANALYSES_COLLECTION]
     
-    result = await analyses_collection.delete_one({
-        "id": analysis_id,
-        "user_id": user_id,
-        "company_id": company_id
-    })
+    deleted = await analyses_collection.find_one_and_delete(
+        {
+            "id": analysis_id,
+            "user_id": user_id,
+            "company_id": company_id
+        },
+        projection={"_id": 1, "result_id": 1}
+    )
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Analysis not found")
     
+    await db[CLUSTER_STATES_COLLECTION].delete_one({"analysis_id": analysis_id})
+    await db[CLUSTER_DETAILS_COLLECTION].delete_one({"analysis_id": analysis_id})
+    if deleted.get("result_id"):
+        await release_result(deleted["result_id"])
+    
     return {"message": "Analysis deleted successfully"}
\ No newline at end of file
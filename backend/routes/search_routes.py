@@ -18,6 +18,7 @@ from models.billing_models import UserTrialInfo
 from services.claude_service import get_claude_service
 from database import db, ensure_personal_company
 from billing.billing_middleware import get_current_user
+from billing.usage_series import get_usage_series
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -260,6 +261,7 @@ async def store_search_history(
         )
         
         await db.search_history.insert_one(history_entry.dict())
+        await get_usage_series().record_search(user_id, company_id, history_entry.created_at)
         logger.info(f"Stored search history for: {search_term} (user: {user_id}, company: {company_id})")
         
     except Exception as e:
@@ -4,7 +4,7 @@ from datetime import datetime, timedelta
 import uuid
 
 from models.billing_models import UserTrialInfo, TrialStatus, PlanType
-from database import db
+from database import db, forget_personal_company
 from billing.billing_middleware import get_current_user
 
 router = APIRouter(prefix="/trial", tags=["trial"])
@@ -177,6 +177,8 @@ async def cleanup_expired_trial_data():
         # Delete user data (searches, companies, etc.)
         await db.searches.delete_many({"user_email": user["email"]})
         await db.companies.delete_many({"users": user["email"]})
+        if user.get("id"):
+            forget_personal_company(user["id"])
         
         # Delete user account
         await db.users.delete_one({"_id": user["_id"]})
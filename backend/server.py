@@ -25,7 +25,7 @@ from billing.billing_routes import router as billing_router
 from billing.safe_billing_routes import router as safe_billing_router
 
 # NEW: Import admin routes (additive)
-from routes.admin_routes import router as admin_router
+from routes.admin_routes import router as admin_router, run_admin_session_sweeper, ADMIN_SESSION_SWEEP_INTERVAL
 from routes.admin_analytics_routes import router as admin_analytics_router
 from routes.admin_custom_pricing_routes import router as admin_custom_pricing_router
 from routes.admin_trial_routes import router as admin_trial_router
@@ -45,6 +45,10 @@ from routes.auth_routes import router as auth_router
 from services.trial_scheduler import get_trial_scheduler
 
 from database import init_database, close_database
+from billing.stripe_service import shutdown_stripe_service
+from billing.webhook_queue import get_stripe_event_worker
+from services.clustering_pool import start_clustering_pool, shutdown_clustering_pool
+from services.clustering_jobs import get_clustering_job_worker
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -74,16 +78,37 @@ async def lifespan(app: FastAPI):
     scheduler_task = asyncio.create_task(scheduler.start_scheduler())
     logger.info("Trial scheduler started")
     
+    # Start Stripe webhook event worker
+    stripe_event_worker = get_stripe_event_worker()
+    stripe_event_task = asyncio.create_task(stripe_event_worker.start_worker())
+    
+    # Start clustering job worker (also resumes jobs left behind by a previous process)
+    clustering_job_worker = get_clustering_job_worker()
+    clustering_job_task = asyncio.create_task(clustering_job_worker.start_worker())
+    
+    # Spawn clustering workers and load the ML stack after startup, not before serving
+    clustering_warmup_task = asyncio.create_task(start_clustering_pool())
+    background_tasks = [scheduler_task, stripe_event_task, clustering_job_task, clustering_warmup_task]
+    
+    # Optional sweep of expired admin sessions
+    if ADMIN_SESSION_SWEEP_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(run_admin_session_sweeper()))
+    
     yield
     
     # Cleanup
     scheduler.stop_scheduler()
-    scheduler_task.cancel()
-    try:
-        await scheduler_task
-    except asyncio.CancelledError:
-        pass
+    stripe_event_worker.stop_worker()
+    clustering_job_worker.stop_worker()
+    for task in background_tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
     
+    shutdown_stripe_service()
+    shutdown_clustering_pool()
     await close_database()
     logger.info("API shutdown complete!")
 
@@ -0,0 +1,94 @@
+"""
+Compact storage of analysis details.
+
+An analysis record in ``cluster_analyses`` is a small summary (totals,
+timings, per-intent and per-stage cluster counts), so history pages and stats
+never read cluster data. The details - clusters, unclustered keywords, content
+gaps and pillar opportunities - are stored separately: in
+``cluster_analysis_details`` per analysis, or once per input hash in
+``cluster_results`` (see result_cache.py).
+
+Keywords dominate the details, so a detail document stores each distinct
+keyword once, in a zlib-compressed keyword dictionary, and clusters reference
+their keywords as int32 ID arrays.
+"""
+
+import zlib
+from collections import Counter
+from typing import List, Dict, Any
+
+import numpy as np
+from bson import Binary
+
+# Analysis fields stored in the detail document instead of the summary record
+DETAIL_FIELDS = ("clusters", "unclustered_keywords", "content_gaps", "pillar_opportunities")
+
+# Fields of an encoded detail (plus the plain fields of records written before the compact format)
+DETAIL_DOCUMENT_FIELDS = (
+    "detail_format", "keyword_text", "clusters", "unclustered_keyword_ids",
+    "unclustered_keywords", "content_gaps", "pillar_opportunities"
+)
+
+DETAIL_FORMAT = 1
+
+def _label(value: Any) -> str:
+    return getattr(value, "value", value)
+
+def _ids_binary(keywords: List[str], keyword_ids: Dict[str, int]) -> Binary:
+    return Binary(np.fromiter((keyword_ids[keyword] for keyword in keywords), dtype=np.int32, count=len(keywords)).tobytes())
+
+def summary_counts(clusters: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """Clusters per search intent and per buyer journey stage, kept on the summary record for stats"""
+    return {
+        "intent_counts": dict(Counter(_label(cluster["search_intent"]) for cluster in clusters)),
+        "stage_counts": dict(Counter(_label(cluster["buyer_journey_stage"]) for cluster in clusters))
+    }
+
+def encode_analysis_detail(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """Detail fields of an analysis in the compact stored form"""
+    keyword_ids: Dict[str, int] = {}
+    for cluster in analysis["clusters"]:
+        for keyword in cluster["keywords"]:
+            keyword_ids.setdefault(keyword, len(keyword_ids))
+    for keyword in analysis["unclustered_keywords"]:
+        keyword_ids.setdefault(keyword, len(keyword_ids))
+
+    clusters = []
+    for cluster in analysis["clusters"]:
+        encoded = {field: value for field, value in cluster.items() if field != "keywords"}
+        encoded["keyword_ids"] = _ids_binary(cluster["keywords"], keyword_ids)
+        clusters.append(encoded)
+
+    return {
+        "detail_format": DETAIL_FORMAT,
+        # Keywords are preprocessed (whitespace collapsed), so a newline never occurs in one
+        "keyword_text": Binary(zlib.compress("\n".join(keyword_ids).encode("utf-8"))),
+        "clusters": clusters,
+        "unclustered_keyword_ids": _ids_binary(analysis["unclustered_keywords"], keyword_ids),
+        "content_gaps": analysis["content_gaps"],
+        "pillar_opportunities": analysis["pillar_opportunities"]
+    }
+
+def decode_analysis_detail(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Detail fields from a document written by encode_analysis_detail (or a record with plain fields)"""
+    if "detail_format" not in document:
+        return {field: document.get(field) or [] for field in DETAIL_FIELDS}
+
+    text = zlib.decompress(document["keyword_text"]).decode("utf-8")
+    keywords = text.split("\n") if text else []
+
+    def lookup(ids: bytes) -> List[str]:
+        return [keywords[keyword_id] for keyword_id in np.frombuffer(ids, dtype=np.int32).tolist()]
+
+    clusters = []
+    for cluster in document["clusters"]:
+        decoded = {field: value for field, value in cluster.items() if field != "keyword_ids"}
+        decoded["keywords"] = lookup(cluster["keyword_ids"])
+        clusters.append(decoded)
+
+    return {
+        "clusters": clusters,
+        "unclustered_keywords": lookup(document["unclustered_keyword_ids"]),
+        "content_gaps": document["content_gaps"],
+        "pillar_opportunities": document["pillar_opportunities"]
+    }
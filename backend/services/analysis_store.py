@@ -0,0 +1,259 @@
+"""
+Persistence of clustering analyses.
+
+Shared by the synchronous /clustering/analyze route and the clustering job
+worker, so both store analyses, fitted state and usage the same way.
+
+An analysis record holds only its summary; clusters, gaps and pillars are
+stored in the compact detail form (see analysis_detail.py). With the result
+cache enabled, the record has a ``result_id`` (the input hash) and the details
+and fitted state live once in ``cluster_results``; otherwise they are stored
+per analysis in ``cluster_analysis_details`` and ``cluster_states``. Use
+find_analysis to read a full analysis.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple, Any
+
+from models.clustering_models import (
+    ClusterAnalysisResult, ClusteringEngineType,
+    CLUSTER_ANALYSES_COLLECTION, CLUSTER_USAGE_COLLECTION, CLUSTER_STATES_COLLECTION, CLUSTER_RESULTS_COLLECTION,
+    CLUSTER_DETAILS_COLLECTION
+)
+from services.analysis_detail import (
+    DETAIL_FIELDS, DETAIL_DOCUMENT_FIELDS, summary_counts, encode_analysis_detail, decode_analysis_detail
+)
+from services.clustering_service import ClusterAnalysis
+from services.incremental_clustering import state_to_document
+from services.result_cache import (
+    CLUSTERING_CACHE_ENABLED, clustering_input_hash, find_cached_result, find_cached_state, store_result
+)
+from database import get_database
+
+def build_analysis_result(
+    analysis_id: str,
+    user_id: str,
+    company_id: str,
+    engine: ClusteringEngineType,
+    clustering_result: ClusterAnalysis
+) -> ClusterAnalysisResult:
+    """Convert an engine result into the stored/returned analysis model"""
+
+    clusters_data = []
+    for cluster in clustering_result.clusters:
+        clusters_data.append({
+            "id": cluster.id,
+            "name": cluster.name,
+            "primary_keyword": cluster.primary_keyword,
+            "keywords": cluster.keywords,
+            "search_intent": cluster.search_intent,
+            "topic_theme": cluster.topic_theme,
+            "search_volume_total": cluster.search_volume_total,
+            "difficulty_average": cluster.difficulty_average,
+            "content_suggestions": cluster.content_suggestions,
+            "buyer_journey_stage": cluster.buyer_journey_stage,
+            "priority_score": cluster.priority_score,
+            "created_at": cluster.created_at
+        })
+
+    content_gaps_data = []
+    for gap in clustering_result.content_gaps:
+        content_gaps_data.append({
+            "type": gap["type"],
+            "intent": gap.get("intent"),
+            "stage": gap.get("stage"),
+            "description": gap["description"],
+            "recommendation": gap["recommendation"],
+            "priority": gap["priority"]
+        })
+
+    pillar_opportunities_data = []
+    for opportunity in clustering_result.pillar_opportunities:
+        pillar_opportunities_data.append({
+            "type": opportunity["type"],
+            "cluster_name": opportunity.get("cluster_name"),
+            "primary_keyword": opportunity.get("primary_keyword"),
+            "intent": opportunity.get("intent"),
+            "supporting_keywords": opportunity.get("supporting_keywords"),
+            "clusters_involved": opportunity.get("clusters_involved"),
+            "total_keywords": opportunity.get("total_keywords"),
+            "search_volume": opportunity.get("search_volume"),
+            "total_search_volume": opportunity.get("total_search_volume"),
+            "content_suggestions": opportunity.get("content_suggestions"),
+            "description": opportunity.get("description"),
+            "priority": opportunity["priority"]
+        })
+
+    return ClusterAnalysisResult(
+        id=analysis_id,
+        user_id=user_id,
+        company_id=company_id,
+        total_keywords=clustering_result.total_keywords,
+        total_clusters=clustering_result.total_clusters,
+        clusters=clusters_data,
+        unclustered_keywords=clustering_result.unclustered_keywords,
+        content_gaps=content_gaps_data,
+        pillar_opportunities=pillar_opportunities_data,
+        processing_time=clustering_result.processing_time,
+        engine=engine,
+        selected_k=clustering_result.selected_k,
+        selection_score=clustering_result.selection_score,
+        stage_metrics=clustering_result.stage_metrics,
+        created_at=datetime.utcnow()
+    )
+
+async def find_cached_analysis(
+    analysis_id: str,
+    user_id: str,
+    company_id: str,
+    engine: ClusteringEngineType,
+    keywords: List[str],
+    search_volumes: Optional[List[int]],
+    difficulties: Optional[List[float]]
+) -> Tuple[Optional[str], Optional[ClusterAnalysisResult]]:
+    """
+    Input hash of a request and, if identical inputs were analyzed before, the
+    stored result as a new analysis. The hash is None when caching is disabled.
+    """
+    if not CLUSTERING_CACHE_ENABLED:
+        return None, None
+
+    input_hash = await asyncio.to_thread(clustering_input_hash, keywords, search_volumes, difficulties, engine.value)
+    cached = await find_cached_result(input_hash)
+    if cached is None:
+        return input_hash, None
+
+    return input_hash, ClusterAnalysisResult(
+        id=analysis_id,
+        user_id=user_id,
+        company_id=company_id,
+        engine=engine,
+        cache_hit=True,
+        **decode_analysis_detail(cached),
+        **{field: cached.get(field) for field in (
+            "total_keywords", "total_clusters", "processing_time", "selected_k", "selection_score", "stage_metrics"
+        )}
+    )
+
+async def save_analysis(
+    analysis_result: ClusterAnalysisResult,
+    clustering_result: Optional[ClusterAnalysis] = None,
+    input_hash: Optional[str] = None
+) -> None:
+    """
+    Store an analysis (idempotent per analysis ID). With an input hash the
+    summary record references the shared result, which is stored first if
+    this analysis computed it; without one, the details and fitted state are
+    stored per analysis.
+    """
+
+    db = await get_database()
+    document = analysis_result.dict()
+    detail = {field: document.pop(field) for field in DETAIL_FIELDS}
+    document.update(summary_counts(detail["clusters"]))
+
+    # Details are written before the summary record that points to them
+    if input_hash:
+        if clustering_result is not None:
+            await store_result(input_hash, {**document, **detail}, clustering_result)
+        document["result_id"] = input_hash
+    else:
+        await save_analysis_detail(analysis_result.id, analysis_result.user_id, analysis_result.company_id, detail)
+
+    await db[CLUSTER_ANALYSES_COLLECTION].replace_one(
+        {"id": analysis_result.id}, document, upsert=True
+    )
+
+    # Keep the fitted state so keywords can be added without reclustering
+    if not input_hash and clustering_result is not None and clustering_result.state:
+        await db[CLUSTER_STATES_COLLECTION].replace_one(
+            {"analysis_id": analysis_result.id},
+            {
+                "analysis_id": analysis_result.id,
+                "user_id": analysis_result.user_id,
+                "company_id": analysis_result.company_id,
+                **state_to_document(clustering_result.state),
+                "version": 0,
+                "created_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            },
+            upsert=True
+        )
+
+async def save_analysis_detail(analysis_id: str, user_id: str, company_id: str, detail: Dict[str, Any]) -> None:
+    """Store an analysis' own clusters, gaps and pillars in the compact detail form"""
+
+    db = await get_database()
+    await db[CLUSTER_DETAILS_COLLECTION].replace_one(
+        {"analysis_id": analysis_id},
+        {
+            "analysis_id": analysis_id,
+            "user_id": user_id,
+            "company_id": company_id,
+            **encode_analysis_detail(detail),
+            "updated_at": datetime.utcnow()
+        },
+        upsert=True
+    )
+
+async def find_analysis(analysis_id: str, user_id: str, company_id: str) -> Optional[Dict[str, Any]]:
+    """A user's analysis with its detail fields filled in"""
+
+    db = await get_database()
+    analysis = await db[CLUSTER_ANALYSES_COLLECTION].find_one({
+        "id": analysis_id,
+        "user_id": user_id,
+        "company_id": company_id
+    })
+    if not analysis:
+        return None
+
+    detail_projection = {"_id": 0, **{field: 1 for field in DETAIL_DOCUMENT_FIELDS}}
+    if analysis.get("result_id"):
+        detail = await db[CLUSTER_RESULTS_COLLECTION].find_one({"input_hash": analysis["result_id"]}, detail_projection)
+    elif "clusters" in analysis:
+        detail = analysis  # Stored before details moved out of the record
+    else:
+        detail = await db[CLUSTER_DETAILS_COLLECTION].find_one({"analysis_id": analysis_id}, detail_projection)
+    analysis.update(decode_analysis_detail(detail or {}))
+    return analysis
+
+async def find_state_document(analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Fitted state of an analysis: its own once keywords have been added to it,
+    otherwise the shared result's (reported as version 0)
+    """
+
+    db = await get_database()
+    state_document = await db[CLUSTER_STATES_COLLECTION].find_one({"analysis_id": analysis["id"]})
+    if state_document is None and analysis.get("result_id"):
+        state_document = await find_cached_state(analysis["result_id"])
+    return state_document
+
+async def update_usage_stats(user_id: str, company_id: str, keywords_count: int, clusters_count: int):
+    """Update usage statistics"""
+
+    db = await get_database()
+    current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    # Update monthly usage
+    usage_collection = db[CLUSTER_USAGE_COLLECTION]
+    await usage_collection.update_one(
+        {
+            "user_id": user_id,
+            "company_id": company_id,
+            "month": current_month
+        },
+        {
+            "$inc": {
+                "analyses_count": 1,
+                "keywords_processed": keywords_count,
+                "clusters_created": clusters_count
+            },
+            "$set": {
+                "last_analysis_date": datetime.utcnow()
+            }
+        },
+        upsert=True
+    )
@@ -0,0 +1,279 @@
+"""
+Bulk keyword clustering for whole keyword exports (50k+ keywords).
+
+The standard engine fits a TF-IDF vocabulary and runs full KMeans several
+times, which is fine for a few thousand keywords but not for a full export.
+This engine keeps no fitted vocabulary and no dense per-keyword matrix:
+
+1. keywords are hashed into a fixed, modest feature space
+   (``HashingVectorizer``) one chunk at a time; the sparse IDF-weighted rows
+   are about the size of the keyword text itself;
+2. mini-batch spherical k-means (Sculley, "Web-scale k-means clustering")
+   streams over the rows in batches. The only dense arrays are the centres
+   (clusters x hashed features) and one batch of similarities, so memory does
+   not grow with the list beyond the sparse rows.
+
+Near-duplicate keywords are collapsed first (see near_duplicates.py), so both
+steps run over one row per group, weighted by the group size.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple, Any, Callable
+
+import numpy as np
+from scipy import sparse
+
+from services.clustering_service import (
+    KeywordClusteringEngine, ClusterAnalysis, StageRecorder, get_clustering_engine, _matrix_nbytes
+)
+
+logger = logging.getLogger(__name__)
+
+# Hashed feature space. Keyword texts are short, so collisions between two
+# keywords' features stay rare even at 2**14; centres are dense in this space.
+BULK_HASH_FEATURES = int(os.getenv("BULK_HASH_FEATURES", str(2 ** 14)))
+# Keywords hashed at a time and k-means batch size
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "20000"))
+BULK_BATCH_SIZE = 4096
+BULK_EPOCHS = 2
+# Cluster count scales with the list: one cluster per this many keywords, capped
+BULK_KEYWORDS_PER_CLUSTER = int(os.getenv("BULK_KEYWORDS_PER_CLUSTER", "100"))
+BULK_MAX_CLUSTERS = int(os.getenv("BULK_MAX_CLUSTERS", "1000"))
+# Most frequent words considered for cluster names
+BULK_NAME_VOCABULARY = 4096
+BULK_SILHOUETTE_SAMPLE_SIZE = 2000
+
+# Stages reported while a bulk analysis runs, in order (no separate k selection)
+BULK_PIPELINE_STAGES = ('preprocess', 'dedup', 'vectorize', 'fit', 'summarize', 'gaps', 'pillars')
+
+class BulkClusteringEngine:
+    """
+    Chunked hashing + mini-batch spherical k-means clustering.
+
+    Shares the standard engine's preprocessing, intent/stage classification and
+    cluster summaries, so bulk analyses have the same shape as standard ones.
+    Holds only a stateless hasher and is safe to share between threads.
+    """
+
+    def __init__(self, engine: KeywordClusteringEngine, random_state: int = 42):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.engine = engine
+        self.random_state = random_state
+        self.hasher = HashingVectorizer(
+            n_features=BULK_HASH_FEATURES,
+            ngram_range=(1, 2),
+            stop_words='english',
+            lowercase=True,
+            alternate_sign=False,
+            norm=None,
+            dtype=np.float32
+        )
+
+    @staticmethod
+    def cluster_count(n_keywords: int) -> int:
+        """Cluster count for a bulk list"""
+        return int(min(n_keywords, np.clip(round(n_keywords / BULK_KEYWORDS_PER_CLUSTER), 2, BULK_MAX_CLUSTERS)))
+
+    def vectorize(self, texts: List[str]) -> sparse.csr_matrix:
+        """L2-normalised hashed TF-IDF rows, hashed chunk by chunk"""
+        from sklearn.preprocessing import normalize
+
+        counts = sparse.vstack(
+            [self.hasher.transform(texts[start:start + BULK_CHUNK_SIZE]) for start in range(0, len(texts), BULK_CHUNK_SIZE)],
+            format="csr"
+        )
+        df = np.bincount(counts.indices, minlength=BULK_HASH_FEATURES)
+        idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        counts.data *= idf[counts.indices]
+        return normalize(counts)
+
+    def fit_centers(self, features: sparse.csr_matrix, k: int, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Mini-batch spherical k-means: per-centre learning rates, centres kept
+        at unit length so the dot product is the cosine similarity. Each row
+        counts ``weights[row]`` times (once if no weights are given).
+        """
+        from sklearn.cluster import kmeans_plusplus
+        from sklearn.preprocessing import normalize
+
+        rng = np.random.default_rng(self.random_state)
+        n_keywords = features.shape[0]
+        if weights is None:
+            weights = np.ones(n_keywords, dtype=np.float32)
+
+        # k-means++ seeding on a random sample spread over the whole list
+        sample = np.sort(rng.choice(n_keywords, size=min(n_keywords, max(3 * k, BULK_BATCH_SIZE)), replace=False))
+        centers, _ = kmeans_plusplus(features[sample], k, random_state=self.random_state)
+
+        # Centres are held one per column so batch @ centres is a fast sparse x dense product
+        centers_t = np.ascontiguousarray(normalize(centers).T, dtype=np.float32)
+        seen = np.zeros(k, dtype=np.float64)
+        for _ in range(BULK_EPOCHS):
+            hit = np.zeros(k, dtype=bool)
+            for start in rng.permutation(np.arange(0, n_keywords, BULK_BATCH_SIZE)):
+                batch = features[start:start + BULK_BATCH_SIZE]
+                batch_weights = weights[start:start + BULK_BATCH_SIZE]
+                labels = (batch @ centers_t).argmax(axis=1)
+                batch_counts = np.bincount(labels, weights=batch_weights, minlength=k)
+                members = sparse.csr_matrix(
+                    (batch_weights.astype(np.float32), (labels, np.arange(len(labels)))),
+                    shape=(k, len(labels))
+                )
+                sums = (members @ batch).tocoo()
+
+                # centre <- (1 - rate) * centre + rate * batch mean, with rate = batch hits / total hits
+                seen += batch_counts
+                rate = (batch_counts / np.maximum(seen, 1)).astype(np.float32)
+                centers_t *= 1 - rate
+                centers_t[sums.col, sums.row] += sums.data * (rate / np.maximum(batch_counts, 1))[sums.row]
+                centers_t /= np.maximum(np.linalg.norm(centers_t, axis=0), 1e-12)
+                hit |= batch_counts > 0
+
+            # Re-seed centres that attracted nothing this epoch
+            dead = np.flatnonzero(~hit)
+            if dead.size:
+                centers_t[:, dead] = features[rng.choice(sample, size=dead.size, replace=False)].toarray().T
+                seen[dead] = 0
+
+        return np.ascontiguousarray(centers_t.T)
+
+    @staticmethod
+    def assign(features: sparse.csr_matrix, centers: np.ndarray) -> np.ndarray:
+        """Nearest-centre label of every keyword"""
+        centers_t = np.ascontiguousarray(centers.T)
+        labels = np.empty(features.shape[0], dtype=np.int32)
+        for start in range(0, features.shape[0], BULK_BATCH_SIZE):
+            batch = features[start:start + BULK_BATCH_SIZE]
+            labels[start:start + batch.shape[0]] = (batch @ centers_t).argmax(axis=1)
+        return labels
+
+    def name_weights(self, tokens: List[List[str]], labels: np.ndarray, n_clusters: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Per-cluster word weights (member count x IDF) over the most frequent
+        words, in the ``(centroids, terms)`` form summarize_clusters names from.
+        """
+        stop_words = self.engine.stop_words
+        vocabulary: Dict[str, int] = {}
+        token_ids = np.fromiter(
+            (vocabulary.setdefault(token, len(vocabulary)) for keyword_tokens in tokens for token in keyword_tokens),
+            dtype=np.int64
+        )
+        token_rows = np.repeat(np.arange(len(tokens)), [len(keyword_tokens) for keyword_tokens in tokens])
+        words = np.array(list(vocabulary), dtype=object)
+
+        # Keep the most frequent name-worthy words only
+        frequencies = np.bincount(token_ids, minlength=len(words))
+        usable = np.fromiter((word not in stop_words and word.isalpha() for word in words), dtype=bool, count=len(words))
+        frequencies[~usable] = 0
+        kept = np.argsort(-frequencies, kind="stable")[:BULK_NAME_VOCABULARY]
+        kept = kept[frequencies[kept] > 0]
+        if not kept.size:
+            return np.zeros((n_clusters, 1), dtype=np.float32), np.array([""])
+        column = np.full(len(words), -1, dtype=np.int64)
+        column[kept] = np.arange(len(kept))
+
+        token_columns = column[token_ids]
+        in_names = token_columns >= 0
+        member_counts = sparse.csr_matrix(
+            (np.ones(int(in_names.sum()), dtype=np.float32), (labels[token_rows[in_names]], token_columns[in_names])),
+            shape=(n_clusters, len(kept))
+        )
+        idf = np.log(len(tokens) / frequencies[kept]).astype(np.float32) + 1
+        return member_counts.multiply(idf).toarray(), words[kept].astype(str)
+
+    def cluster_keywords_sync(
+        self,
+        keywords: List[str],
+        search_volumes: Optional[List[int]] = None,
+        difficulties: Optional[List[float]] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> ClusterAnalysis:
+        """CPU-bound bulk clustering pipeline (stages are listed in BULK_PIPELINE_STAGES)"""
+        from sklearn.metrics import silhouette_score
+
+        start_time = datetime.now()
+        stages = StageRecorder(progress)
+        engine = self.engine
+
+        processed_keywords, source_indices = engine.preprocess_keywords_indexed(keywords)
+        if len(processed_keywords) < 3:
+            # The standard pipeline reports its own stages
+            return engine.cluster_keywords_sync(keywords, search_volumes, difficulties, progress=progress)
+
+        tokens = engine.normalizer.tokenize(processed_keywords)
+        stages.record("preprocess", sum(len(keyword) for keyword in processed_keywords))
+
+        volumes = engine._aligned_metric(search_volumes, source_indices, 100, np.int64)
+        representatives, groups = engine.collapse_keywords(processed_keywords, tokens, volumes)
+        group_sizes = None if groups is None else np.bincount(groups).astype(np.float32)
+        stages.record(
+            "dedup", 0 if groups is None else int(groups.nbytes),
+            groups=len(representatives), collapsed=len(processed_keywords) - len(representatives)
+        )
+
+        # Only the sparse hashed rows (one per near-duplicate group) are kept for the whole list
+        features = self.vectorize(engine._expand_keywords(
+            [processed_keywords[i] for i in representatives], [tokens[i] for i in representatives]
+        ))
+        stages.record("vectorize", _matrix_nbytes(features), shape=list(features.shape), chunk_size=BULK_CHUNK_SIZE)
+
+        n_rows = features.shape[0]
+        centers = self.fit_centers(features, self.cluster_count(n_rows), group_sizes)
+        row_labels = self.assign(features, centers)
+
+        # Dense labels 0..k'-1 (some centres may end up empty)
+        used, row_labels = np.unique(row_labels, return_inverse=True)
+        row_labels = row_labels.astype(np.int32)
+
+        rng = np.random.default_rng(self.random_state)
+        sample = rng.choice(n_rows, size=min(n_rows, BULK_SILHOUETTE_SAMPLE_SIZE), replace=False)
+        selection_score = None
+        if len(np.unique(row_labels[sample])) > 1:
+            selection_score = float(silhouette_score(features[sample], row_labels[sample], metric="cosine"))
+        stages.record(
+            "fit", int(centers.nbytes) + int(row_labels.nbytes), selected_k=len(used), epochs=BULK_EPOCHS
+        )
+
+        # Expand the groups back out: every keyword takes its representative's cluster
+        cluster_labels = row_labels if groups is None else row_labels[groups]
+        weights, terms = self.name_weights(tokens, cluster_labels, len(used))
+        clusters = engine.summarize_clusters(
+            processed_keywords, tokens, weights, terms, cluster_labels, volumes,
+            engine._aligned_metric(difficulties, source_indices, 50.0, np.float64)
+        )
+        stages.record("summarize", _matrix_nbytes(weights))
+
+        content_gaps = engine._analyze_content_gaps(clusters)
+        stages.record("gaps", 0)
+        pillar_opportunities = engine._identify_pillar_opportunities(clusters)
+        stages.record("pillars", 0)
+
+        return ClusterAnalysis(
+            total_keywords=len(processed_keywords),
+            total_clusters=len(clusters),
+            clusters=clusters,
+            unclustered_keywords=[],
+            content_gaps=content_gaps,
+            pillar_opportunities=pillar_opportunities,
+            processing_time=(datetime.now() - start_time).total_seconds(),
+            stage_metrics=stages.metrics,
+            selected_k=len(used),
+            selection_score=selection_score
+        )
+
+# Process-wide engine instance
+_bulk_clustering_engine = None
+_bulk_clustering_engine_lock = threading.Lock()
+
+def get_bulk_clustering_engine() -> BulkClusteringEngine:
+    """Get or create the shared bulk clustering engine"""
+    global _bulk_clustering_engine
+    if _bulk_clustering_engine is None:
+        with _bulk_clustering_engine_lock:
+            if _bulk_clustering_engine is None:
+                _bulk_clustering_engine = BulkClusteringEngine(get_clustering_engine())
+    return _bulk_clustering_engine
@@ -0,0 +1,337 @@
+"""
+Asynchronous clustering jobs.
+
+``POST /clustering/jobs`` stores the request in ``cluster_jobs`` and returns
+at once. ClusteringJobWorker claims queued jobs, runs them on the clustering
+pool and writes every finished pipeline stage to the job document, so clients
+can poll or stream progress. A running job holds a lease that is renewed as
+it progresses; if the API process dies, another one picks the job up once the
+lease expires. Usage is charged when a job completes.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from pymongo import ReturnDocument
+
+from models.clustering_models import (
+    KeywordClusterRequest, ClusteringJobStatus, ClusteringEngineType, CLUSTER_JOBS_COLLECTION
+)
+from services.clustering_service import PIPELINE_STAGES, expand_analysis
+from services.bulk_clustering import BULK_PIPELINE_STAGES
+from services.clustering_pool import get_clustering_pool, ClusteringCapacityError
+from services.analysis_store import build_analysis_result, save_analysis, update_usage_stats, find_cached_analysis
+from services.result_cache import CLUSTERING_CACHE_HITS_COUNT_USAGE
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+# Jobs run at once by one API process (the clustering pool still applies plan caps)
+CLUSTERING_JOB_WORKERS = int(os.getenv("CLUSTERING_JOB_WORKERS", "2"))
+CLUSTERING_JOB_POLL_SECONDS = float(os.getenv("CLUSTERING_JOB_POLL_SECONDS", "2"))
+CLUSTERING_JOB_LEASE_SECONDS = 120
+CLUSTERING_JOB_MAX_ATTEMPTS = 2
+# Seconds to wait before retrying a job the clustering queue had no room for
+CLUSTERING_JOB_BUSY_RETRY_SECONDS = 10
+# Seconds to wait before retrying a failed job (doubled for each attempt)
+CLUSTERING_JOB_RETRY_BACKOFF_SECONDS = 30
+
+PENDING_JOB_STATUSES = [ClusteringJobStatus.QUEUED.value, ClusteringJobStatus.RUNNING.value]
+
+# Input fields dropped from the job document once it has finished
+JOB_INPUT_FIELDS = ("keywords", "search_volumes", "difficulties")
+
+def _pipeline_stages(engine: str):
+    return BULK_PIPELINE_STAGES if engine == ClusteringEngineType.BULK.value else PIPELINE_STAGES
+
+async def submit_clustering_job(request: KeywordClusterRequest, plan_type: str) -> Dict[str, Any]:
+    """Queue a clustering request and return the job document"""
+    db = await get_database()
+    now = datetime.utcnow()
+    stages = _pipeline_stages(request.engine.value)
+
+    job = {
+        "id": str(uuid.uuid4()),
+        "user_id": request.user_id,
+        "company_id": request.company_id,
+        "plan_type": plan_type,
+        "engine": request.engine.value,
+        "keywords": request.keywords,
+        "search_volumes": request.search_volumes,
+        "difficulties": request.difficulties,
+        "total_keywords": len(request.keywords),
+        "status": ClusteringJobStatus.QUEUED.value,
+        "progress": 0.0,
+        "current_stage": stages[0],
+        "stages": [],
+        "analysis_id": None,
+        "error": None,
+        "attempts": 0,
+        "claim_token": None,
+        "lease_expires_at": None,
+        "next_attempt_at": now,
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "updated_at": now
+    }
+    await db[CLUSTER_JOBS_COLLECTION].insert_one(job)
+    get_clustering_job_worker().wake()
+    return job
+
+async def count_pending_jobs(user_id: str, company_id: str) -> int:
+    """Jobs submitted but not yet finished (they count against the monthly limit)"""
+    db = await get_database()
+    return await db[CLUSTER_JOBS_COLLECTION].count_documents({
+        "user_id": user_id,
+        "company_id": company_id,
+        "status": {"$in": PENDING_JOB_STATUSES}
+    })
+
+def _next_metric(progress_queue, timeout: float) -> Optional[Dict[str, Any]]:
+    try:
+        return progress_queue.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+class ClusteringJobWorker:
+    """Background worker that claims queued clustering jobs and runs them"""
+
+    def __init__(self, max_jobs: int = CLUSTERING_JOB_WORKERS):
+        self.is_running = False
+        self.max_jobs = max_jobs
+        self._wakeup = asyncio.Event()
+        self._tasks: set = set()
+
+    def wake(self) -> None:
+        """Check for new jobs now instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    async def start_worker(self):
+        """Start the background worker loop"""
+        if self.is_running:
+            return
+
+        self.is_running = True
+        logger.info("Clustering job worker started")
+
+        while self.is_running:
+            try:
+                await self.claim_jobs()
+            except Exception as e:
+                logger.error(f"Error in clustering job worker: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=CLUSTERING_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def stop_worker(self):
+        """Stop the worker (running jobs are cancelled and resumed elsewhere after their lease)"""
+        self.is_running = False
+        self._wakeup.set()
+        for task in list(self._tasks):
+            task.cancel()
+        logger.info("Clustering job worker stopped")
+
+    async def claim_jobs(self) -> None:
+        """Start due jobs while this process has free job slots"""
+        while self.is_running and len(self._tasks) < self.max_jobs:
+            job = await self._claim()
+            if job is None:
+                return
+
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._job_finished)
+
+    def _job_finished(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self.wake()
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """Lease the oldest due job: queued ones, or running ones whose worker went away"""
+        db = await get_database()
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+
+        job = await db[CLUSTER_JOBS_COLLECTION].find_one_and_update(
+            {"$or": [
+                {"status": ClusteringJobStatus.QUEUED.value, "next_attempt_at": {"$lte": now}},
+                {"status": ClusteringJobStatus.RUNNING.value, "lease_expires_at": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "status": ClusteringJobStatus.RUNNING.value,
+                    "claim_token": token,
+                    "lease_expires_at": now + timedelta(seconds=CLUSTERING_JOB_LEASE_SECONDS),
+                    "started_at": now,
+                    "progress": 0.0,
+                    "stages": [],
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            return None
+
+        if job["attempts"] > CLUSTERING_JOB_MAX_ATTEMPTS:
+            await self._finish(job, ClusteringJobStatus.FAILED, error="Clustering job failed repeatedly")
+            return await self._claim()
+        return job
+
+    async def _update(self, job: Dict[str, Any], update: Dict[str, Any]) -> bool:
+        """Apply an update if this worker still holds the job; renews the lease"""
+        db = await get_database()
+        now = datetime.utcnow()
+        fields = update.setdefault("$set", {})
+        fields.setdefault("lease_expires_at", now + timedelta(seconds=CLUSTERING_JOB_LEASE_SECONDS))
+        fields["updated_at"] = now
+        result = await db[CLUSTER_JOBS_COLLECTION].update_one(
+            {"id": job["id"], "claim_token": job["claim_token"], "status": ClusteringJobStatus.RUNNING.value},
+            update
+        )
+        return result.modified_count == 1
+
+    async def _record_stage(self, job: Dict[str, Any], metric: Dict[str, Any]) -> None:
+        stages = _pipeline_stages(job["engine"])
+        if metric["stage"] not in stages:
+            return
+        done = stages.index(metric["stage"]) + 1
+        await self._update(job, {
+            "$push": {"stages": metric},
+            "$set": {
+                "progress": round(done / len(stages), 4),
+                "current_stage": stages[done] if done < len(stages) else None
+            }
+        })
+
+    async def _finish(self, job: Dict[str, Any], status: ClusteringJobStatus, **fields) -> bool:
+        now = datetime.utcnow()
+        update = {
+            "$set": {
+                "status": status.value,
+                "current_stage": None,
+                "claim_token": None,
+                "lease_expires_at": None,
+                "finished_at": now,
+                **fields
+            },
+            "$unset": {field: "" for field in JOB_INPUT_FIELDS}
+        }
+        return await self._update(job, update)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        engine = ClusteringEngineType(job["engine"])
+        input_hash, cached_result = await find_cached_analysis(
+            job["id"], job["user_id"], job["company_id"], engine,
+            job["keywords"], job.get("search_volumes"), job.get("difficulties")
+        )
+        if cached_result:
+            await save_analysis(cached_result, input_hash=input_hash)
+            completed = await self._finish(
+                job, ClusteringJobStatus.COMPLETED,
+                progress=1.0, analysis_id=cached_result.id, error=None
+            )
+            if completed and CLUSTERING_CACHE_HITS_COUNT_USAGE:
+                await update_usage_stats(
+                    job["user_id"], job["company_id"], job["total_keywords"], len(cached_result.clusters)
+                )
+            return
+
+        pool = get_clustering_pool()
+        progress_queue = pool.progress_queue()
+        started = time.perf_counter()
+        await self._update(job, {"$set": {"current_stage": _pipeline_stages(job["engine"])[0]}})
+
+        run = asyncio.create_task(pool.run(
+            job["keywords"], job.get("search_volumes"), job.get("difficulties"),
+            job["company_id"], job.get("plan_type"), job["engine"], progress_queue
+        ))
+
+        try:
+            # Relay stage metrics from the worker process to the job document
+            renewed = time.perf_counter()
+            while True:
+                metric = await asyncio.to_thread(_next_metric, progress_queue, 0.5)
+                if metric is not None:
+                    await self._record_stage(job, metric)
+                    renewed = time.perf_counter()
+                elif run.done():
+                    break
+                elif time.perf_counter() - renewed > CLUSTERING_JOB_LEASE_SECONDS / 4:
+                    # Heartbeat; stop if another worker has taken the job over
+                    if not await self._update(job, {}):
+                        run.cancel()
+                        return
+                    renewed = time.perf_counter()
+
+            clustering_result = expand_analysis(run.result())
+
+        except ClusteringCapacityError:
+            # Not the job's fault: put it back without using up an attempt
+            await self._update(job, {
+                "$set": {
+                    "status": ClusteringJobStatus.QUEUED.value,
+                    "claim_token": None,
+                    "next_attempt_at": datetime.utcnow() + timedelta(seconds=CLUSTERING_JOB_BUSY_RETRY_SECONDS)
+                },
+                "$inc": {"attempts": -1}
+            })
+            return
+        except asyncio.CancelledError:
+            run.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Clustering job {job['id']} failed: {e}")
+            if job["attempts"] < CLUSTERING_JOB_MAX_ATTEMPTS:
+                backoff = CLUSTERING_JOB_RETRY_BACKOFF_SECONDS * (2 ** (job["attempts"] - 1))
+                await self._update(job, {"$set": {
+                    "status": ClusteringJobStatus.QUEUED.value,
+                    "claim_token": None,
+                    "next_attempt_at": datetime.utcnow() + timedelta(seconds=backoff),
+                    "error": str(e)
+                }})
+            else:
+                await self._finish(job, ClusteringJobStatus.FAILED, error=str(e))
+            return
+
+        # Results land in cluster_analyses like synchronous analyses; the job ID is the analysis ID
+        analysis_result = build_analysis_result(
+            job["id"], job["user_id"], job["company_id"], engine, clustering_result
+        )
+        await save_analysis(analysis_result, clustering_result, input_hash)
+
+        completed = await self._finish(
+            job, ClusteringJobStatus.COMPLETED,
+            progress=1.0, analysis_id=analysis_result.id, error=None
+        )
+        if completed:
+            # Charged once, only for completed jobs
+            await update_usage_stats(
+                job["user_id"], job["company_id"], job["total_keywords"], len(analysis_result.clusters)
+            )
+            logger.info(
+                f"Clustering job {job['id']} completed in {time.perf_counter() - started:.1f}s "
+                f"({analysis_result.total_keywords} keywords, {analysis_result.total_clusters} clusters)"
+            )
+
+# Singleton instance
+_clustering_job_worker = None
+
+def get_clustering_job_worker() -> ClusteringJobWorker:
+    """Get or create clustering job worker instance"""
+    global _clustering_job_worker
+    if _clustering_job_worker is None:
+        _clustering_job_worker = ClusteringJobWorker()
+    return _clustering_job_worker
@@ -0,0 +1,275 @@
+"""
+Process pool for keyword clustering.
+
+Clustering is CPU-bound (TF-IDF + repeated KMeans), so analyses run in
+pre-warmed worker processes instead of on the API event loop. Admission
+into the pool is capped per company and per plan, and plans with
+``priority_processing`` are admitted ahead of everyone else.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional, Any
+
+from models.clustering_models import CLUSTERING_LIMITS
+from services.clustering_service import warm_clustering_engine, cluster_keywords_compact
+
+logger = logging.getLogger(__name__)
+
+# 0 runs analyses on a thread in the API process instead of a process pool
+CLUSTERING_PROCESS_WORKERS = int(os.getenv("CLUSTERING_PROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Analyses allowed to wait for a slot before new ones are rejected
+CLUSTERING_MAX_QUEUED = int(os.getenv("CLUSTERING_MAX_QUEUED", "100"))
+
+DEFAULT_LIMITS_PLAN = "professional_annual"
+
+class ClusteringCapacityError(Exception):
+    """Raised when the clustering queue is full"""
+
+def _init_worker() -> None:
+    """Worker process initializer - load NLP resources once per process"""
+    warm_clustering_engine()
+
+def _ping() -> int:
+    return os.getpid()
+
+class _Ticket:
+    __slots__ = ("company_id", "plan_type", "future", "queued_at")
+
+    def __init__(self, company_id: str, plan_type: str, future: asyncio.Future):
+        self.company_id = company_id
+        self.plan_type = plan_type
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+class ClusteringPool:
+    """Pre-warmed clustering workers behind a priority admission queue"""
+
+    def __init__(self, max_workers: int = CLUSTERING_PROCESS_WORKERS, max_queued: int = CLUSTERING_MAX_QUEUED):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.slots = max(1, max_workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._waiting: List[tuple] = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._running_by_company: Counter = Counter()
+        self._running_by_plan: Counter = Counter()
+        self._normalizer_metrics: Dict[int, Dict[str, Any]] = {}  # Latest report per worker process
+        self._metrics = {
+            "analyses": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+            "total_run_ms": 0.0,
+            "max_run_ms": 0.0
+        }
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self._executor is None and self.max_workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        """Spawn and warm every worker so the first analyses don't pay for it"""
+        executor = self._get_executor()
+        if executor is None:
+            await asyncio.to_thread(warm_clustering_engine)
+            return
+
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(loop.run_in_executor(executor, _ping) for _ in range(self.max_workers)))
+        logger.info(f"Clustering pool ready with {len(set(pids))} worker processes")
+
+    def shutdown(self) -> None:
+        """Stop worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+    
+    def progress_queue(self):
+        """A queue workers can report stage progress on (proxied across processes when pooled)"""
+        if self.max_workers <= 0:
+            return queue.Queue()
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager.Queue()
+
+    @staticmethod
+    def _plan_limits(plan_type: str) -> Dict[str, Any]:
+        return CLUSTERING_LIMITS.get(plan_type, CLUSTERING_LIMITS[DEFAULT_LIMITS_PLAN])
+
+    def _can_start(self, ticket: _Ticket) -> bool:
+        limits = self._plan_limits(ticket.plan_type)
+        return (
+            self._running_by_company[ticket.company_id] < limits["max_concurrent_per_company"]
+            and self._running_by_plan[ticket.plan_type] < limits["max_concurrent_per_plan"]
+        )
+
+    def _dispatch(self) -> None:
+        """Admit waiting analyses in priority order while slots are free"""
+        skipped = []
+        while self._waiting and self._running < self.slots:
+            entry = heapq.heappop(self._waiting)
+            ticket = entry[2]
+            if ticket.future.done():
+                continue  # Caller went away
+            if not self._can_start(ticket):
+                skipped.append(entry)
+                continue
+
+            self._running += 1
+            self._running_by_company[ticket.company_id] += 1
+            self._running_by_plan[ticket.plan_type] += 1
+            ticket.future.set_result(None)
+
+        for entry in skipped:
+            heapq.heappush(self._waiting, entry)
+
+    def _release(self, ticket: _Ticket) -> None:
+        self._running -= 1
+        self._running_by_company[ticket.company_id] -= 1
+        self._running_by_plan[ticket.plan_type] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admission(self, company_id: str, plan_type: str):
+        """Wait for a slot within the company's and plan's concurrency caps"""
+        if len(self._waiting) >= self.max_queued:
+            self._metrics["rejected"] += 1
+            raise ClusteringCapacityError("Clustering queue is full")
+
+        ticket = _Ticket(company_id, plan_type, asyncio.get_running_loop().create_future())
+        priority = 0 if self._plan_limits(plan_type).get("priority_processing") else 1
+        heapq.heappush(self._waiting, (priority, next(self._sequence), ticket))
+        self._dispatch()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                self._release(ticket)
+            else:
+                # Give up the queue place now, not when _dispatch reaches the ticket
+                self._waiting = [entry for entry in self._waiting if entry[2] is not ticket]
+                heapq.heapify(self._waiting)
+            raise
+
+        wait_ms = (time.perf_counter() - ticket.queued_at) * 1000
+        self._metrics["total_wait_ms"] += wait_ms
+        self._metrics["max_wait_ms"] = max(self._metrics["max_wait_ms"], wait_ms)
+
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    async def run(
+        self,
+        keywords: List[str],
+        search_volumes: Optional[List[int]] = None,
+        difficulties: Optional[List[float]] = None,
+        company_id: Optional[str] = None,
+        plan_type: Optional[str] = None,
+        engine: str = "standard",
+        progress_queue=None
+    ) -> Dict[str, Any]:
+        """
+        Cluster keywords on a worker and return the compact analysis.
+        Pass a queue from ``progress_queue()`` to receive stage metrics as they finish.
+        """
+        async with self.admission(company_id or "", plan_type or DEFAULT_LIMITS_PLAN):
+            started = time.perf_counter()
+            executor = None
+            try:
+                executor = self._get_executor()
+                if executor is None:
+                    packed = await asyncio.to_thread(cluster_keywords_compact, keywords, search_volumes, difficulties, engine, progress_queue)
+                else:
+                    loop = asyncio.get_running_loop()
+                    packed = await loop.run_in_executor(executor, cluster_keywords_compact, keywords, search_volumes, difficulties, engine, progress_queue)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM); start a fresh pool for the next analysis
+                logger.error("Clustering worker process died; recreating pool")
+                if executor is not None:
+                    if self._executor is executor:
+                        self._executor = None
+                    # Stop the broken pool's management thread and any surviving workers
+                    executor.shutdown(wait=False, cancel_futures=True)
+                self._metrics["failed"] += 1
+                raise
+            except Exception:
+                self._metrics["failed"] += 1
+                raise
+
+            run_ms = (time.perf_counter() - started) * 1000
+            normalizer_metrics = packed.pop("normalizer_metrics", None)
+            if normalizer_metrics:
+                self._normalizer_metrics[normalizer_metrics.pop("pid")] = normalizer_metrics
+            self._metrics["analyses"] += 1
+            self._metrics["total_run_ms"] += run_ms
+            self._metrics["max_run_ms"] = max(self._metrics["max_run_ms"], run_ms)
+            return packed
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue and latency metrics for this API worker"""
+        analyses = self._metrics["analyses"]
+        normalizer_hits = sum(metrics["hits"] for metrics in self._normalizer_metrics.values())
+        normalizer_lookups = normalizer_hits + sum(metrics["misses"] for metrics in self._normalizer_metrics.values())
+        return {
+            **self._metrics,
+            "workers": self.max_workers,
+            "running": self._running,
+            "waiting": sum(1 for _, _, ticket in self._waiting if not ticket.future.done()),
+            "running_by_plan": {plan: count for plan, count in self._running_by_plan.items() if count},
+            "avg_wait_ms": round(self._metrics["total_wait_ms"] / analyses, 2) if analyses else 0.0,
+            "avg_run_ms": round(self._metrics["total_run_ms"] / analyses, 2) if analyses else 0.0,
+            "text_normalizer": {
+                "workers_reporting": len(self._normalizer_metrics),
+                "hits": normalizer_hits,
+                "lookups": normalizer_lookups,
+                "hit_rate": round(normalizer_hits / normalizer_lookups, 4) if normalizer_lookups else 0.0,
+                "cached_tokens": sum(metrics["size"] for metrics in self._normalizer_metrics.values())
+            }
+        }
+
+# Singleton instance
+_clustering_pool = None
+
+def get_clustering_pool() -> ClusteringPool:
+    """Get or create clustering pool instance"""
+    global _clustering_pool
+    if _clustering_pool is None:
+        _clustering_pool = ClusteringPool()
+    return _clustering_pool
+
+async def start_clustering_pool() -> None:
+    """Create and warm the clustering pool (run as a background task after startup)"""
+    try:
+        await get_clustering_pool().start()
+    except Exception as e:
+        logger.error(f"Clustering pool warm-up failed: {e}")
+
+def shutdown_clustering_pool() -> None:
+    """Stop clustering worker processes"""
+    if _clustering_pool is not None:
+        _clustering_pool.shutdown()
@@ -1,41 +1,41 @@
 """
 Keyword Clustering Engine for Use This Search
 Premium feature for annual subscribers only
+
+scikit-learn, NLTK and spaCy are imported where they are used rather than at
+module load, so importing this module (and the API routes) stays cheap; the
+first engine construction or a warm-up task pays for them instead.
 """
 
 import numpy as np
 import asyncio
-from typing import List, Dict, Optional, Tuple
+import logging
+import os
+import threading
+import time
+from typing import List, Dict, Optional, Tuple, Any, Callable
 from datetime import datetime
 import json
 import re
 from collections import defaultdict, Counter
-from dataclasses import dataclass
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans, DBSCAN
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.decomposition import PCA
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-import spacy
+from dataclasses import dataclass, field
+from scipy import sparse
+
+from services.near_duplicates import NEAR_DUPLICATE_COLLAPSE, collapse_near_duplicates
+from services.text_normalizer import get_text_normalizer
+
+logger = logging.getLogger(__name__)
+
+# Label tables for the compact (cross-process) analysis encoding
+INTENT_LABELS = ('informational', 'commercial', 'transactional', 'navigational')
+STAGE_LABELS = ('awareness', 'consideration', 'decision')
+
+# Stages reported while an analysis runs, in order
+PIPELINE_STAGES = ('preprocess', 'dedup', 'vectorize', 'select_k', 'fit', 'summarize', 'gaps', 'pillars')
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-    
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-    
-try:
-    nltk.data.find('corpora/wordnet')
-except LookupError:
-    nltk.download('wordnet')
+# Cluster-count selection: candidate k values in the coarse pass, rows used for silhouette
+COARSE_K_STEPS = 5
+SILHOUETTE_SAMPLE_SIZE = 1000
 
 @dataclass
 class KeywordCluster:
@@ -63,24 +63,181 @@ class ClusterAnalysis:
     content_gaps: List[Dict]
     pillar_opportunities: List[Dict]
     processing_time: float
+    stage_metrics: List[Dict] = field(default_factory=list)
+    selected_k: Optional[int] = None
+    selection_score: Optional[float] = None
+    state: Optional[Dict[str, Any]] = None  # Fitted vocabulary/IDF/centroids for incremental updates
+
+def _matrix_nbytes(matrix) -> int:
+    """Memory held by a dense or CSR matrix"""
+    if sparse.issparse(matrix):
+        return int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+    return int(matrix.nbytes)
+
+def priority_scores(volume_totals, difficulty_averages, counts):
+    """Priority = (Search Volume) / (Difficulty + 1) * (Number of Keywords), on a 0-100 scale"""
+    return np.minimum(100.0, volume_totals / (difficulty_averages + 1) * counts / 100)
+
+def _usable_term_mask(terms: np.ndarray) -> np.ndarray:
+    """Vocabulary columns usable in cluster names (unigrams longer than two characters)"""
+    return np.fromiter((" " not in term and len(term) > 2 for term in terms), dtype=bool, count=len(terms))
+
+def _stage_metric(stage: str, started: float, memory_bytes: int, **extra) -> Dict[str, Any]:
+    return {
+        "stage": stage,
+        "seconds": round(time.perf_counter() - started, 4),
+        "memory_bytes": memory_bytes,
+        **extra
+    }
+
+class StageRecorder:
+    """
+    Collects per-stage metrics of one analysis. Each stage is timed from the
+    end of the previous one, and reported to ``progress`` as soon as it ends.
+    """
+    
+    def __init__(self, progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.metrics: List[Dict[str, Any]] = []
+        self.progress = progress
+        self._started = time.perf_counter()
+    
+    def record(self, stage: str, memory_bytes: int, **extra) -> None:
+        metric = _stage_metric(stage, self._started, memory_bytes, **extra)
+        self.metrics.append(metric)
+        if self.progress is not None:
+            self.progress(metric)
+        self._started = time.perf_counter()
+
+class PatternMatcher:
+    """
+    Substring matcher for several category tables of patterns, compiled into
+    one regex. Matching all keywords is a single scan over the joined text.
+    
+    A keyword scores one point per distinct pattern it contains, per category,
+    which is the same rule as a plain ``pattern in keyword`` loop.
+    """
+    
+    def __init__(self, tables: Dict[str, Dict[str, List[str]]]):
+        self.patterns = sorted(
+            {pattern for table in tables.values() for patterns in table.values() for pattern in patterns},
+            key=lambda pattern: (-len(pattern), pattern)
+        )
+        self._index = {pattern: i for i, pattern in enumerate(self.patterns)}
+        
+        # Zero-width lookahead so overlapping matches at every position are reported.
+        # Patterns are folded into a trie so each position costs one walk down shared prefixes.
+        self._regex = re.compile("(?=(" + self._trie_regex(self.patterns) + "))")
+        
+        # A match also credits shorter patterns that are its prefix (the regex reports only the longest)
+        credits = [
+            [self._index[other] for other in self.patterns if pattern.startswith(other)]
+            for pattern in self.patterns
+        ]
+        self._credit_counts = np.array([len(c) for c in credits], dtype=np.int64)
+        self._credit_offsets = np.concatenate(([0], np.cumsum(self._credit_counts)))
+        self._credit_ids = np.array([i for c in credits for i in c], dtype=np.int64)
+        
+        self.categories: Dict[str, Tuple[str, ...]] = {}
+        self._weights: Dict[str, np.ndarray] = {}
+        for name, table in tables.items():
+            self.categories[name] = tuple(table)
+            weights = np.zeros((len(self.patterns), len(table)), dtype=np.int32)
+            for column, patterns in enumerate(table.values()):
+                for pattern in patterns:
+                    weights[self._index[pattern], column] = 1
+            self._weights[name] = weights
+    
+    @staticmethod
+    def _trie_regex(patterns: List[str]) -> str:
+        """Regex source for the patterns as a prefix trie, preferring the longest match"""
+        trie: Dict[str, Any] = {}
+        for pattern in patterns:
+            node = trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        
+        def build(node: Dict[str, Any]) -> str:
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ""
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            if "" in node:
+                # Pattern ends here too: try the longer continuations first
+                return "(?:" + body + ")?"
+            return body
+        
+        return build(trie)
+    
+    def match(self, texts: List[str]) -> sparse.csr_matrix:
+        """Keyword x pattern incidence matrix (1 where the pattern occurs in the keyword)"""
+        if not texts:
+            return sparse.csr_matrix((0, len(self.patterns)), dtype=np.int32)
+        
+        lengths = np.fromiter((len(text) + 1 for text in texts), dtype=np.int64, count=len(texts))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        
+        index = self._index
+        matches = [(match.start(), index[match.group(1)]) for match in self._regex.finditer("\n".join(texts))]
+        positions = np.array([position for position, _ in matches], dtype=np.int64)
+        matched = np.array([pattern_id for _, pattern_id in matches], dtype=np.int64)
+        
+        # Expand each match into the patterns it credits
+        counts = self._credit_counts[matched]
+        offsets = np.repeat(self._credit_offsets[matched] - np.cumsum(counts) + counts, counts)
+        pattern_ids = self._credit_ids[offsets + np.arange(offsets.size)]
+        
+        rows = np.searchsorted(starts, np.repeat(positions, counts), side="right") - 1
+        incidence = sparse.csr_matrix(
+            (np.ones(rows.size, dtype=np.int32), (rows, pattern_ids)),
+            shape=(len(texts), len(self.patterns))
+        )
+        incidence.data[:] = 1  # A pattern counts once per keyword
+        return incidence
+    
+    def classify(self, incidence: sparse.csr_matrix, table: str, default: int = 0) -> np.ndarray:
+        """Highest-scoring category index per keyword (ties go to the earlier category)"""
+        scores = np.asarray(incidence @ self._weights[table])
+        codes = scores.argmax(axis=1).astype(np.uint8)
+        codes[scores.max(axis=1) == 0] = default
+        return codes
 
 class KeywordClusteringEngine:
-    """Advanced keyword clustering with semantic analysis and intent detection"""
+    """
+    Advanced keyword clustering with semantic analysis and intent detection.
+    
+    Holds only immutable, shareable resources (the process-wide text
+    normalizer, pattern tables, spaCy model); per-analysis state such as the
+    fitted vectorizer is kept local to each call so one instance can serve
+    concurrent analyses.
+    """
     
     def __init__(self):
-        self.stop_words = set(stopwords.words('english'))
-        self.lemmatizer = WordNetLemmatizer()
-        self.vectorizer = None
+        self.normalizer = get_text_normalizer()
+        self.stop_words = self.normalizer.stop_words
+        self.lemmatizer = self.normalizer.lemmatizer
         self.intent_patterns = self._load_intent_patterns()
         self.buyer_journey_patterns = self._load_buyer_journey_patterns()
+        self.pattern_matcher = PatternMatcher({
+            "intent": self.intent_patterns,
+            "stage": self.buyer_journey_patterns
+        })
         
         # Try to load spaCy model, fallback to basic processing if not available
         try:
+            import spacy
             self.nlp = spacy.load("en_core_web_sm")
-        except OSError:
-            print("Warning: spaCy model 'en_core_web_sm' not found. Using basic processing.")
+        except (ImportError, OSError):
+            logger.warning("spaCy model 'en_core_web_sm' not found. Using basic processing.")
             self.nlp = None
     
+    def warm_up(self) -> None:
+        """Force NLTK's lazily loaded corpora into memory and memoize the pattern vocabulary"""
+        self.extract_features(["keyword clustering warm up", "warming up keywords"])
+        patterns = [pattern for table in (self.intent_patterns, self.buyer_journey_patterns)
+                    for table_patterns in table.values() for pattern in table_patterns]
+        self.normalizer.lemmas(self.normalizer.tokenize(patterns))
+    
     def _load_intent_patterns(self) -> Dict[str, List[str]]:
         """Load search intent classification patterns"""
         return {
@@ -124,9 +281,18 @@ class KeywordClusteringEngine:
     
     def preprocess_keywords(self, keywords: List[str]) -> List[str]:
         """Clean and preprocess keywords for clustering"""
-        processed = []
-        
-        for keyword in keywords:
+        return self.preprocess_keywords_indexed(keywords)[0]
+    
+    @staticmethod
+    def preprocess_keywords_indexed(keywords: List[str]) -> Tuple[List[str], np.ndarray]:
+        """
+        Clean keywords and drop duplicates, keeping first occurrences in input order.
+        Also returns each kept keyword's index in the input so per-keyword metrics
+        (search volume, difficulty) stay aligned.
+        """
+        processed: Dict[str, int] = {}
+        
+        for source_index, keyword in enumerate(keywords):
             # Convert to lowercase
             keyword = keyword.lower().strip()
             
@@ -136,144 +302,209 @@ class KeywordClusteringEngine:
             # Remove extra whitespace
             keyword = ' '.join(keyword.split())
             
-            if keyword and len(keyword) > 2:
-                processed.append(keyword)
+            if keyword and len(keyword) > 2 and keyword not in processed:
+                processed[keyword] = source_index
         
-        return list(set(processed))  # Remove duplicates
+        return list(processed), np.fromiter(processed.values(), dtype=np.int64, count=len(processed))
     
-    def extract_features(self, keywords: List[str]) -> np.ndarray:
-        """Extract TF-IDF features from keywords"""
-        
-        # Create expanded text for each keyword by including variations
-        expanded_keywords = []
-        for keyword in keywords:
-            # Add the original keyword
-            expanded_text = keyword
-            
-            # Add tokenized version
-            tokens = word_tokenize(keyword)
-            expanded_text += " " + " ".join([
-                self.lemmatizer.lemmatize(token.lower()) 
-                for token in tokens 
-                if token.lower() not in self.stop_words and token.isalpha()
-            ])
-            
-            expanded_keywords.append(expanded_text)
-        
-        # Use TF-IDF vectorization
-        self.vectorizer = TfidfVectorizer(
+    def extract_features(self, keywords: List[str]) -> sparse.csr_matrix:
+        """Extract TF-IDF features from keywords as an L2-normalised CSR matrix"""
+        return self.vectorize_keywords(keywords)[0]
+    
+    # TF-IDF settings shared by fitting and incremental transforms
+    NGRAM_RANGE = (1, 3)
+    
+    def _expand_keywords(self, keywords: List[str], tokens: Optional[List[List[str]]] = None) -> List[str]:
+        """Keyword text plus its lemmatized non-stopword tokens"""
+        return self.normalizer.expand(keywords, tokens)
+    
+    def vectorize_keywords(
+        self,
+        keywords: List[str],
+        tokens: Optional[List[List[str]]] = None
+    ) -> Tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+        """
+        Fit TF-IDF on the keywords. Returns the features plus the vocabulary term
+        and IDF weight of each column. Pass ``tokens`` (one list per keyword) to
+        reuse an existing tokenization.
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
+        expanded_keywords = self._expand_keywords(keywords, tokens)
+        
+        # Use TF-IDF vectorization (fitted per call, never stored on the shared engine)
+        vectorizer = TfidfVectorizer(
             max_features=1000,
-            ngram_range=(1, 3),
+            ngram_range=self.NGRAM_RANGE,
             stop_words='english',
             lowercase=True,
             min_df=1,
-            max_df=0.95
+            max_df=0.95,
+            dtype=np.float32
         )
         
-        feature_matrix = self.vectorizer.fit_transform(expanded_keywords)
-        return feature_matrix.toarray()
+        # Rows are unit length, so euclidean k-means on them behaves like cosine
+        # (spherical) k-means; sklearn's KMeans runs directly on CSR input.
+        features = vectorizer.fit_transform(expanded_keywords).tocsr()
+        return features, vectorizer.get_feature_names_out(), vectorizer.idf_.astype(np.float32)
     
-    def determine_optimal_clusters(self, features: np.ndarray, max_clusters: int = 15) -> int:
-        """Determine optimal number of clusters using elbow method"""
-        
-        if len(features) < 3:
-            return 1
-        
-        max_k = min(max_clusters, len(features) - 1)
-        
-        if max_k < 2:
-            return 1
-        
-        inertias = []
-        k_range = range(2, max_k + 1)
-        
-        for k in k_range:
-            kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-            kmeans.fit(features)
-            inertias.append(kmeans.inertia_)
-        
-        # Find elbow point
-        if len(inertias) < 2:
-            return 2
-        
-        # Simple elbow detection
-        diffs = [inertias[i] - inertias[i+1] for i in range(len(inertias)-1)]
-        if not diffs:
-            return 2
+    def transform_keywords(
+        self,
+        keywords: List[str],
+        terms: List[str],
+        idf: np.ndarray,
+        tokens: Optional[List[List[str]]] = None
+    ) -> sparse.csr_matrix:
+        """Project keywords into a previously fitted TF-IDF space (same result as the fitted vectorizer)"""
+        from sklearn.feature_extraction.text import CountVectorizer
+        from sklearn.preprocessing import normalize
+        
+        counter = CountVectorizer(
+            vocabulary={term: i for i, term in enumerate(terms)},
+            ngram_range=self.NGRAM_RANGE,
+            stop_words='english',
+            lowercase=True,
+            dtype=np.float32
+        )
+        counts = counter.transform(self._expand_keywords(keywords, tokens))
+        return normalize(counts.multiply(idf).tocsr(), norm="l2")
+    
+    def build_clustering_state(
+        self,
+        features: sparse.csr_matrix,
+        terms: np.ndarray,
+        idf: np.ndarray,
+        labels: np.ndarray,
+        weights: Optional[np.ndarray] = None
+    ) -> Dict[str, Any]:
+        """
+        Centroid means and fit quality, kept so keywords can be added later without
+        refitting. ``weights`` is the number of keywords each row stands for.
+        """
+        from sklearn.preprocessing import normalize
+        
+        n_rows = features.shape[0]
+        if weights is None:
+            weights = np.ones(n_rows, dtype=np.float32)
+        n_clusters = int(labels.max()) + 1
+        counts = np.bincount(labels, weights=weights, minlength=n_clusters)
+        members = sparse.csr_matrix(
+            (weights.astype(np.float32), (labels, np.arange(n_rows))),
+            shape=(n_clusters, n_rows)
+        )
+        centroids = (members @ features).toarray() / np.maximum(counts, 1)[:, None]
         
-        elbow_idx = diffs.index(max(diffs))
-        optimal_k = k_range[elbow_idx]
+        # Mean cosine similarity of keywords to their own centroid - the drift baseline
+        similarities = np.asarray(features @ normalize(centroids).T)
+        own_similarity = similarities[np.arange(n_rows), labels]
         
-        return optimal_k
+        return {
+            "terms": [str(term) for term in terms],
+            "idf": idf.astype(np.float32),
+            "centroids": centroids.astype(np.float32),
+            "counts": counts.round().astype(np.int64),
+            "baseline_similarity": float(np.average(own_similarity, weights=weights)),
+            "fitted_keywords": int(round(weights.sum()))
+        }
+    
+    def select_clusters(
+        self,
+        features: sparse.csr_matrix,
+        max_clusters: int = 15,
+        weights: Optional[np.ndarray] = None
+    ) -> Tuple[int, np.ndarray, Optional[float]]:
+        """
+        Pick the cluster count by cosine silhouette with a coarse-to-fine search over k.
+        
+        Each candidate is a single k-means++ fit (rows weighted by ``weights``, if
+        given); silhouette is computed on a subsample. The winning candidate's
+        labels are returned directly, so no refit is needed. Returns (k, labels,
+        silhouette score).
+        """
+        from sklearn.cluster import KMeans
+        from sklearn.metrics import silhouette_score
+        
+        n_samples = features.shape[0]
+        max_k = min(max_clusters, n_samples - 1)
+        if n_samples < 3 or max_k < 2:
+            return 1, np.zeros(n_samples, dtype=np.int32), None
+        
+        sample_size = min(n_samples, SILHOUETTE_SAMPLE_SIZE)
+        candidates: Dict[int, Tuple[float, np.ndarray]] = {}
+        
+        def evaluate(k: int) -> float:
+            if k not in candidates:
+                labels = KMeans(n_clusters=k, random_state=42, n_init=1).fit_predict(features, sample_weight=weights)
+                if len(np.unique(labels)) < 2:
+                    score = -1.0
+                else:
+                    score = float(silhouette_score(
+                        features, labels, metric="cosine", sample_size=sample_size, random_state=42
+                    ))
+                candidates[k] = (score, labels)
+            return candidates[k][0]
+        
+        # Coarse pass over an evenly spaced grid of k
+        grid = sorted(set(np.linspace(2, max_k, num=min(COARSE_K_STEPS, max_k - 1)).round().astype(int).tolist()))
+        for k in grid:
+            evaluate(k)
+        
+        # Fine pass: walk from the best coarse k while neighbours improve
+        best_k = max(candidates, key=lambda k: candidates[k][0])
+        for step in (-1, 1):
+            k = best_k + step
+            while 2 <= k <= max_k and k not in candidates:
+                if evaluate(k) <= candidates[k - step][0]:
+                    break
+                k += step
+        
+        best_k = max(candidates, key=lambda k: candidates[k][0])
+        best_score, best_labels = candidates[best_k]
+        return best_k, best_labels, best_score
+    
+    def determine_optimal_clusters(self, features: sparse.csr_matrix, max_clusters: int = 15) -> int:
+        """Determine optimal number of clusters"""
+        return self.select_clusters(features, max_clusters)[0]
+    
+    def collapse_keywords(
+        self,
+        keywords: List[str],
+        tokens: List[List[str]],
+        volumes: np.ndarray
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Near-duplicate groups of the keywords: each group's representative index
+        and each keyword's group number. The group numbers are None when nothing
+        was collapsed (or collapsing is disabled), i.e. every keyword is its own
+        representative.
+        """
+        if NEAR_DUPLICATE_COLLAPSE:
+            representatives, groups = collapse_near_duplicates(keywords, tokens, volumes)
+            # Keep at least three rows so there is still a choice of cluster count
+            if 3 <= len(representatives) < len(keywords):
+                return representatives, groups
+        return np.arange(len(keywords)), None
+    
+    def classify_keywords(self, keywords: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Classify search intent and buyer journey stage for all keywords at once.
+        Returns uint8 code arrays indexing INTENT_LABELS and STAGE_LABELS.
+        """
+        incidence = self.pattern_matcher.match([keyword.lower() for keyword in keywords])
+        intents = self.pattern_matcher.classify(incidence, "intent", default=INTENT_LABELS.index('informational'))
+        stages = self.pattern_matcher.classify(incidence, "stage", default=STAGE_LABELS.index('awareness'))
+        return intents, stages
     
     def classify_search_intent(self, keyword: str) -> str:
         """Classify keyword search intent"""
-        keyword_lower = keyword.lower()
-        
-        intent_scores = defaultdict(int)
-        
-        for intent, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if pattern in keyword_lower:
-                    intent_scores[intent] += 1
-        
-        if not intent_scores:
-            return 'informational'  # Default
-        
-        return max(intent_scores.items(), key=lambda x: x[1])[0]
+        return INTENT_LABELS[self.classify_keywords([keyword])[0][0]]
     
     def classify_buyer_journey_stage(self, keyword: str) -> str:
         """Classify buyer journey stage"""
-        keyword_lower = keyword.lower()
-        
-        stage_scores = defaultdict(int)
-        
-        for stage, patterns in self.buyer_journey_patterns.items():
-            for pattern in patterns:
-                if pattern in keyword_lower:
-                    stage_scores[stage] += 1
-        
-        if not stage_scores:
-            return 'awareness'  # Default
-        
-        return max(stage_scores.items(), key=lambda x: x[1])[0]
+        return STAGE_LABELS[self.classify_keywords([keyword])[1][0]]
     
-    def generate_cluster_name(self, keywords: List[str]) -> str:
-        """Generate meaningful cluster name from keywords"""
-        
-        # Extract common terms
-        all_words = []
-        for keyword in keywords:
-            words = keyword.lower().split()
-            all_words.extend([word for word in words if word not in self.stop_words and len(word) > 2])
-        
-        # Find most common terms
-        word_counts = Counter(all_words)
-        
-        if not word_counts:
-            return "Cluster"
-        
-        # Get top 2-3 most common terms
-        top_words = [word for word, count in word_counts.most_common(3)]
-        
-        # Create cluster name
-        if len(top_words) >= 2:
-            return f"{top_words[0].title()} {top_words[1].title()}"
-        else:
-            return top_words[0].title()
-    
-    def generate_content_suggestions(self, cluster_keywords: List[str], intent: str) -> List[str]:
-        """Generate content suggestions for a cluster"""
-        
-        suggestions = []
-        
-        # Get primary topic from most common words
-        all_words = []
-        for keyword in cluster_keywords:
-            all_words.extend(keyword.lower().split())
-        
-        common_words = Counter(all_words).most_common(3)
-        primary_topic = common_words[0][0] if common_words else "topic"
+    def content_suggestions_for_topic(self, primary_topic: str, intent: str) -> List[str]:
+        """Content title suggestions for a cluster's main topic word"""
         
         if intent == 'informational':
             suggestions = [
@@ -309,46 +540,34 @@ class KeywordClusteringEngine:
         
         return suggestions[:3]  # Return top 3 suggestions
     
-    def calculate_priority_score(self, keywords: List[str], search_volumes: List[int], difficulties: List[float]) -> float:
-        """Calculate priority score for a cluster"""
-        
-        if not keywords:
-            return 0.0
-        
-        # Default values if no data provided
-        if not search_volumes:
-            search_volumes = [100] * len(keywords)
-        if not difficulties:
-            difficulties = [50.0] * len(keywords)
-        
-        # Normalize lengths
-        min_len = min(len(keywords), len(search_volumes), len(difficulties))
-        keywords = keywords[:min_len]
-        search_volumes = search_volumes[:min_len]
-        difficulties = difficulties[:min_len]
-        
-        # Calculate weighted score
-        total_volume = sum(search_volumes)
-        avg_difficulty = sum(difficulties) / len(difficulties) if difficulties else 50.0
-        
-        # Priority = (Search Volume) / (Difficulty + 1) * (Number of Keywords)
-        priority = (total_volume / (avg_difficulty + 1)) * len(keywords)
-        
-        # Normalize to 0-100 scale
-        return min(100.0, priority / 100)
-    
     async def cluster_keywords(
         self, 
         keywords: List[str],
         search_volumes: Optional[List[int]] = None,
         difficulties: Optional[List[float]] = None
     ) -> ClusterAnalysis:
-        """Main clustering function"""
+        """Main clustering function (runs inline; prefer cluster_keywords_async)"""
+        return self.cluster_keywords_sync(keywords, search_volumes, difficulties)
+    
+    def cluster_keywords_sync(
+        self, 
+        keywords: List[str],
+        search_volumes: Optional[List[int]] = None,
+        difficulties: Optional[List[float]] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> ClusterAnalysis:
+        """
+        CPU-bound clustering pipeline. ``progress`` is called with each stage's
+        metrics as the stage finishes (stages are listed in PIPELINE_STAGES).
+        """
         
         start_time = datetime.now()
+        stages = StageRecorder(progress)
         
-        # Preprocess keywords
-        processed_keywords = self.preprocess_keywords(keywords)
+        # Preprocess keywords (each keyword is tokenized once, here)
+        processed_keywords, source_indices = self.preprocess_keywords_indexed(keywords)
+        tokens = self.normalizer.tokenize(processed_keywords)
+        stages.record("preprocess", sum(len(keyword) for keyword in processed_keywords))
         
         if len(processed_keywords) < 2:
             # Return single cluster if too few keywords
@@ -374,72 +593,54 @@ class KeywordClusteringEngine:
                 unclustered_keywords=[],
                 content_gaps=[],
                 pillar_opportunities=[],
-                processing_time=(datetime.now() - start_time).total_seconds()
+                processing_time=(datetime.now() - start_time).total_seconds(),
+                stage_metrics=stages.metrics
             )
         
-        # Extract features
-        features = self.extract_features(processed_keywords)
+        volumes = self._aligned_metric(search_volumes, source_indices, 100, np.int64)
         
-        # Determine optimal cluster count
-        optimal_clusters = self.determine_optimal_clusters(features)
+        # Collapse near-duplicates: each group is vectorized and clustered once, weighted by its size
+        representatives, groups = self.collapse_keywords(processed_keywords, tokens, volumes)
+        weights = None if groups is None else np.bincount(groups).astype(np.float32)
+        stages.record(
+            "dedup", 0 if groups is None else int(groups.nbytes),
+            groups=len(representatives), collapsed=len(processed_keywords) - len(representatives)
+        )
         
-        # Perform clustering
-        kmeans = KMeans(n_clusters=optimal_clusters, random_state=42, n_init=10)
-        cluster_labels = kmeans.fit_predict(features)
+        # Extract features (kept sparse)
+        features, terms, idf = self.vectorize_keywords(
+            [processed_keywords[i] for i in representatives], [tokens[i] for i in representatives]
+        )
+        stages.record(
+            "vectorize", _matrix_nbytes(features),
+            shape=list(features.shape),
+            dense_equivalent_bytes=int(features.shape[0] * features.shape[1] * features.dtype.itemsize)
+        )
         
-        # Group keywords by cluster
-        clustered_keywords = defaultdict(list)
-        for i, label in enumerate(cluster_labels):
-            clustered_keywords[label].append(processed_keywords[i])
+        # Choose the cluster count; the winning fit's labels are the clustering
+        selected_k, cluster_labels, selection_score = self.select_clusters(features, weights=weights)
+        stages.record("select_k", int(cluster_labels.nbytes), selected_k=selected_k)
         
-        # Create cluster objects
-        clusters = []
-        for cluster_id, cluster_keywords in clustered_keywords.items():
-            
-            # Get primary keyword (most central/representative)
-            primary_keyword = max(cluster_keywords, key=len) if cluster_keywords else "keywords"
-            
-            # Classify intent and journey stage
-            intent_votes = [self.classify_search_intent(kw) for kw in cluster_keywords]
-            search_intent = Counter(intent_votes).most_common(1)[0][0]
-            
-            journey_votes = [self.classify_buyer_journey_stage(kw) for kw in cluster_keywords]
-            buyer_journey_stage = Counter(journey_votes).most_common(1)[0][0]
-            
-            # Generate cluster name and content suggestions
-            cluster_name = self.generate_cluster_name(cluster_keywords)
-            content_suggestions = self.generate_content_suggestions(cluster_keywords, search_intent)
-            
-            # Calculate metrics
-            cluster_indices = [i for i, label in enumerate(cluster_labels) if label == cluster_id]
-            cluster_volumes = [search_volumes[i] if search_volumes and i < len(search_volumes) else 100 for i in cluster_indices]
-            cluster_difficulties = [difficulties[i] if difficulties and i < len(difficulties) else 50.0 for i in cluster_indices]
-            
-            priority_score = self.calculate_priority_score(cluster_keywords, cluster_volumes, cluster_difficulties)
-            
-            cluster = KeywordCluster(
-                id=f"cluster_{cluster_id + 1}",
-                name=cluster_name,
-                primary_keyword=primary_keyword,
-                keywords=sorted(cluster_keywords),
-                search_intent=search_intent,
-                topic_theme=cluster_name.lower(),
-                search_volume_total=sum(cluster_volumes),
-                difficulty_average=sum(cluster_difficulties) / len(cluster_difficulties) if cluster_difficulties else 0,
-                content_suggestions=content_suggestions,
-                buyer_journey_stage=buyer_journey_stage,
-                priority_score=priority_score,
-                created_at=datetime.now()
-            )
-            
-            clusters.append(cluster)
+        # Centroids and fit quality, kept for incremental updates
+        state = self.build_clustering_state(features, terms, idf, cluster_labels, weights)
+        stages.record("fit", int(state["centroids"].nbytes))
         
-        # Sort clusters by priority score
-        clusters.sort(key=lambda x: x.priority_score, reverse=True)
+        # Expand the groups back out: every keyword takes its representative's cluster
+        if groups is not None:
+            cluster_labels = cluster_labels[groups]
+        
+        # Per-cluster names, votes and metrics from the label array
+        clusters = self.summarize_clusters(
+            processed_keywords, tokens, state["centroids"], terms, cluster_labels, volumes,
+            self._aligned_metric(difficulties, source_indices, 50.0, np.float64)
+        )
+        stages.record("summarize", 0)
         
         # Generate content gap analysis and pillar opportunities
         content_gaps = self._analyze_content_gaps(clusters)
+        stages.record("gaps", 0)
         pillar_opportunities = self._identify_pillar_opportunities(clusters)
+        stages.record("pillars", 0)
         
         processing_time = (datetime.now() - start_time).total_seconds()
         
@@ -450,9 +651,124 @@ class KeywordClusteringEngine:
             unclustered_keywords=[],  # All keywords are clustered with KMeans
             content_gaps=content_gaps,
             pillar_opportunities=pillar_opportunities,
-            processing_time=processing_time
+            processing_time=processing_time,
+            stage_metrics=stages.metrics,
+            selected_k=selected_k,
+            selection_score=selection_score,
+            state=state
         )
     
+    @staticmethod
+    def _aligned_metric(values: Optional[List[float]], source_indices: np.ndarray, default: float, dtype) -> np.ndarray:
+        """Per-keyword metric for the kept keywords, using the default where none was given"""
+        aligned = np.full(len(source_indices), default, dtype=dtype)
+        if values:
+            provided = source_indices < len(values)
+            aligned[provided] = np.asarray(values, dtype=dtype)[source_indices[provided]]
+        return aligned
+    
+    def summarize_clusters(
+        self,
+        keywords: List[str],
+        tokens: List[List[str]],
+        centroids: np.ndarray,
+        terms: np.ndarray,
+        labels: np.ndarray,
+        volumes: np.ndarray,
+        difficulties: np.ndarray
+    ) -> List[KeywordCluster]:
+        """Build cluster objects from the label array, sorted by priority score"""
+        n_keywords = len(keywords)
+        n_clusters = int(labels.max()) + 1
+        
+        # Metrics
+        counts = np.bincount(labels, minlength=n_clusters)
+        volume_totals = np.bincount(labels, weights=volumes, minlength=n_clusters)
+        difficulty_totals = np.bincount(labels, weights=difficulties, minlength=n_clusters)
+        difficulty_averages = difficulty_totals / np.maximum(counts, 1)
+        cluster_priorities = priority_scores(volume_totals, difficulty_averages, counts)
+        
+        # Intent / journey votes
+        intent_codes, stage_codes = self.classify_keywords(keywords)
+        intent_votes = np.zeros((n_clusters, len(INTENT_LABELS)), dtype=np.int64)
+        np.add.at(intent_votes, (labels, intent_codes), 1)
+        stage_votes = np.zeros((n_clusters, len(STAGE_LABELS)), dtype=np.int64)
+        np.add.at(stage_votes, (labels, stage_codes), 1)
+        cluster_intents = intent_votes.argmax(axis=1)
+        cluster_stages = stage_votes.argmax(axis=1)
+        
+        # Primary keyword: the longest member (first one on ties)
+        lengths = np.fromiter((len(keyword) for keyword in keywords), dtype=np.int64, count=n_keywords)
+        by_cluster = np.lexsort((np.arange(n_keywords), -lengths, labels))
+        group_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        
+        # Names: top unigram terms of each cluster centroid
+        name_weights = np.where(_usable_term_mask(terms), centroids, 0.0)
+        top_terms = np.argsort(-name_weights, axis=1, kind="stable")[:, :4]
+        
+        # Content topic: the most frequent word among the members' tokens
+        vocabulary: Dict[str, int] = {}
+        token_ids = [vocabulary.setdefault(token, len(vocabulary)) for keyword_tokens in tokens for token in keyword_tokens]
+        token_rows = np.repeat(np.arange(n_keywords), [len(keyword_tokens) for keyword_tokens in tokens])
+        word_counts = sparse.csr_matrix(
+            (np.ones(len(token_ids), dtype=np.int64), (labels[token_rows], np.asarray(token_ids, dtype=np.int64))),
+            shape=(n_clusters, max(len(vocabulary), 1))
+        )
+        topic_ids = np.asarray(word_counts.argmax(axis=1)).ravel()
+        topic_words = list(vocabulary)
+        
+        clusters = []
+        created_at = datetime.now()
+        for cluster_id in np.flatnonzero(counts):
+            member_indices = by_cluster[group_starts[cluster_id]:group_starts[cluster_id] + counts[cluster_id]]
+            cluster_keywords = [keywords[i] for i in member_indices]
+            
+            cluster_name = self._name_from_terms(terms, top_terms[cluster_id], name_weights[cluster_id])
+            search_intent = INTENT_LABELS[cluster_intents[cluster_id]]
+            primary_topic = topic_words[topic_ids[cluster_id]] if topic_words else "topic"
+            
+            clusters.append(KeywordCluster(
+                id=f"cluster_{cluster_id + 1}",
+                name=cluster_name,
+                primary_keyword=cluster_keywords[0],
+                keywords=sorted(cluster_keywords),
+                search_intent=search_intent,
+                topic_theme=cluster_name.lower(),
+                search_volume_total=int(volume_totals[cluster_id]),
+                difficulty_average=float(difficulty_averages[cluster_id]),
+                content_suggestions=self.content_suggestions_for_topic(primary_topic, search_intent),
+                buyer_journey_stage=STAGE_LABELS[cluster_stages[cluster_id]],
+                priority_score=float(cluster_priorities[cluster_id]),
+                created_at=created_at
+            ))
+        
+        # Sort clusters by priority score
+        clusters.sort(key=lambda x: x.priority_score, reverse=True)
+        return clusters
+    
+    def cluster_name_from_centroid(self, terms: np.ndarray, centroid: np.ndarray) -> str:
+        """Cluster name from a single centroid's strongest unigram terms"""
+        weights = np.where(_usable_term_mask(terms), centroid, 0.0)
+        return self._name_from_terms(terms, np.argsort(-weights, kind="stable")[:4], weights)
+    
+    @staticmethod
+    def _name_from_terms(terms: np.ndarray, candidates: np.ndarray, weights: np.ndarray) -> str:
+        """Cluster name from its two strongest centroid terms, skipping near-duplicates (tool/tools)"""
+        words: List[str] = []
+        for term_index in candidates:
+            if weights[term_index] <= 0:
+                break
+            term = terms[term_index]
+            if any(term.startswith(word) or word.startswith(term) for word in words):
+                continue
+            words.append(term)
+            if len(words) == 2:
+                break
+        
+        if not words:
+            return "Cluster"
+        return " ".join(word.title() for word in words)
+    
     def _analyze_content_gaps(self, clusters: List[KeywordCluster]) -> List[Dict]:
         """Analyze content gaps based on cluster analysis"""
         
@@ -529,13 +845,137 @@ class KeywordClusteringEngine:
         
         return opportunities
 
+def compact_analysis(analysis: ClusterAnalysis) -> Dict[str, Any]:
+    """Pack an analysis into flat arrays so it is cheap to send between processes"""
+    clusters = analysis.clusters
+    keywords: List[str] = []
+    offsets = [0]
+    primary_indices = []
+    for cluster in clusters:
+        primary_indices.append(len(keywords) + cluster.keywords.index(cluster.primary_keyword)
+                               if cluster.primary_keyword in cluster.keywords else -1)
+        keywords.extend(cluster.keywords)
+        offsets.append(len(keywords))
+    
+    return {
+        "keywords": keywords,
+        "offsets": np.asarray(offsets, dtype=np.int32),
+        "cluster_numbers": np.asarray([int(c.id.rsplit("_", 1)[-1]) for c in clusters], dtype=np.int32),
+        "primary_indices": np.asarray(primary_indices, dtype=np.int32),
+        "primary_fallbacks": [c.primary_keyword for c in clusters],
+        "names": [c.name for c in clusters],
+        "intents": np.asarray([INTENT_LABELS.index(c.search_intent) for c in clusters], dtype=np.uint8),
+        "stages": np.asarray([STAGE_LABELS.index(c.buyer_journey_stage) for c in clusters], dtype=np.uint8),
+        "volumes": np.asarray([c.search_volume_total for c in clusters], dtype=np.int64),
+        "difficulties": np.asarray([c.difficulty_average for c in clusters], dtype=np.float64),
+        "priorities": np.asarray([c.priority_score for c in clusters], dtype=np.float64),
+        "content_suggestions": [c.content_suggestions for c in clusters],
+        "total_keywords": analysis.total_keywords,
+        "unclustered_keywords": analysis.unclustered_keywords,
+        "content_gaps": analysis.content_gaps,
+        "pillar_opportunities": analysis.pillar_opportunities,
+        "processing_time": analysis.processing_time,
+        "stage_metrics": analysis.stage_metrics,
+        "selected_k": analysis.selected_k,
+        "selection_score": analysis.selection_score,
+        "state": analysis.state
+    }
+
+def expand_analysis(packed: Dict[str, Any]) -> ClusterAnalysis:
+    """Rebuild a ClusterAnalysis from compact_analysis output"""
+    keywords = packed["keywords"]
+    offsets = packed["offsets"]
+    created_at = datetime.now()
+    clusters = []
+    
+    for i, name in enumerate(packed["names"]):
+        primary_index = int(packed["primary_indices"][i])
+        clusters.append(KeywordCluster(
+            id=f"cluster_{int(packed['cluster_numbers'][i])}",
+            name=name,
+            primary_keyword=keywords[primary_index] if primary_index >= 0 else packed["primary_fallbacks"][i],
+            keywords=keywords[offsets[i]:offsets[i + 1]],
+            search_intent=INTENT_LABELS[packed["intents"][i]],
+            topic_theme=name.lower(),
+            search_volume_total=int(packed["volumes"][i]),
+            difficulty_average=float(packed["difficulties"][i]),
+            content_suggestions=packed["content_suggestions"][i],
+            buyer_journey_stage=STAGE_LABELS[packed["stages"][i]],
+            priority_score=float(packed["priorities"][i]),
+            created_at=created_at
+        ))
+    
+    return ClusterAnalysis(
+        total_keywords=packed["total_keywords"],
+        total_clusters=len(clusters),
+        clusters=clusters,
+        unclustered_keywords=packed["unclustered_keywords"],
+        content_gaps=packed["content_gaps"],
+        pillar_opportunities=packed["pillar_opportunities"],
+        processing_time=packed["processing_time"],
+        stage_metrics=packed.get("stage_metrics", []),
+        selected_k=packed.get("selected_k"),
+        selection_score=packed.get("selection_score"),
+        state=packed.get("state")
+    )
+
+# Process-wide engine instance
+_clustering_engine = None
+_clustering_engine_lock = threading.Lock()
+
+def get_clustering_engine() -> KeywordClusteringEngine:
+    """Get or create the shared clustering engine"""
+    global _clustering_engine
+    if _clustering_engine is None:
+        with _clustering_engine_lock:
+            if _clustering_engine is None:
+                _clustering_engine = KeywordClusteringEngine()
+    return _clustering_engine
+
+def warm_clustering_engine() -> KeywordClusteringEngine:
+    """Build the shared engine and load its NLP resources (blocking; run at startup)"""
+    start_time = datetime.now()
+    engine = get_clustering_engine()
+    engine.warm_up()
+    logger.info(f"Clustering engine warmed in {(datetime.now() - start_time).total_seconds():.2f}s")
+    return engine
+
+def cluster_keywords_compact(
+    keywords: List[str],
+    search_volumes: Optional[List[int]] = None,
+    difficulties: Optional[List[float]] = None,
+    engine: str = "standard",
+    progress_queue=None
+) -> Dict[str, Any]:
+    """
+    Run an analysis on the shared engine and return it packed (process pool entry point).
+    Finished stage metrics are put on ``progress_queue`` if one is given; the
+    worker's text normalizer metrics are attached for the pool to report.
+    """
+    progress = progress_queue.put if progress_queue is not None else None
+    if engine == "bulk":
+        from services.bulk_clustering import get_bulk_clustering_engine
+        analysis = get_bulk_clustering_engine().cluster_keywords_sync(keywords, search_volumes, difficulties, progress)
+    else:
+        analysis = get_clustering_engine().cluster_keywords_sync(keywords, search_volumes, difficulties, progress)
+    packed = compact_analysis(analysis)
+    packed["normalizer_metrics"] = {"pid": os.getpid(), **get_text_normalizer().get_metrics()}
+    return packed
+
 # Async wrapper for easy integration
 async def cluster_keywords_async(
     keywords: List[str],
     search_volumes: Optional[List[int]] = None,
-    difficulties: Optional[List[float]] = None
+    difficulties: Optional[List[float]] = None,
+    company_id: Optional[str] = None,
+    plan_type: Optional[str] = None,
+    engine: str = "standard"
 ) -> ClusterAnalysis:
-    """Async wrapper for keyword clustering"""
+    """
+    Async wrapper for keyword clustering - runs on the clustering process pool.
+    ``engine="bulk"`` selects the chunked engine for very large keyword lists.
+    """
+    from services.clustering_pool import get_clustering_pool
     
-    engine = KeywordClusteringEngine()
-    return await engine.cluster_keywords(keywords, search_volumes, difficulties)
\ No newline at end of file
+    packed = await get_clustering_pool().run(keywords, search_volumes, difficulties, company_id, plan_type, engine)
+    return expand_analysis(packed)
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+Incremental keyword clustering.
+
+Adds keywords to an existing analysis by projecting them into the analysis'
+fitted TF-IDF space and assigning them to the nearest stored centroid, so an
+append costs milliseconds instead of a full recluster.
+"""
+
+import os
+from collections import Counter
+from typing import List, Dict, Optional, Any
+
+import numpy as np
+from bson import Binary
+
+from services.clustering_service import (
+    KeywordClusteringEngine, KeywordCluster, INTENT_LABELS, STAGE_LABELS, priority_scores
+)
+
+# Suggest a full recluster once fit quality drops this much (0-1), or the
+# analysis has grown by this fraction since it was last fitted
+CLUSTER_DRIFT_THRESHOLD = float(os.getenv("CLUSTER_DRIFT_THRESHOLD", "0.35"))
+CLUSTER_RECLUSTER_GROWTH = float(os.getenv("CLUSTER_RECLUSTER_GROWTH", "0.25"))
+
+def state_to_document(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Encode clustering state for MongoDB (arrays as raw float32/int64 bytes)"""
+    return {
+        "terms": state["terms"],
+        "idf": Binary(state["idf"].astype(np.float32).tobytes()),
+        "centroids": Binary(state["centroids"].astype(np.float32).tobytes()),
+        "centroid_shape": list(state["centroids"].shape),
+        "counts": [int(count) for count in state["counts"]],
+        "baseline_similarity": state["baseline_similarity"],
+        "fitted_keywords": state["fitted_keywords"],
+        "added_since_fit": state.get("added_since_fit", 0),
+        "added_similarity_sum": state.get("added_similarity_sum", 0.0)
+    }
+
+def state_from_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode a state document written by state_to_document"""
+    return {
+        "terms": document["terms"],
+        "idf": np.frombuffer(document["idf"], dtype=np.float32),
+        "centroids": np.frombuffer(document["centroids"], dtype=np.float32).reshape(document["centroid_shape"]).copy(),
+        "counts": np.asarray(document["counts"], dtype=np.int64),
+        "baseline_similarity": document["baseline_similarity"],
+        "fitted_keywords": document["fitted_keywords"],
+        "added_since_fit": document.get("added_since_fit", 0),
+        "added_similarity_sum": document.get("added_similarity_sum", 0.0)
+    }
+
+def drift_score(state: Dict[str, Any]) -> float:
+    """
+    Relative drop in keyword-to-centroid similarity of keywords added since the
+    last full fit, compared with the fitted keywords (0 = fits as well, 1 = no fit).
+    """
+    if not state["added_since_fit"] or state["baseline_similarity"] <= 0:
+        return 0.0
+    added_similarity = state["added_similarity_sum"] / state["added_since_fit"]
+    return float(np.clip(1 - added_similarity / state["baseline_similarity"], 0.0, 1.0))
+
+def recluster_recommended(state: Dict[str, Any]) -> bool:
+    return (
+        drift_score(state) >= CLUSTER_DRIFT_THRESHOLD
+        or state["added_since_fit"] >= CLUSTER_RECLUSTER_GROWTH * state["fitted_keywords"]
+    )
+
+def add_keywords(
+    engine: KeywordClusteringEngine,
+    analysis: Dict[str, Any],
+    state: Dict[str, Any],
+    keywords: List[str],
+    search_volumes: Optional[List[int]] = None,
+    difficulties: Optional[List[float]] = None
+) -> Dict[str, Any]:
+    """
+    Assign new keywords to the nearest centroids of an analysis.
+    Only clusters that receive keywords are re-summarized. Mutates ``state``;
+    returns the updated analysis fields plus a report of what changed.
+    """
+    processed, source_indices = engine.preprocess_keywords_indexed(keywords)
+    existing = {keyword for cluster in analysis["clusters"] for keyword in cluster["keywords"]}
+    existing.update(analysis.get("unclustered_keywords", []))
+
+    keep = [i for i, keyword in enumerate(processed) if keyword not in existing]
+    new_keywords = [processed[i] for i in keep]
+    source_indices = source_indices[keep]
+    skipped = [keyword for keyword in processed if keyword in existing]
+
+    clusters = [dict(cluster) for cluster in analysis["clusters"]]
+    unclustered = list(analysis.get("unclustered_keywords", []))
+    affected_ids: List[str] = []
+
+    if new_keywords:
+        from sklearn.preprocessing import normalize
+
+        volumes = engine._aligned_metric(search_volumes, source_indices, 100, np.int64)
+        keyword_difficulties = engine._aligned_metric(difficulties, source_indices, 50.0, np.float64)
+
+        tokens = engine.normalizer.tokenize(new_keywords)
+        features = engine.transform_keywords(new_keywords, state["terms"], state["idf"], tokens)
+
+        # Nearest centroid by cosine similarity
+        similarities = np.asarray(features @ normalize(state["centroids"]).T)
+        similarities[:, state["counts"] == 0] = -np.inf
+        labels = similarities.argmax(axis=1)
+        best_similarity = np.maximum(similarities[np.arange(len(new_keywords)), labels], 0.0)
+
+        # Keywords sharing no vocabulary with the analysis can't be placed
+        in_vocabulary = features.getnnz(axis=1) > 0
+        unclustered.extend(keyword for keyword, placed in zip(new_keywords, in_vocabulary) if not placed)
+
+        # Incremental centroid means
+        placed = np.flatnonzero(in_vocabulary)
+        affected = np.unique(labels[placed])
+        for label in affected:
+            rows = placed[labels[placed] == label]
+            old_count = state["counts"][label]
+            new_count = old_count + len(rows)
+            state["centroids"][label] = (
+                state["centroids"][label] * old_count + np.asarray(features[rows].sum(axis=0)).ravel()
+            ) / new_count
+            state["counts"][label] = new_count
+
+        state["added_since_fit"] += len(new_keywords)
+        state["added_similarity_sum"] += float(best_similarity.sum())
+
+        # Re-summarize only the clusters that received keywords
+        clusters_by_id = {cluster["id"]: cluster for cluster in clusters}
+        for label in affected:
+            cluster = clusters_by_id.get(f"cluster_{label + 1}")
+            if cluster is None:
+                continue
+            rows = placed[labels[placed] == label]
+            _update_cluster(
+                engine, cluster, state, label,
+                [new_keywords[i] for i in rows], volumes[rows], keyword_difficulties[rows]
+            )
+            affected_ids.append(cluster["id"])
+
+    # Sort clusters by priority score and refresh the analysis-level insights
+    clusters.sort(key=lambda cluster: cluster["priority_score"], reverse=True)
+    cluster_objects = [KeywordCluster(**cluster) for cluster in clusters]
+
+    return {
+        "clusters": clusters,
+        "unclustered_keywords": unclustered,
+        "total_keywords": analysis["total_keywords"] + len(new_keywords),
+        "total_clusters": len(clusters),
+        "content_gaps": engine._analyze_content_gaps(cluster_objects),
+        "pillar_opportunities": engine._identify_pillar_opportunities(cluster_objects),
+        "added_keywords": new_keywords,
+        "skipped_keywords": skipped,
+        "affected_clusters": affected_ids,
+        "drift_score": drift_score(state),
+        "recluster_recommended": recluster_recommended(state)
+    }
+
+def _update_cluster(
+    engine: KeywordClusteringEngine,
+    cluster: Dict[str, Any],
+    state: Dict[str, Any],
+    label: int,
+    new_keywords: List[str],
+    volumes: np.ndarray,
+    difficulties: np.ndarray
+) -> None:
+    old_count = len(cluster["keywords"])
+    keywords = cluster["keywords"] + new_keywords
+    count = len(keywords)
+
+    volume_total = cluster["search_volume_total"] + int(volumes.sum())
+    difficulty_average = (cluster["difficulty_average"] * old_count + float(difficulties.sum())) / count
+
+    intent_codes, stage_codes = engine.classify_keywords(keywords)
+    search_intent = INTENT_LABELS[np.bincount(intent_codes, minlength=len(INTENT_LABELS)).argmax()]
+    name = engine.cluster_name_from_centroid(state["terms"], state["centroids"][label])
+    topic = Counter(token for keyword in keywords for token in keyword.split()).most_common(1)
+
+    cluster.update({
+        "name": name,
+        "topic_theme": name.lower(),
+        "primary_keyword": max(keywords, key=len),
+        "keywords": sorted(keywords),
+        "search_intent": search_intent,
+        "buyer_journey_stage": STAGE_LABELS[np.bincount(stage_codes, minlength=len(STAGE_LABELS)).argmax()],
+        "search_volume_total": volume_total,
+        "difficulty_average": difficulty_average,
+        "priority_score": float(priority_scores(volume_total, difficulty_average, count)),
+        "content_suggestions": engine.content_suggestions_for_topic(topic[0][0] if topic else "topic", search_intent)
+    })
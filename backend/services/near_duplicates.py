@@ -0,0 +1,176 @@
+"""
+Near-duplicate keyword collapsing.
+
+Keyword exports are full of near-duplicates ("crm software", "crm softwares",
+"the crm software") that preprocessing keeps apart because they are not
+identical strings. Before vectorizing, keywords are compared by the
+character shingles of a light normal form (articles dropped, words
+lemmatized and sorted), which also catches misspellings in longer keywords:
+
+1. each keyword gets a MinHash signature over its shingles, computed with
+   numpy for the whole list at once;
+2. LSH banding puts keywords whose signatures agree on a band into the same
+   bucket, so only keywords sharing a bucket are compared;
+3. candidate pairs whose estimated Jaccard similarity reaches the threshold
+   are merged with union-find, provided their words are the same except
+   for at most one misspelled word. Shingles of long keywords barely change
+   when one word does, so without that check "tips crm for small business"
+   and "order crm for small business" (or "under 500" / "under 600") would
+   merge and chain whole topics together.
+
+Each group is clustered once, through its highest-volume keyword, weighted
+by the group size; the engines then expand the groups back out so results
+list every keyword with its own volume and difficulty.
+"""
+
+import os
+from difflib import SequenceMatcher
+from typing import List, Tuple
+
+import numpy as np
+
+from services.text_normalizer import get_text_normalizer
+
+NEAR_DUPLICATE_COLLAPSE = os.getenv("NEAR_DUPLICATE_COLLAPSE", "true").lower() == "true"
+# Minimum estimated Jaccard similarity of two keywords' shingle sets to merge them
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+# Minimum similarity (difflib ratio) of the one word two keywords may differ in
+NEAR_DUPLICATE_TYPO_SIMILARITY = 0.8
+NEAR_DUPLICATE_SHINGLE_SIZE = 3
+# 16 bands of 4 rows: pairs above ~0.5 Jaccard almost always share a bucket
+NEAR_DUPLICATE_PERMUTATIONS = 64
+NEAR_DUPLICATE_BANDS = 16
+# Keywords whose signatures are computed at a time (bounds the shingle x permutation block)
+NEAR_DUPLICATE_BLOCK_SIZE = 2048
+
+# Words that never make two keywords different
+IGNORED_WORDS = frozenset(("a", "an", "the"))
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+def dedup_keys(keywords: List[str], tokens: List[List[str]]) -> List[str]:
+    """Normal form compared for near-duplicates: articles dropped, alphabetic words lemmatized, words sorted"""
+    lemmas = get_text_normalizer().lemmas(tokens)
+    keys = []
+    for keyword, row in zip(keywords, tokens):
+        key = " ".join(sorted(lemmas[token] or token for token in row if token not in IGNORED_WORDS))
+        keys.append(key or keyword)
+    return keys
+
+def words_match(left: str, right: str) -> bool:
+    """Whether two keys have the same words except for one misspelled (alphabetic) word"""
+    left_words, right_words = left.split(), right.split()
+    if len(left_words) != len(right_words):
+        return False
+    left_only = set(left_words).difference(right_words)
+    right_only = set(right_words).difference(left_words)
+    if not left_only and not right_only:
+        return True
+    if len(left_only) != 1 or len(right_only) != 1:
+        return False
+    left_word, right_word = left_only.pop(), right_only.pop()
+    return (
+        left_word.isalpha() and right_word.isalpha()
+        and SequenceMatcher(None, left_word, right_word).ratio() >= NEAR_DUPLICATE_TYPO_SIMILARITY
+    )
+
+def minhash_signatures(keys: List[str]) -> np.ndarray:
+    """(keywords x permutations) MinHash signatures over character shingles"""
+    size = NEAR_DUPLICATE_SHINGLE_SIZE
+    padded = [f" {key} " for key in keys]
+    # All keys as one array of code points; each key's shingles start at its first len - size + 1 positions
+    text = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    counts = np.maximum(lengths - size + 1, 0)
+    offsets = np.r_[0, np.cumsum(counts)]
+    positions = np.arange(offsets[-1]) + np.repeat(np.cumsum(lengths) - lengths - offsets[:-1], counts)
+
+    # Code points are at most 21 bits, so a shingle packs into one integer; number distinct shingles
+    codes = np.zeros(len(positions), dtype=np.uint64)
+    for i in range(size):
+        codes = (codes << np.uint64(21)) | text[positions + i]
+    vocabulary, shingle_ids = np.unique(codes, return_inverse=True)
+
+    # Universal hashing (a * x + b) mod p of every distinct shingle, one row per permutation
+    rng = np.random.default_rng(1)
+    a = rng.integers(1, _MERSENNE_PRIME, size=NEAR_DUPLICATE_PERMUTATIONS, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=NEAR_DUPLICATE_PERMUTATIONS, dtype=np.uint64)
+    shingles = np.arange(len(vocabulary), dtype=np.uint64)[:, None]
+    shingle_hashes = ((shingles * a + b) % _MERSENNE_PRIME).astype(np.uint32)
+
+    # Minimum hash per keyword and permutation over the keyword's (contiguous) run of shingles
+    signatures = np.empty((len(keys), NEAR_DUPLICATE_PERMUTATIONS), dtype=np.uint32)
+    for start in range(0, len(keys), NEAR_DUPLICATE_BLOCK_SIZE):
+        end = min(start + NEAR_DUPLICATE_BLOCK_SIZE, len(keys))
+        block = shingle_hashes[shingle_ids[offsets[start]:offsets[end]]]
+        signatures[start:end] = np.minimum.reduceat(block, offsets[start:end] - offsets[start], axis=0)
+    return signatures
+
+def candidate_pairs(signatures: np.ndarray) -> np.ndarray:
+    """(pairs x 2) keyword pairs sharing an LSH bucket in at least one band"""
+    n_keywords = signatures.shape[0]
+    rows = NEAR_DUPLICATE_PERMUTATIONS // NEAR_DUPLICATE_BANDS
+    # Odd multipliers folding a band's rows into one bucket hash (collisions are caught by verification)
+    multipliers = np.random.default_rng(2).integers(1, 1 << 63, size=rows, dtype=np.uint64) | np.uint64(1)
+    pairs = []
+    for band in range(NEAR_DUPLICATE_BANDS):
+        band_rows = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        buckets = (band_rows * multipliers).sum(axis=1, dtype=np.uint64)
+
+        # Pair every keyword with the first keyword of its bucket
+        order = np.argsort(buckets, kind="stable")
+        sorted_buckets = buckets[order]
+        starts = np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]]
+        partner = order[np.flatnonzero(starts)][np.cumsum(starts) - 1]
+        matched = partner != order
+        pairs.append(partner[matched] * n_keywords + order[matched])
+
+    encoded = np.unique(np.concatenate(pairs)) if pairs else np.empty(0, dtype=np.int64)
+    return np.stack((encoded // n_keywords, encoded % n_keywords), axis=1)
+
+def _find(parents: np.ndarray, node: int) -> int:
+    root = node
+    while parents[root] != root:
+        root = parents[root]
+    while parents[node] != root:
+        parents[node], node = root, parents[node]
+    return root
+
+def collapse_near_duplicates(
+    keywords: List[str],
+    tokens: List[List[str]],
+    volumes: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Group near-duplicate keywords. Returns the index of each group's
+    representative (its highest-volume keyword; groups in input order) and
+    each keyword's group number.
+    """
+    n_keywords = len(keywords)
+    keys = dedup_keys(keywords, tokens)
+    # Keywords with the same key share a signature, so each distinct key is hashed once
+    distinct_keys, key_ids = np.unique(np.asarray(keys, dtype=object), return_inverse=True)
+    signatures = minhash_signatures(distinct_keys.tolist())[key_ids]
+    pairs = candidate_pairs(signatures)
+
+    # Keep pairs whose estimated Jaccard similarity reaches the threshold
+    similar = np.zeros(len(pairs), dtype=bool)
+    for start in range(0, len(pairs), NEAR_DUPLICATE_BLOCK_SIZE):
+        block = pairs[start:start + NEAR_DUPLICATE_BLOCK_SIZE]
+        agreement = (signatures[block[:, 0]] == signatures[block[:, 1]]).mean(axis=1)
+        similar[start:start + len(block)] = agreement >= NEAR_DUPLICATE_THRESHOLD
+
+    parents = np.arange(n_keywords)
+    for left, right in pairs[similar].tolist():
+        if keys[left] != keys[right] and not words_match(keys[left], keys[right]):
+            continue
+        left_root, right_root = _find(parents, left), _find(parents, right)
+        if left_root != right_root:
+            parents[max(left_root, right_root)] = min(left_root, right_root)
+    roots = np.fromiter((_find(parents, node) for node in range(n_keywords)), dtype=np.int64, count=n_keywords)
+
+    # Roots are each group's first keyword, so numbering groups by root keeps input order
+    _, groups = np.unique(roots, return_inverse=True)
+    by_group = np.lexsort((np.arange(n_keywords), -np.asarray(volumes), groups))
+    group_starts = np.flatnonzero(np.r_[True, groups[by_group][1:] != groups[by_group][:-1]])
+    return by_group[group_starts], groups.astype(np.int32)
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+# bcrypt cost factor for new hashes; existing hashes are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads dedicated to bcrypt (bcrypt releases the GIL while hashing)
+BCRYPT_MAX_WORKERS = int(os.getenv("BCRYPT_MAX_WORKERS", "2"))
+# Requests allowed to wait for a bcrypt thread before we shed load
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password operations are already queued"""
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing/verification on a small dedicated pool so a burst
+    of logins never blocks the event loop serving searches.
+    """
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, max_workers: int = BCRYPT_MAX_WORKERS, max_queue: int = BCRYPT_MAX_QUEUE):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._in_flight = 0
+        self._metrics = {
+            "operations": 0,
+            "rejected": 0,
+            "rehashed": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "max_queue_depth": 0
+        }
+
+    async def _run(self, fn, *args) -> Any:
+        if self.queue_depth >= self.max_queue:
+            self._metrics["rejected"] += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        self._in_flight += 1
+        self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], self.queue_depth)
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._in_flight -= 1
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._metrics["operations"] += 1
+            self._metrics["total_ms"] += elapsed_ms
+            self._metrics["max_ms"] = max(self._metrics["max_ms"], elapsed_ms)
+
+    @property
+    def queue_depth(self) -> int:
+        """Operations waiting for a free bcrypt thread"""
+        return max(0, self._in_flight - self.max_workers)
+
+    def _hash_sync(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+    @staticmethod
+    def _verify_sync(password: str, hashed: str) -> bool:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+    async def hash_password(self, password: str) -> str:
+        """Hash password using bcrypt at the configured cost factor"""
+        return await self._run(self._hash_sync, password)
+
+    async def verify_password(self, password: str, hashed: str) -> bool:
+        """Verify password against hash"""
+        return await self._run(self._verify_sync, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True if the hash was made with a different cost factor"""
+        try:
+            # Format: $2b$<rounds>$<salt+hash>
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def record_rehash(self) -> None:
+        self._metrics["rehashed"] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Latency and queue metrics for the bcrypt pool"""
+        operations = self._metrics["operations"]
+        return {
+            **self._metrics,
+            "rounds": self.rounds,
+            "workers": self.max_workers,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "avg_ms": round(self._metrics["total_ms"] / operations, 2) if operations else 0.0
+        }
+
+# Singleton instance
+_password_hasher = None
+
+def get_password_hasher() -> PasswordHasher:
+    """Get or create password hasher instance"""
+    global _password_hasher
+    if _password_hasher is None:
+        _password_hasher = PasswordHasher()
+    return _password_hasher
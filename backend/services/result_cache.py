@@ -0,0 +1,152 @@
+"""
+Result cache for identical clustering inputs.
+
+Teams re-run the same keyword export, often from several members of one
+company. An analysis is keyed by a hash of its canonical inputs: the
+preprocessed keyword set with the volume and difficulty each keyword is
+clustered with, plus the engine and its parameters. The result is stored once
+in ``cluster_results``; each user's analysis record references it by hash, so
+a repeat analysis is a lookup instead of a clustering run. A result is
+removed once the last analysis referencing it is deleted or stops
+referencing it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Any
+
+import numpy as np
+from pymongo import ReturnDocument
+
+from models.clustering_models import ClusteringEngineType, CLUSTER_RESULTS_COLLECTION, CLUSTER_ANALYSES_COLLECTION
+from services.clustering_service import (
+    KeywordClusteringEngine, ClusterAnalysis, COARSE_K_STEPS, SILHOUETTE_SAMPLE_SIZE
+)
+from services.bulk_clustering import (
+    BULK_HASH_FEATURES, BULK_BATCH_SIZE, BULK_EPOCHS, BULK_KEYWORDS_PER_CLUSTER, BULK_MAX_CLUSTERS
+)
+from services.analysis_detail import encode_analysis_detail
+from services.incremental_clustering import state_to_document
+from services.near_duplicates import (
+    NEAR_DUPLICATE_COLLAPSE, NEAR_DUPLICATE_THRESHOLD, NEAR_DUPLICATE_TYPO_SIMILARITY, NEAR_DUPLICATE_SHINGLE_SIZE,
+    NEAR_DUPLICATE_PERMUTATIONS, NEAR_DUPLICATE_BANDS
+)
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+CLUSTERING_CACHE_ENABLED = os.getenv("CLUSTERING_CACHE_ENABLED", "true").lower() == "true"
+# Whether an analysis answered from the cache counts towards the monthly usage
+CLUSTERING_CACHE_HITS_COUNT_USAGE = os.getenv("CLUSTERING_CACHE_HITS_COUNT_USAGE", "false").lower() == "true"
+# Bump when a clustering change makes stored results stale
+CLUSTERING_CACHE_VERSION = 2
+# A result used this recently is kept even when unreferenced (its analysis may be about to be saved)
+CLUSTERING_RESULT_RELEASE_GRACE_SECONDS = 60
+
+def _engine_parameters(engine: str) -> Dict[str, Any]:
+    """Parameters that change an engine's output for the same keywords"""
+    near_duplicates = {
+        "collapse": NEAR_DUPLICATE_COLLAPSE,
+        "threshold": NEAR_DUPLICATE_THRESHOLD,
+        "typo_similarity": NEAR_DUPLICATE_TYPO_SIMILARITY,
+        "shingle_size": NEAR_DUPLICATE_SHINGLE_SIZE,
+        "permutations": NEAR_DUPLICATE_PERMUTATIONS,
+        "bands": NEAR_DUPLICATE_BANDS
+    }
+    if engine == ClusteringEngineType.BULK.value:
+        return {
+            "hash_features": BULK_HASH_FEATURES,
+            "batch_size": BULK_BATCH_SIZE,
+            "epochs": BULK_EPOCHS,
+            "keywords_per_cluster": BULK_KEYWORDS_PER_CLUSTER,
+            "max_clusters": BULK_MAX_CLUSTERS,
+            "near_duplicates": near_duplicates
+        }
+    return {
+        "ngram_range": list(KeywordClusteringEngine.NGRAM_RANGE),
+        "coarse_k_steps": COARSE_K_STEPS,
+        "silhouette_sample_size": SILHOUETTE_SAMPLE_SIZE,
+        "near_duplicates": near_duplicates
+    }
+
+def clustering_input_hash(
+    keywords: List[str],
+    search_volumes: Optional[List[int]],
+    difficulties: Optional[List[float]],
+    engine: str
+) -> str:
+    """
+    SHA-256 of the canonical clustering inputs (CPU-bound; run off the event loop).
+
+    Keywords are hashed after preprocessing and sorted, so case, punctuation,
+    duplicates and order don't change the hash; volumes and difficulties are
+    hashed as the engine would use them, defaults included.
+    """
+    processed, source_indices = KeywordClusteringEngine.preprocess_keywords_indexed(keywords)
+    volumes = KeywordClusteringEngine._aligned_metric(search_volumes, source_indices, 100, np.int64)
+    keyword_difficulties = KeywordClusteringEngine._aligned_metric(difficulties, source_indices, 50.0, np.float64)
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        "version": CLUSTERING_CACHE_VERSION,
+        "engine": engine,
+        "parameters": _engine_parameters(engine)
+    }, sort_keys=True).encode())
+    for index in sorted(range(len(processed)), key=processed.__getitem__):
+        digest.update(f"\n{processed[index]}\t{volumes[index]}\t{keyword_difficulties[index]!r}".encode())
+    return digest.hexdigest()
+
+async def find_cached_result(input_hash: str) -> Optional[Dict[str, Any]]:
+    """The stored result for these inputs (details still encoded), without its fitted state, or None"""
+    db = await get_database()
+    return await db[CLUSTER_RESULTS_COLLECTION].find_one_and_update(
+        {"input_hash": input_hash},
+        {"$inc": {"hits": 1}, "$set": {"last_used_at": datetime.utcnow()}},
+        projection={"_id": 0, "state": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def find_cached_state(input_hash: str) -> Optional[Dict[str, Any]]:
+    """Fitted state document stored with a result (for incremental updates)"""
+    db = await get_database()
+    document = await db[CLUSTER_RESULTS_COLLECTION].find_one({"input_hash": input_hash}, {"_id": 0, "state": 1})
+    return document.get("state") if document else None
+
+async def store_result(input_hash: str, analysis: Dict[str, Any], clustering_result: ClusterAnalysis) -> None:
+    """Store an analysis result, details in the compact form, under its input hash (the first writer wins)"""
+    db = await get_database()
+    now = datetime.utcnow()
+    await db[CLUSTER_RESULTS_COLLECTION].update_one(
+        {"input_hash": input_hash},
+        {"$setOnInsert": {
+            "input_hash": input_hash,
+            **encode_analysis_detail(analysis),
+            "engine": analysis["engine"],
+            "total_keywords": analysis["total_keywords"],
+            "total_clusters": analysis["total_clusters"],
+            "processing_time": analysis["processing_time"],
+            "selected_k": analysis["selected_k"],
+            "selection_score": analysis["selection_score"],
+            "stage_metrics": analysis["stage_metrics"],
+            "state": state_to_document(clustering_result.state) if clustering_result.state else None,
+            "hits": 0,
+            "created_at": now,
+            "last_used_at": now
+        }},
+        upsert=True
+    )
+
+async def release_result(input_hash: str) -> bool:
+    """Remove a stored result once no analysis references it. Returns True if it was removed."""
+    db = await get_database()
+    if await db[CLUSTER_ANALYSES_COLLECTION].find_one({"result_id": input_hash}, {"_id": 1}):
+        return False
+
+    result = await db[CLUSTER_RESULTS_COLLECTION].delete_one({
+        "input_hash": input_hash,
+        "last_used_at": {"$lt": datetime.utcnow() - timedelta(seconds=CLUSTERING_RESULT_RELEASE_GRACE_SECONDS)}
+    })
+    return result.deleted_count > 0
@@ -0,0 +1,106 @@
+"""
+Shared keyword text normalization: tokenization, stopword filtering and
+lemmatization.
+
+Keyword lists from different customers repeat the same marketing vocabulary
+("best", "tools", "pricing", "software"), so lemmas are memoized in one
+bounded, process-wide LRU shared by every analysis (and any other caller that
+normalizes query text) instead of calling WordNet for every token of every
+keyword. A list is tokenized in one pass and each distinct token is looked up
+once per call.
+"""
+
+import logging
+import os
+import threading
+from functools import lru_cache
+from typing import List, Dict, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+# Distinct tokens whose normalized form is memoized (per process)
+TEXT_NORMALIZER_CACHE_SIZE = int(os.getenv("TEXT_NORMALIZER_CACHE_SIZE", "100000"))
+
+# NLTK data the normalizer needs; installed at image build time (see Dockerfile.backend)
+NLTK_RESOURCES = {'stopwords': 'corpora/stopwords', 'wordnet': 'corpora/wordnet'}
+
+def ensure_nltk_data() -> None:
+    """Check the NLTK data is installed; download what's missing (local development only)"""
+    import nltk
+
+    for package, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            logger.warning(f"NLTK data '{package}' is not installed; downloading it. Install it at build time instead.")
+            nltk.download(package, quiet=True)
+
+class TextNormalizer:
+    """Stopword-filtering lemmatizer with a bounded token memo; safe to share between threads"""
+
+    def __init__(self, max_size: int = TEXT_NORMALIZER_CACHE_SIZE):
+        ensure_nltk_data()
+        from nltk.corpus import stopwords
+        from nltk.stem import WordNetLemmatizer
+
+        self.stop_words = frozenset(stopwords.words('english'))
+        self.lemmatizer = WordNetLemmatizer()
+        self.max_size = max_size
+        self.normalize_token = lru_cache(maxsize=max_size)(self._normalize_token)
+
+    def _normalize_token(self, token: str) -> Optional[str]:
+        """Lemma of a token, or None for stopwords and non-alphabetic tokens"""
+        token = token.lower()
+        if token in self.stop_words or not token.isalpha():
+            return None
+        return self.lemmatizer.lemmatize(token)
+
+    @staticmethod
+    def tokenize(texts: List[str]) -> List[List[str]]:
+        """Lowercased whitespace tokens of every text (the list is lowercased in one pass)"""
+        lines = "\n".join(texts).lower().split("\n")
+        if len(lines) != len(texts):  # Some text contained a newline
+            lines = [text.lower() for text in texts]
+        return [line.split() for line in lines]
+
+    def lemmas(self, tokens: List[List[str]]) -> Dict[str, Optional[str]]:
+        """Normalized form of each distinct token in a tokenized list"""
+        normalize_token = self.normalize_token
+        return {token: normalize_token(token) for token in {token for row in tokens for token in row}}
+
+    def expand(self, texts: List[str], tokens: Optional[List[List[str]]] = None) -> List[str]:
+        """Each text followed by its lemmatized non-stopword tokens"""
+        if tokens is None:
+            tokens = self.tokenize(texts)
+        lemmas = self.lemmas(tokens)
+
+        expanded = []
+        for text, row in zip(texts, tokens):
+            row_lemmas = [lemmas[token] for token in row]
+            expanded.append(text + " " + " ".join(lemma for lemma in row_lemmas if lemma))
+        return expanded
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Token memo size and hit rate for this process"""
+        info = self.normalize_token.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+            "size": info.currsize,
+            "max_size": self.max_size
+        }
+
+# Process-wide normalizer instance
+_text_normalizer = None
+_text_normalizer_lock = threading.Lock()
+
+def get_text_normalizer() -> TextNormalizer:
+    """Get or create the shared text normalizer"""
+    global _text_normalizer
+    if _text_normalizer is None:
+        with _text_normalizer_lock:
+            if _text_normalizer is None:
+                _text_normalizer = TextNormalizer()
+    return _text_normalizer